@@ -4,6 +4,8 @@ from .nutrition_agent import NutritionAgent
 from .yoga_agent import YogaAgent
 from .fairness_agent import FairnessAgent
 from .report_agent import ReportAgent
+from .tool_scheduler import ToolCallScheduler, tool_scheduler
+from .orchestrator import Orchestrator, Node, checkin_pipeline
 
 __all__ = [
     "ObserveAgent",
@@ -11,6 +13,11 @@ __all__ = [
     "NutritionAgent",
     "YogaAgent",
     "FairnessAgent",
-    "ReportAgent"
+    "ReportAgent",
+    "ToolCallScheduler",
+    "tool_scheduler",
+    "Orchestrator",
+    "Node",
+    "checkin_pipeline"
 ]
 
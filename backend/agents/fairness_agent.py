@@ -1,7 +1,10 @@
 from typing import Dict, List
 from sqlalchemy.orm import Session
+from sqlalchemy import func
 from database import Memory
 from datetime import datetime, timedelta
+from metrics import record_quota_rejection
+from .tool_scheduler import tool_scheduler
 
 class FairnessAgent:
     """Ensures fair API free-tier usage and prevents quota bias"""
@@ -28,7 +31,11 @@ class FairnessAgent:
         
         limit = self.api_call_limits.get(api_name, {}).get("per_user_daily", 10)
         
+        # Users close to their quota get a smaller share of the scheduler
+        tool_scheduler.set_weight(user_id, max(0.25, 1.0 - recent_calls / limit))
+        
         if recent_calls >= limit:
+            record_quota_rejection(api_name)
             return {
                 "allowed": False,
                 "reason": f"Daily limit reached for {api_name}",
@@ -60,13 +67,13 @@ class FairnessAgent:
         # Simple fairness check - ensure no single user dominates
         today = datetime.utcnow().date()
         
-        user_call_counts = {}
-        for user_id in user_ids:
-            count = self.db.query(Memory).filter(
-                Memory.user_id == user_id,
-                Memory.memory_type == f"api_call_{resource}",
-                Memory.created_at >= datetime.combine(today, datetime.min.time())
-            ).count()
+        user_call_counts = {user_id: 0 for user_id in user_ids}
+        rows = self.db.query(Memory.user_id, func.count(Memory.id)).filter(
+            Memory.user_id.in_(user_ids),
+            Memory.memory_type == f"api_call_{resource}",
+            Memory.created_at >= datetime.combine(today, datetime.min.time())
+        ).group_by(Memory.user_id).all()
+        for user_id, count in rows:
             user_call_counts[user_id] = count
         
         if user_call_counts:
@@ -78,4 +85,7 @@ class FairnessAgent:
                 return False  # Unfair distribution detected
         
         return True
-
+    
+    def scheduler_metrics(self) -> Dict:
+        """Queue depth and wait statistics of the outbound tool scheduler"""
+        return tool_scheduler.metrics()
@@ -3,32 +3,40 @@ import requests
 from typing import Dict, List, Optional
 from sqlalchemy.orm import Session
 from database import NutritionPlan, Memory
+from rollups import apply_nutrition_plan
+from metrics import timed
 from datetime import datetime
 from dotenv import load_dotenv
 import openai
+from .tool_scheduler import SchedulerTimeout, tool_scheduler
 
 load_dotenv()
 
+# Point at a stand-in server (e.g. loadtest/fake_apis.py) by overriding the base URL
+USDA_API_URL = os.getenv("USDA_API_URL", "https://api.nal.usda.gov/fdc/v1")
+
 class NutritionAgent:
     """Nutrient lookup, recipe generation, substitutions, macro aggregation"""
     
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, user_id: Optional[int] = None):
         self.db = db
+        self.user_id = user_id
         self.usda_api_key = os.getenv("USDA_API_KEY")
         self.openai_api_key = os.getenv("OPENAI_API_KEY")
         self.openai_client = openai.OpenAI(api_key=self.openai_api_key) if self.openai_api_key else None
     
+    @timed("nutrition.lookup_nutrients")
     def lookup_nutrients(self, ingredient: str) -> Dict:
         """Lookup nutrients for an ingredient using USDA API"""
         try:
             # USDA FoodData Central API
-            url = "https://api.nal.usda.gov/fdc/v1/foods/search"
+            url = f"{USDA_API_URL}/foods/search"
             params = {
                 "api_key": self.usda_api_key,
                 "query": ingredient,
                 "pageSize": 1
             }
-            response = requests.get(url, params=params, timeout=10)
+            response = tool_scheduler.call("usda", self.user_id, requests.get, url, params=params, timeout=10)
             
             if response.status_code == 200:
                 data = response.json()
@@ -65,6 +73,7 @@ class NutritionAgent:
         except Exception as e:
             return {"success": False, "error": str(e)}
     
+    @timed("nutrition.generate_recipe")
     def generate_recipe(self, ingredients: List[str], meal_type: str, 
                        focus: str = "balanced_sattvic", user_preferences: Optional[Dict] = None) -> Dict:
         """Generate a Sattvic recipe using OpenAI"""
@@ -108,7 +117,8 @@ Format as JSON with keys: name, ingredients, instructions, prep_time_minutes, sa
             
             # Try gpt-4o-mini first, fallback to gpt-3.5-turbo
             try:
-                response = self.openai_client.chat.completions.create(
+                response = tool_scheduler.call(
+                    "openai", self.user_id, self.openai_client.chat.completions.create,
                     model="gpt-4o-mini",
                     messages=[
                         {"role": "system", "content": "You are a Sattvic nutrition expert. Generate healthy, yoga-aligned recipes."},
@@ -117,9 +127,13 @@ Format as JSON with keys: name, ingredients, instructions, prep_time_minutes, sa
                     temperature=0.7,
                     max_tokens=1000
                 )
+            except SchedulerTimeout:
+                # The provider is saturated; queueing again for the fallback model only doubles the wait
+                raise
             except Exception as e:
                 # Fallback to gpt-3.5-turbo
-                response = self.openai_client.chat.completions.create(
+                response = tool_scheduler.call(
+                    "openai", self.user_id, self.openai_client.chat.completions.create,
                     model="gpt-3.5-turbo",
                     messages=[
                         {"role": "system", "content": "You are a Sattvic nutrition expert. Generate healthy, yoga-aligned recipes."},
@@ -247,6 +261,7 @@ Format as JSON with keys: name, ingredients, instructions, prep_time_minutes, sa
         )
         
         self.db.add(plan)
+        apply_nutrition_plan(self.db, plan)
         self.db.commit()
         self.db.refresh(plan)
         
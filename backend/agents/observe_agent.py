@@ -2,6 +2,7 @@ from typing import Dict, List, Optional
 from datetime import datetime, timedelta
 from sqlalchemy.orm import Session
 from database import CheckIn, QuizResponse, NutritionPlan, YogaPlan, Memory, MLPrediction
+from metrics import timed
 
 class ObserveAgent:
     """Collects user data: sleep, mood, ingredients, adherence, quiz scores"""
@@ -9,6 +10,7 @@ class ObserveAgent:
     def __init__(self, db: Session):
         self.db = db
     
+    @timed("observe.collect_daily_data")
     def collect_daily_data(self, user_id: int) -> Dict:
         """Collects all relevant data for the day"""
         today = datetime.utcnow().date()
@@ -0,0 +1,377 @@
+"""
+DAG orchestration of the agents.
+Each agent step is a ``Node`` with named inputs and one named output.
+``Orchestrator.run`` starts every node as soon as its inputs exist, so
+independent nodes (the four meal plans and the yoga plan) run
+concurrently and a run takes as long as its critical path. Every node has
+a deadline, counted from when a worker thread picks it up; a node that
+fails or misses it yields its fallback output instead. Each node gets its
+own database session. The per-node timing breakdown is written to the
+decision trace as an ``Orchestrator`` trace.
+"""
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from trace_store import trace_writer
+from .observe_agent import ObserveAgent
+from .reasoner_agent import ReasonerAgent, default_recommendations
+from .nutrition_agent import NutritionAgent
+from .yoga_agent import YogaAgent
+from .fairness_agent import FairnessAgent
+
+ORCHESTRATOR_WORKERS = int(os.getenv("ORCHESTRATOR_WORKERS", "32"))
+REASON_DEADLINE_SECONDS = float(os.getenv("REASON_DEADLINE_SECONDS", "10"))
+MEAL_DEADLINE_SECONDS = float(os.getenv("MEAL_DEADLINE_SECONDS", "25"))
+YOGA_DEADLINE_SECONDS = float(os.getenv("YOGA_DEADLINE_SECONDS", "15"))
+MEAL_TYPES = ["breakfast", "lunch", "dinner", "snack"]
+QUEUED_POLL_SECONDS = 0.05
+
+# Nodes from concurrent runs share these threads
+_executor = ThreadPoolExecutor(max_workers=ORCHESTRATOR_WORKERS, thread_name_prefix="agent-node")
+
+class _Required:
+    def __repr__(self):
+        return "REQUIRED"
+
+REQUIRED = _Required()
+
+class NodeFailed(Exception):
+    """Raised when a node without a fallback fails or misses its deadline"""
+
+class NodeExpired(Exception):
+    """Raised in an atomic node's thread when it finishes after its deadline"""
+
+class Node:
+    """One step: ``fn(db, **inputs)`` produces ``output``.
+
+    ``fallback`` is the output to use if ``fn`` raises or exceeds
+    ``deadline`` seconds; a callable is called with the node's inputs.
+    Nodes without one fail the run. A node that misses its deadline keeps
+    running in the background, but its output is discarded.
+
+    An ``atomic`` node's commits only flush; its writes are committed once
+    ``fn`` returns within the deadline and rolled back otherwise, so a late
+    node leaves nothing behind. Keep network calls before its first write,
+    since the transaction holds SQLite's write lock.
+    """
+
+    def __init__(self, name: str, fn: Callable[..., Any], inputs: Iterable[str] = (),
+                 output: Optional[str] = None, deadline: float = 30.0, fallback: Any = REQUIRED,
+                 atomic: bool = False):
+        self.name = name
+        self.fn = fn
+        self.inputs = list(inputs)
+        self.output = output or name
+        self.deadline = deadline
+        self.fallback = fallback
+        self.atomic = atomic
+
+    def fallback_output(self, inputs: Dict) -> Any:
+        return self.fallback(**inputs) if callable(self.fallback) else self.fallback
+
+class _Attempt:
+    """One node execution; the lock orders finishing against expiring"""
+
+    def __init__(self, node: Node, inputs: Dict):
+        self.node = node
+        self.inputs = inputs
+        self.submitted = time.perf_counter()
+        self.started: Optional[float] = None
+        self.state = "queued"  # queued -> running -> finishing | expired
+        self.lock = threading.Lock()
+
+    def finish(self) -> bool:
+        """Called by the node's thread; False if the deadline already passed"""
+        with self.lock:
+            if self.state == "expired" or time.perf_counter() - self.started > self.node.deadline:
+                self.state = "expired"
+                return False
+            self.state = "finishing"
+            return True
+
+    def expire(self, now: float) -> bool:
+        """Called by the run loop; False if the node hasn't started, has time left or is finishing"""
+        with self.lock:
+            if self.state != "running" or now - self.started < self.node.deadline:
+                return False
+            self.state = "expired"
+            return True
+
+class Orchestrator:
+    def __init__(self, name: str, nodes: List[Node], session_factory=SessionLocal):
+        self.name = name
+        self.nodes = nodes
+        self.session_factory = session_factory
+        self._producers = {}
+        for node in nodes:
+            if node.output in self._producers:
+                raise ValueError(f"Output '{node.output}' is produced by both "
+                                 f"'{self._producers[node.output].name}' and '{node.name}'")
+            self._producers[node.output] = node
+        self._check_acyclic()
+
+    def _check_acyclic(self):
+        state: Dict[str, int] = {}
+
+        def visit(node: Node, path: List[str]):
+            if state.get(node.name) == 1:
+                raise ValueError(f"Cycle in {self.name}: {' -> '.join(path + [node.name])}")
+            if state.get(node.name) == 2:
+                return
+            state[node.name] = 1
+            for name in node.inputs:
+                if name in self._producers:
+                    visit(self._producers[name], path + [node.name])
+            state[node.name] = 2
+
+        for node in self.nodes:
+            visit(node, [])
+
+    def _needed(self, targets: Optional[Iterable[str]], values: Dict) -> List[Node]:
+        """Nodes that must run to produce ``targets`` (by default every final output)"""
+        if targets is None:
+            consumed = {name for node in self.nodes for name in node.inputs}
+            targets = [n.output for n in self.nodes if n.output not in consumed]
+        needed: Dict[str, Node] = {}
+        stack = list(targets)
+        while stack:
+            name = stack.pop()
+            if name in values or name in needed:
+                continue
+            node = self._producers.get(name)
+            if node is None:
+                raise ValueError(f"{self.name}: nothing produces '{name}'")
+            needed[name] = node
+            stack.extend(node.inputs)
+        return [n for n in self.nodes if n.output in needed]
+
+    def _call(self, attempt: _Attempt) -> Tuple[Any, float]:
+        node = attempt.node
+        db = self.session_factory()
+        if node.atomic:
+            commit, db.commit = db.commit, db.flush
+        try:
+            with attempt.lock:
+                attempt.started = time.perf_counter()
+                attempt.state = "running"
+            output = node.fn(db, **attempt.inputs)
+            if not attempt.finish():
+                raise NodeExpired(f"finished after its {node.deadline}s deadline")
+            if node.atomic:
+                commit()
+            return output, time.perf_counter()
+        finally:
+            # Rolls back an atomic node's uncommitted writes
+            db.close()
+
+    def run(self, context: Dict, targets: Optional[Iterable[str]] = None,
+            trace_user_id: Optional[int] = None) -> Tuple[Dict, Dict]:
+        """Run the nodes needed for ``targets``; returns (values, timings)"""
+        values = dict(context)
+        pending = self._needed(targets, values)
+        for node in pending:
+            missing = [i for i in node.inputs if i not in values and i not in self._producers]
+            if missing:
+                raise ValueError(f"{self.name}: node '{node.name}' needs {missing} in the context")
+
+        started = time.perf_counter()
+        running: Dict[Any, _Attempt] = {}
+        timings: List[Dict] = []
+
+        def settle(attempt: _Attempt, status: str, output: Any = None, error: Optional[str] = None,
+                   finished: Optional[float] = None):
+            node, inputs = attempt.node, attempt.inputs
+            finished = finished or time.perf_counter()
+            node_start = attempt.started or finished
+            if status != "ok":
+                if node.fallback is REQUIRED:
+                    raise NodeFailed(f"{self.name}: node '{node.name}' {status}: {error}")
+                output = node.fallback_output(inputs)
+            values[node.output] = output
+            entry = {
+                "node": node.name,
+                "status": status,
+                "start_ms": round((node_start - started) * 1000, 1),
+                "queued_ms": round((node_start - attempt.submitted) * 1000, 1),
+                "duration_ms": round((finished - node_start) * 1000, 1),
+                "deadline_ms": round(node.deadline * 1000),
+            }
+            if error:
+                entry["error"] = error
+            timings.append(entry)
+
+        while pending or running:
+            for node in [n for n in pending if all(i in values for i in n.inputs)]:
+                pending.remove(node)
+                attempt = _Attempt(node, {name: values[name] for name in node.inputs})
+                # Nodes run in the caller's context so their metric spans count towards its request
+                future = _executor.submit(contextvars.copy_context().run, self._call, attempt)
+                running[future] = attempt
+
+            if not running:
+                raise NodeFailed(f"{self.name}: {[n.name for n in pending]} can never run")
+            deadlines = [a.started + a.node.deadline for a in running.values() if a.started is not None]
+            if len(deadlines) < len(running):
+                # A queued node's deadline starts when it does; look again shortly
+                deadlines.append(time.perf_counter() + QUEUED_POLL_SECONDS)
+            done, _ = wait(list(running), timeout=max(0.0, min(deadlines) - time.perf_counter()),
+                           return_when=FIRST_COMPLETED)
+            for future in done:
+                attempt = running.pop(future)
+                try:
+                    output, finished = future.result()
+                except NodeExpired as e:
+                    settle(attempt, "timeout", error=str(e))
+                except Exception as e:
+                    print(f"{self.name}: node '{attempt.node.name}' failed: {str(e)}")
+                    settle(attempt, "error", error=str(e))
+                else:
+                    settle(attempt, "ok", output, finished=finished)
+
+            now = time.perf_counter()
+            for future, attempt in list(running.items()):
+                if attempt.expire(now):
+                    running.pop(future)
+                    settle(attempt, "timeout", error=f"exceeded {attempt.node.deadline}s deadline",
+                           finished=now)
+
+        wall_ms = round((time.perf_counter() - started) * 1000, 1)
+        summary = {
+            "dag": self.name,
+            "wall_ms": wall_ms,
+            "node_ms_total": round(sum(t["duration_ms"] for t in timings), 1),
+            "nodes": sorted(timings, key=lambda t: t["start_ms"]),
+        }
+        if trace_user_id is not None and timings:
+            self._trace(trace_user_id, summary)
+        return values, summary
+
+    def _trace(self, user_id: int, summary: Dict):
+        degraded = [t["node"] for t in summary["nodes"] if t["status"] != "ok"]
+        explanation = (f"{self.name}: {len(summary['nodes'])} steps in {summary['wall_ms']:.0f} ms "
+                       f"({summary['node_ms_total']:.0f} ms of work)")
+        if degraded:
+            explanation += f"; fallback used for {', '.join(degraded)}"
+        trace_writer.submit(
+            user_id=user_id,
+            agent_name="Orchestrator",
+            plan_chosen={"dag": self.name, "fallbacks": degraded},
+            tools_called={"timings": summary},
+            explanation=explanation,
+        )
+
+# Check-in pipeline: observe -> reason -> (meal plans | yoga plan)
+
+def _observe(db: Session, user_id: int) -> Dict:
+    return ObserveAgent(db).collect_daily_data(user_id)
+
+def _reason(db: Session, user_id: int, observed: Dict) -> Dict:
+    return ReasonerAgent(db).reason(user_id, observed_data=observed)
+
+def _default_reasoning(**inputs) -> Dict:
+    return {
+        "energy_trend": "stable",
+        "appetite_trend": "stable",
+        "confidence": 0.0,
+        "rules_triggered": [],
+        "memory_retrieved": [],
+        "recommendations": default_recommendations(),
+        "explanation": "Reasoning was unavailable, so balanced defaults were used.",
+    }
+
+def _split_ingredients(db: Session, user_id: int, ingredients: Optional[str]) -> Dict[str, List[str]]:
+    """Ingredients for each meal, or none if there are none or the USDA quota is used up"""
+    ingredients_list = [ing.strip() for ing in (ingredients or "").split(",") if ing.strip()]
+    if not ingredients_list or not FairnessAgent(db).check_api_quota("usda", user_id)["allowed"]:
+        return {}
+
+    # Distribute ingredients intelligently across meals
+    total_ingredients = len(ingredients_list)
+    ingredients_per_meal = max(3, total_ingredients // len(MEAL_TYPES))
+    meals = {}
+    for idx, meal_type in enumerate(MEAL_TYPES):
+        start_idx = idx * ingredients_per_meal
+        end_idx = start_idx + ingredients_per_meal if idx < len(MEAL_TYPES) - 1 else total_ingredients
+        meal_ingredients = ingredients_list[start_idx:end_idx]
+
+        # Ensure each meal has at least some ingredients
+        if not meal_ingredients:
+            # For snacks, use remaining ingredients or a subset
+            if meal_type == "snack":
+                meal_ingredients = ingredients_list[-3:] if len(ingredients_list) >= 3 else ingredients_list
+            else:
+                meal_ingredients = ingredients_list[:3] if len(ingredients_list) >= 3 else ingredients_list
+        meals[meal_type] = meal_ingredients
+    return meals
+
+def _meal_node(meal_type: str) -> Node:
+    def plan_meal(db: Session, user_id: int, reasoning: Dict, meal_ingredients: Dict) -> Optional[Dict]:
+        if not meal_ingredients.get(meal_type):
+            return None
+        plan = NutritionAgent(db, user_id=user_id).create_nutrition_plan(
+            user_id=user_id,
+            meal_type=meal_type,
+            ingredients=meal_ingredients[meal_type],
+            recommendations=reasoning["recommendations"]
+        )
+        FairnessAgent(db).record_api_call("usda", user_id)
+        return {
+            "id": plan.id,
+            "meal_type": plan.meal_type,
+            "recipe_name": plan.recipe_name,
+            "nutrients": plan.nutrients,
+            "instructions": plan.recipe_instructions,
+            "ingredients": plan.ingredients,
+            "sattvic_score": plan.sattvic_score,
+            "simplicity_index": plan.meal_simplicity_index
+        }
+
+    return Node(f"meal_{meal_type}", plan_meal, ["user_id", "reasoning", "meal_ingredients"],
+                deadline=MEAL_DEADLINE_SECONDS, fallback=None, atomic=True)
+
+def _plan_yoga(db: Session, user_id: int, yoga_experience: str, reasoning: Dict) -> Optional[Dict]:
+    fairness_agent = FairnessAgent(db)
+    if not fairness_agent.check_api_quota("youtube", user_id)["allowed"]:
+        return None
+    yoga_plan = YogaAgent(db, user_id=user_id).generate_yoga_plan(
+        user_id=user_id,
+        session_type=reasoning["recommendations"]["yoga"]["session_type"],
+        duration_minutes=reasoning["recommendations"]["yoga"]["duration_minutes"],
+        energy_trend=reasoning["energy_trend"],
+        stress_level=reasoning.get("rules_triggered", [{}])[0].get("condition", "50") if reasoning.get("rules_triggered") else 50,
+        yoga_experience=yoga_experience
+    )
+    fairness_agent.record_api_call("youtube", user_id)
+    return {
+        "id": yoga_plan.id,
+        "session_type": yoga_plan.session_type,
+        "duration_minutes": yoga_plan.duration_minutes,
+        "youtube_url": yoga_plan.youtube_url,
+        "youtube_title": yoga_plan.youtube_title,
+        "description": yoga_plan.description
+    }
+
+checkin_pipeline = Orchestrator("checkin", [
+    Node("observe", _observe, ["user_id"], output="observed", deadline=REASON_DEADLINE_SECONDS),
+    Node("reason", _reason, ["user_id", "observed"], output="reasoning",
+         deadline=REASON_DEADLINE_SECONDS, fallback=_default_reasoning),
+    Node("split_ingredients", _split_ingredients, ["user_id", "ingredients"], output="meal_ingredients",
+         deadline=REASON_DEADLINE_SECONDS, fallback={}),
+    *[_meal_node(meal_type) for meal_type in MEAL_TYPES],
+    Node("yoga", _plan_yoga, ["user_id", "yoga_experience", "reasoning"], output="yoga_plan",
+         deadline=YOGA_DEADLINE_SECONDS, fallback=None, atomic=True),
+])
+
+def checkin_plans(values: Dict) -> Dict:
+    """The check-in response's ``plans`` from a pipeline run"""
+    return {
+        "nutrition": [values[f"meal_{m}"] for m in MEAL_TYPES if values.get(f"meal_{m}")],
+        "yoga": values.get("yoga_plan"),
+    }
@@ -1,10 +1,28 @@
 from typing import Dict, List, Optional
 from sqlalchemy.orm import Session
-from database import DecisionTrace, Memory
+from database import Memory
+from trace_store import trace_writer
+from metrics import timed
 from .ml_predictor import FatigueAppetitePredictor
 from .observe_agent import ObserveAgent
 from datetime import datetime
 
+def default_recommendations() -> Dict:
+    """Balanced plan recommendations, before any rule adjusts them"""
+    return {
+        "yoga": {
+            "session_type": "balanced",
+            "duration_minutes": 30,
+            "intensity": "medium",
+        },
+        "nutrition": {
+            "meal_complexity": "medium",
+            "focus": "balanced_sattvic",
+            "portion_size": "normal",
+        },
+        "special_actions": [],
+    }
+
 class ReasonerAgent:
     """NSMR Core: Applies symbolic wellness rules + ML predictions to select plans"""
     
@@ -13,10 +31,12 @@ class ReasonerAgent:
         self.ml_predictor = FatigueAppetitePredictor()
         self.observe_agent = ObserveAgent(db)
     
-    def reason(self, user_id: int) -> Dict:
+    @timed("reasoner.reason")
+    def reason(self, user_id: int, observed_data: Optional[Dict] = None) -> Dict:
         """Main reasoning function"""
-        # Observe
-        observed_data = self.observe_agent.collect_daily_data(user_id)
+        # Observe (unless the caller already did)
+        if observed_data is None:
+            observed_data = self.observe_agent.collect_daily_data(user_id)
         
         # Predict
         ml_features = {
@@ -42,8 +62,9 @@ class ReasonerAgent:
             observed_data, energy_trend, appetite_trend, rules_triggered, memory_retrieved
         )
         
-        # Store decision trace
-        trace = DecisionTrace(
+        # Store decision trace (written in the background)
+        explanation = self._generate_explanation(rules_triggered, energy_trend, appetite_trend)
+        trace_writer.submit(
             user_id=user_id,
             date=datetime.utcnow(),
             agent_name="ReasonerAgent",
@@ -51,10 +72,8 @@ class ReasonerAgent:
             memory_retrieved=memory_retrieved,
             plan_chosen=plan_recommendations,
             tools_called={"ml_predictor": True},
-            explanation=self._generate_explanation(rules_triggered, energy_trend, appetite_trend)
+            explanation=explanation
         )
-        self.db.add(trace)
-        self.db.commit()
         
         return {
             "energy_trend": energy_trend,
@@ -63,7 +82,7 @@ class ReasonerAgent:
             "rules_triggered": rules_triggered,
             "memory_retrieved": memory_retrieved,
             "recommendations": plan_recommendations,
-            "explanation": trace.explanation,
+            "explanation": explanation,
         }
     
     def _apply_wellness_rules(self, data: Dict, energy_trend: str, appetite_trend: str) -> List[Dict]:
@@ -146,19 +165,7 @@ class ReasonerAgent:
     def _generate_recommendations(self, data: Dict, energy_trend: str, appetite_trend: str, 
                                  rules: List[Dict], memory: List[Dict]) -> Dict:
         """Generate plan recommendations"""
-        recommendations = {
-            "yoga": {
-                "session_type": "balanced",
-                "duration_minutes": 30,
-                "intensity": "medium",
-            },
-            "nutrition": {
-                "meal_complexity": "medium",
-                "focus": "balanced_sattvic",
-                "portion_size": "normal",
-            },
-            "special_actions": [],
-        }
+        recommendations = default_recommendations()
         
         # Apply rule-based modifications
         for rule in rules:
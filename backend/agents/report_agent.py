@@ -1,12 +1,16 @@
-from typing import Dict, List
+from typing import Dict, List, Optional
 from sqlalchemy.orm import Session
-from database import CheckIn, QuizResponse, NutritionPlan, YogaPlan, Progress
-from datetime import datetime, timedelta
-from sqlalchemy import func
+from database import DailyRollup, Progress
+from datetime import date, datetime, timedelta
+from rollups import get_rollups
+from progress_snapshots import get_snapshot
+from timeseries import series_stats, trend_label
 
 class ReportAgent:
     """Generates weekly & monthly progress summaries with insights"""
     
+    PERIOD_DAYS = {"weekly": 7, "monthly": 30}
+    
     def __init__(self, db: Session):
         self.db = db
     
@@ -15,43 +19,45 @@ class ReportAgent:
         today = datetime.utcnow().date()
         week_start = today - timedelta(days=7)
         
-        # Collect data
-        checkins = self.db.query(CheckIn).filter(
-            CheckIn.user_id == user_id,
-            CheckIn.date >= week_start
-        ).all()
-        
-        quizzes = self.db.query(QuizResponse).filter(
-            QuizResponse.user_id == user_id,
-            QuizResponse.date >= week_start
-        ).all()
-        
-        nutrition_plans = self.db.query(NutritionPlan).filter(
-            NutritionPlan.user_id == user_id,
-            NutritionPlan.date >= week_start
-        ).all()
-        
-        yoga_plans = self.db.query(YogaPlan).filter(
-            YogaPlan.user_id == user_id,
-            YogaPlan.date >= week_start
-        ).all()
+        # Collect data (one pre-aggregated row per day)
+        days = get_rollups(self.db, user_id, week_start)
+        report = self.build_weekly_report(days, week_start, today)
+        report["progress"] = self.progress_summary(user_id, today)
+        return report
+    
+    def progress_summary(self, user_id: int, day: date, snapshot: Optional[Progress] = None) -> Dict:
+        """The weekly report's progress block, from the user's snapshot for ``day``
+        (looked up unless given)"""
+        if snapshot is None:
+            snapshot = get_snapshot(self.db, user_id, day)
+        return {
+            "yoga_streak": snapshot.yoga_streak,
+            "consistency_percentage": round(snapshot.consistency_percentage, 1),
+            "stress_reduction": round(snapshot.stress_reduction, 1),
+            "adherence_improvement": round(snapshot.adherence_improvement, 1),
+        }
+    
+    def build_weekly_report(self, days: List[DailyRollup], week_start: date, today: date) -> Dict:
+        """Weekly report from already-loaded rollups"""
+        checkin_count = sum(d.checkin_count for d in days)
+        quiz_count = sum(d.quiz_count for d in days)
         
         # Calculate metrics
-        avg_adherence = sum(c.adherence for c in checkins) / len(checkins) if checkins else 0
-        avg_stress = sum(q.stress_score for q in quizzes) / len(quizzes) if quizzes else 50
-        avg_motivation = sum(q.motivation_score for q in quizzes) / len(quizzes) if quizzes else 50
+        avg_adherence = sum(d.adherence_sum for d in days) / checkin_count if checkin_count else 0
+        avg_stress = sum(d.stress_sum for d in days) / quiz_count if quiz_count else 50
+        avg_motivation = sum(d.motivation_sum for d in days) / quiz_count if quiz_count else 50
         
         # Nutrition totals
-        total_calories = sum(n.nutrients.get("calories", 0) for n in nutrition_plans if n.nutrients)
-        total_protein = sum(n.nutrients.get("protein", 0) for n in nutrition_plans if n.nutrients)
-        total_fiber = sum(n.nutrients.get("fiber", 0) for n in nutrition_plans if n.nutrients)
+        total_calories = sum(d.calories_total for d in days)
+        total_protein = sum(d.protein_total for d in days)
+        total_fiber = sum(d.fiber_total for d in days)
         
         # Yoga consistency
-        yoga_days = len(yoga_plans)
+        yoga_days = sum(d.yoga_sessions for d in days)
         yoga_consistency = (yoga_days / 7) * 100
         
         # Insights
-        insights = self._generate_insights(checkins, quizzes, nutrition_plans, yoga_plans)
+        insights = self._generate_insights(days)
         
         return {
             "period": "weekly",
@@ -69,7 +75,7 @@ class ReportAgent:
                 }
             },
             "insights": insights,
-            "barriers_faced": self._identify_barriers(checkins, quizzes),
+            "barriers_faced": self._identify_barriers(days),
             "recommendations": self._generate_recommendations(avg_adherence, avg_stress, yoga_consistency)
         }
     
@@ -79,30 +85,15 @@ class ReportAgent:
         month_start = today - timedelta(days=30)
         
         # Similar to weekly but for 30 days
-        checkins = self.db.query(CheckIn).filter(
-            CheckIn.user_id == user_id,
-            CheckIn.date >= month_start
-        ).all()
-        
-        quizzes = self.db.query(QuizResponse).filter(
-            QuizResponse.user_id == user_id,
-            QuizResponse.date >= month_start
-        ).all()
-        
-        nutrition_plans = self.db.query(NutritionPlan).filter(
-            NutritionPlan.user_id == user_id,
-            NutritionPlan.date >= month_start
-        ).all()
-        
-        yoga_plans = self.db.query(YogaPlan).filter(
-            YogaPlan.user_id == user_id,
-            YogaPlan.date >= month_start
-        ).all()
-        
-        # Trends
-        stress_trend = self._calculate_trend([q.stress_score for q in quizzes])
-        motivation_trend = self._calculate_trend([q.motivation_score for q in quizzes])
-        adherence_trend = self._calculate_trend([c.adherence for c in checkins])
+        days = get_rollups(self.db, user_id, month_start)
+        return self.build_monthly_report(days, month_start, today)
+    
+    def build_monthly_report(self, days: List[DailyRollup], month_start: date, today: date) -> Dict:
+        """Monthly report from already-loaded rollups"""
+        # Trends over daily averages
+        stress_trend = self._calculate_trend([d.avg_stress for d in days if d.quiz_count])
+        motivation_trend = self._calculate_trend([d.avg_motivation for d in days if d.quiz_count])
+        adherence_trend = self._calculate_trend([d.avg_adherence for d in days if d.checkin_count])
         
         return {
             "period": "monthly",
@@ -114,53 +105,105 @@ class ReportAgent:
                 "adherence": adherence_trend,
             },
             "summary": {
-                "total_checkins": len(checkins),
-                "total_quizzes": len(quizzes),
-                "total_meals": len(nutrition_plans),
-                "total_yoga_sessions": len(yoga_plans),
+                "total_checkins": sum(d.checkin_count for d in days),
+                "total_quizzes": sum(d.quiz_count for d in days),
+                "total_meals": sum(d.meals for d in days),
+                "total_yoga_sessions": sum(d.yoga_sessions for d in days),
             },
             "next_month_strategy": self._generate_next_month_strategy(
                 stress_trend, motivation_trend, adherence_trend
             )
         }
     
-    def _generate_insights(self, checkins, quizzes, nutrition_plans, yoga_plans) -> List[str]:
-        """Generate insights from data"""
+    def generate_range_report(self, user_id: int, start: date, end: date) -> Dict:
+        """Generate a report for an arbitrary date range (inclusive)"""
+        days = get_rollups(self.db, user_id, start, end)
+        span_days = (end - start).days + 1
+        
+        checkin_days = [d for d in days if d.checkin_count]
+        quiz_days = [d for d in days if d.quiz_count]
+        meal_days = [d for d in days if d.meals]
+        
+        series = {
+            "adherence": (checkin_days, "avg_adherence"),
+            "sleep": (checkin_days, "avg_sleep"),
+            "mood": (checkin_days, "avg_mood"),
+            "energy": (checkin_days, "avg_energy"),
+            "stress": (quiz_days, "avg_stress"),
+            "motivation": (quiz_days, "avg_motivation"),
+            "protein": (meal_days, "protein_total"),
+            "fiber": (meal_days, "fiber_total"),
+            "calcium": (meal_days, "calcium_total"),
+        }
+        metrics = {
+            name: series_stats([d.day for d in rows], [getattr(d, attr) for d in rows])
+            for name, (rows, attr) in series.items()
+        }
+        
+        checkin_count = sum(d.checkin_count for d in days)
+        quiz_count = sum(d.quiz_count for d in days)
+        avg_adherence = sum(d.adherence_sum for d in days) / checkin_count if checkin_count else 0
+        avg_stress = sum(d.stress_sum for d in days) / quiz_count if quiz_count else 50
+        yoga_days = len([d for d in days if d.yoga_sessions])
+        yoga_consistency = (yoga_days / span_days) * 100
+        
+        return {
+            "period": "custom",
+            "start_date": start.isoformat(),
+            "end_date": end.isoformat(),
+            "days": span_days,
+            "active_days": len(days),
+            "metrics": metrics,
+            "summary": {
+                "total_checkins": checkin_count,
+                "total_quizzes": quiz_count,
+                "total_meals": sum(d.meals for d in days),
+                "total_yoga_sessions": sum(d.yoga_sessions for d in days),
+                "yoga_consistency": round(yoga_consistency, 1),
+            },
+            "insights": self._generate_insights(days),
+            "barriers_faced": self._identify_barriers(days),
+            "recommendations": self._generate_recommendations(avg_adherence, avg_stress, yoga_consistency)
+        }
+    
+    def _generate_insights(self, days: List[DailyRollup]) -> List[str]:
+        """Generate insights from daily rollups"""
         insights = []
         
-        if checkins:
-            avg_sleep = sum(c.sleep_hours for c in checkins) / len(checkins)
+        checkin_count = sum(d.checkin_count for d in days)
+        if checkin_count:
+            avg_sleep = sum(d.sleep_sum for d in days) / checkin_count
             if avg_sleep < 6:
                 insights.append("Sleep quality is below optimal. Consider earlier bedtime routines.")
             elif avg_sleep >= 8:
                 insights.append("Great sleep consistency! This supports your wellness goals.")
         
-        if quizzes:
-            recent_stress = quizzes[-1].stress_score if quizzes else 50
+        quiz_days = [d for d in days if d.quiz_count]
+        if quiz_days:
+            recent_stress = quiz_days[-1].avg_stress
             if recent_stress > 70:
                 insights.append("Stress levels are elevated. Focus on gentle yoga and meditation.")
         
-        if yoga_plans:
-            if len(yoga_plans) >= 5:
+        yoga_sessions = sum(d.yoga_sessions for d in days)
+        if yoga_sessions:
+            if yoga_sessions >= 5:
                 insights.append("Excellent yoga consistency! Keep up the momentum.")
-            elif len(yoga_plans) < 3:
+            elif yoga_sessions < 3:
                 insights.append("Consider increasing yoga frequency for better results.")
         
         return insights
     
-    def _identify_barriers(self, checkins, quizzes) -> List[str]:
+    def _identify_barriers(self, days: List[DailyRollup]) -> List[str]:
         """Identify barriers to adherence"""
         barriers = []
         
-        if checkins:
-            low_adherence_days = [c for c in checkins if c.adherence < 40]
-            if len(low_adherence_days) > 2:
-                barriers.append("Low adherence on multiple days - plans may be too complex")
+        low_adherence_days = [d for d in days if d.checkin_count and d.avg_adherence < 40]
+        if len(low_adherence_days) > 2:
+            barriers.append("Low adherence on multiple days - plans may be too complex")
         
-        if quizzes:
-            low_motivation = [q for q in quizzes if q.motivation_score < 40]
-            if len(low_motivation) > 1:
-                barriers.append("Motivation dips detected - consider reward-based planning")
+        low_motivation_days = [d for d in days if d.quiz_count and d.avg_motivation < 40]
+        if len(low_motivation_days) > 1:
+            barriers.append("Motivation dips detected - consider reward-based planning")
         
         return barriers
     
@@ -180,20 +223,8 @@ class ReportAgent:
         return recommendations
     
     def _calculate_trend(self, values: List[float]) -> str:
-        """Calculate trend (improving, declining, stable)"""
-        if len(values) < 2:
-            return "insufficient_data"
-        
-        first_half = sum(values[:len(values)//2]) / (len(values)//2)
-        second_half = sum(values[len(values)//2:]) / (len(values) - len(values)//2)
-        
-        diff = second_half - first_half
-        if diff > 5:
-            return "improving"
-        elif diff < -5:
-            return "declining"
-        else:
-            return "stable"
+        """Calculate trend (improving, declining, stable) from a least-squares slope"""
+        return trend_label(values)
     
     def _generate_next_month_strategy(self, stress_trend: str, motivation_trend: str, 
                                      adherence_trend: str) -> List[str]:
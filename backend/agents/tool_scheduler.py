@@ -0,0 +1,199 @@
+import asyncio
+import heapq
+import itertools
+import os
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Dict, Optional
+
+from metrics import record_external_call
+
+
+class SchedulerTimeout(Exception):
+    """Raised when a queued tool call is not dispatched in time"""
+
+
+class _Ticket:
+    __slots__ = ("provider", "user_id", "start_tag", "finish_tag", "enqueued_at", "cancelled")
+
+    def __init__(self, provider: str, user_id: Any, start_tag: float, finish_tag: float):
+        self.provider = provider
+        self.user_id = user_id
+        self.start_tag = start_tag
+        self.finish_tag = finish_tag
+        self.enqueued_at = time.monotonic()
+        self.cancelled = False
+
+
+class _ProviderQueue:
+    """Per-provider WFQ state: virtual clock, per-user finish tags, waiting heap"""
+
+    def __init__(self, concurrency: int):
+        self.concurrency = concurrency
+        self.in_flight = 0
+        self.virtual_time = 0.0
+        self.last_finish: Dict[Any, float] = {}
+        self.heap = []
+        self.user_depth: Dict[Any, int] = {}
+        self.dispatched = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def head(self) -> Optional[_Ticket]:
+        while self.heap and self.heap[0][2].cancelled:
+            heapq.heappop(self.heap)
+        return self.heap[0][2] if self.heap else None
+
+
+class ToolCallScheduler:
+    """Weighted fair queueing for outbound USDA, YouTube and OpenAI calls.
+
+    Each call is tagged with a virtual finish time of
+    ``max(virtual_time, user's last finish) + cost / weight`` and calls are
+    dispatched in tag order, at most ``concurrency`` at a time per provider.
+    A user with a deep backlog accumulates large tags, so a light user's
+    single call is dispatched ahead of it instead of waiting behind it.
+    """
+
+    def __init__(self, concurrency: Optional[Dict[str, int]] = None,
+                 default_concurrency: int = 4, queue_timeout: float = 30.0):
+        self.concurrency = concurrency or {}
+        self.default_concurrency = default_concurrency
+        self.queue_timeout = queue_timeout
+        self.user_weights: Dict[Any, float] = {}
+        self._providers: Dict[str, _ProviderQueue] = {}
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+
+    def _queue(self, provider: str) -> _ProviderQueue:
+        queue = self._providers.get(provider)
+        if queue is None:
+            limit = self.concurrency.get(provider, self.default_concurrency)
+            queue = _ProviderQueue(max(1, limit))
+            self._providers[provider] = queue
+        return queue
+
+    def set_weight(self, user_id: Any, weight: float):
+        """Set a user's share; lower weights are dispatched less often"""
+        with self._cond:
+            self.user_weights[user_id] = max(weight, 0.01)
+
+    def call(self, provider: str, user_id: Any, fn: Callable, *args,
+             cost: float = 1.0, queue_timeout: Optional[float] = None, **kwargs):
+        """Run ``fn(*args, **kwargs)`` once the scheduler grants a slot"""
+        ticket = self._acquire(provider, user_id, cost,
+                               self.queue_timeout if queue_timeout is None else queue_timeout)
+        started = time.perf_counter()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            record_external_call(provider, started, error=e)
+            raise
+        finally:
+            self._release(ticket)
+        record_external_call(provider, started, result)
+        return result
+
+    @asynccontextmanager
+    async def slot(self, provider: str, user_id: Any, cost: float = 1.0,
+                   queue_timeout: Optional[float] = None):
+        """Hold a slot for the duration of an async block, e.g. a streamed completion"""
+        timeout = self.queue_timeout if queue_timeout is None else queue_timeout
+        pending = asyncio.ensure_future(asyncio.to_thread(self._acquire, provider, user_id, cost, timeout))
+        try:
+            ticket = await asyncio.shield(pending)
+        except asyncio.CancelledError:
+            # The waiting thread may still be granted a slot; hand it back
+            pending.add_done_callback(
+                lambda f: f.cancelled() or f.exception() is not None or self._release(f.result())
+            )
+            raise
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            record_external_call(provider, started, error=e)
+            raise
+        finally:
+            self._release(ticket)
+        record_external_call(provider, started)
+
+    def _acquire(self, provider: str, user_id: Any, cost: float, timeout: float) -> _Ticket:
+        with self._cond:
+            queue = self._queue(provider)
+            weight = self.user_weights.get(user_id, 1.0)
+            start = max(queue.virtual_time, queue.last_finish.get(user_id, 0.0))
+            ticket = _Ticket(provider, user_id, start, start + cost / weight)
+            queue.last_finish[user_id] = ticket.finish_tag
+            heapq.heappush(queue.heap, (ticket.finish_tag, next(self._seq), ticket))
+            queue.user_depth[user_id] = queue.user_depth.get(user_id, 0) + 1
+
+            deadline = ticket.enqueued_at + timeout
+            while not (queue.head() is ticket and queue.in_flight < queue.concurrency):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    ticket.cancelled = True
+                    queue.timeouts += 1
+                    self._leave_queue(queue, ticket)
+                    self._cond.notify_all()
+                    raise SchedulerTimeout(f"{provider} call for user {user_id} timed out in queue")
+                self._cond.wait(remaining)
+
+            heapq.heappop(queue.heap)
+            self._leave_queue(queue, ticket)
+            queue.in_flight += 1
+            queue.virtual_time = max(queue.virtual_time, ticket.start_tag)
+
+            waited = time.monotonic() - ticket.enqueued_at
+            queue.dispatched += 1
+            queue.total_wait += waited
+            queue.max_wait = max(queue.max_wait, waited)
+            # The next ticket in line may be dispatchable as well
+            self._cond.notify_all()
+            return ticket
+
+    def _leave_queue(self, queue: _ProviderQueue, ticket: _Ticket):
+        depth = queue.user_depth.get(ticket.user_id, 0) - 1
+        if depth > 0:
+            queue.user_depth[ticket.user_id] = depth
+        else:
+            queue.user_depth.pop(ticket.user_id, None)
+            # Idle users restart from the current virtual time
+            if queue.last_finish.get(ticket.user_id, 0.0) <= queue.virtual_time:
+                queue.last_finish.pop(ticket.user_id, None)
+
+    def _release(self, ticket: _Ticket):
+        with self._cond:
+            queue = self._providers[ticket.provider]
+            queue.in_flight -= 1
+            self._cond.notify_all()
+
+    def metrics(self) -> Dict:
+        """Queue depth, in-flight and wait statistics per provider"""
+        with self._cond:
+            return {
+                provider: {
+                    "queue_depth": sum(queue.user_depth.values()),
+                    "in_flight": queue.in_flight,
+                    "concurrency": queue.concurrency,
+                    "dispatched": queue.dispatched,
+                    "timeouts": queue.timeouts,
+                    "avg_wait_ms": round(queue.total_wait / queue.dispatched * 1000, 2) if queue.dispatched else 0.0,
+                    "max_wait_ms": round(queue.max_wait * 1000, 2),
+                    "queued_users": len(queue.user_depth),
+                    "per_user_depth": {str(user): depth for user, depth in queue.user_depth.items()},
+                }
+                for provider, queue in self._providers.items()
+            }
+
+
+tool_scheduler = ToolCallScheduler(
+    concurrency={
+        "usda": int(os.getenv("TOOL_CONCURRENCY_USDA", "4")),
+        "youtube": int(os.getenv("TOOL_CONCURRENCY_YOUTUBE", "2")),
+        "openai": int(os.getenv("TOOL_CONCURRENCY_OPENAI", "4")),
+    },
+    queue_timeout=float(os.getenv("TOOL_QUEUE_TIMEOUT", "30")),
+)
@@ -3,22 +3,29 @@ import requests
 from typing import Dict, List, Optional
 from sqlalchemy.orm import Session
 from database import YogaPlan
+from rollups import apply_yoga_plan
+from metrics import timed
 from datetime import datetime
 from dotenv import load_dotenv
+from .tool_scheduler import tool_scheduler
 
 load_dotenv()
 
+YOUTUBE_API_URL = os.getenv("YOUTUBE_API_URL", "https://www.googleapis.com/youtube/v3")
+
 class YogaAgent:
     """Daily/weekly yoga plan + YouTube video recommendations"""
     
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, user_id: Optional[int] = None):
         self.db = db
+        self.user_id = user_id
         self.youtube_api_key = os.getenv("YOUTUBE_API_KEY")
     
+    @timed("yoga.search_youtube_video")
     def search_youtube_video(self, query: str, duration_minutes: Optional[int] = None) -> Dict:
         """Search for YouTube yoga videos"""
         try:
-            url = "https://www.googleapis.com/youtube/v3/search"
+            url = f"{YOUTUBE_API_URL}/search"
             params = {
                 "key": self.youtube_api_key,
                 "q": query,
@@ -34,7 +41,7 @@ class YogaAgent:
                 elif duration_minutes <= 30:
                     params["videoDuration"] = "medium"
             
-            response = requests.get(url, params=params, timeout=10)
+            response = tool_scheduler.call("youtube", self.user_id, requests.get, url, params=params, timeout=10)
             
             if response.status_code == 200:
                 data = response.json()
@@ -113,6 +120,7 @@ class YogaAgent:
         )
         
         self.db.add(plan)
+        apply_yoga_plan(self.db, plan)
         self.db.commit()
         self.db.refresh(plan)
         
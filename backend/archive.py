@@ -0,0 +1,308 @@
+"""
+Retention and archival of cold history.
+
+Rows older than the retention window are moved from the check-in, quiz,
+plan and trace tables into zstd-compressed Parquet files partitioned by
+table, year and month:
+
+    archive/checkins/year=2025/month=03/part-20250901T020000-3f9c2a-0.parquet
+
+``archive/manifest.json`` lists the committed part files and the
+watermark: every archived row is dated before it. Rows written below the
+watermark later (backdated imports) stay in the database until the next
+run archives them, so readers such as ``count_history`` combine the
+archive before the watermark with everything in the database. Daily
+rollups for archived days are kept, so reports spanning the cutoff are
+unaffected. Run it with:
+
+    python archive.py --days 180 --vacuum
+"""
+import argparse
+import json
+import os
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional
+
+from sqlalchemy import select, func, or_, true, Integer, Float, String, Text, DateTime, Date, Boolean, JSON
+from sqlalchemy.orm import Session
+
+from database import CheckIn, QuizResponse, NutritionPlan, YogaPlan, DecisionTrace, TraceRule
+
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "./archive")
+RETENTION_DAYS = int(os.getenv("RETENTION_DAYS", "180"))
+ARCHIVED_TABLES = [CheckIn, QuizResponse, NutritionPlan, YogaPlan, DecisionTrace]
+# Derived from archived rows, so dropped rather than archived
+PURGED_TABLES = [TraceRule]
+
+def _require_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        raise RuntimeError("Archiving requires pyarrow (pip install pyarrow)")
+
+def _manifest_path(archive_dir: str) -> str:
+    return os.path.join(archive_dir, "manifest.json")
+
+_manifest_cache: Dict[str, tuple] = {}
+
+def load_manifest(archive_dir: str = ARCHIVE_DIR) -> Dict:
+    """The archive manifest, re-read only when the file changes"""
+    path = _manifest_path(archive_dir)
+    if not os.path.exists(path):
+        return {"watermark": None, "files": []}
+    mtime = os.stat(path).st_mtime_ns
+    cached = _manifest_cache.get(path)
+    if cached is None or cached[0] != mtime:
+        with open(path) as f:
+            cached = (mtime, json.load(f))
+        _manifest_cache[path] = cached
+    return cached[1]
+
+def _save_manifest(manifest: Dict, archive_dir: str):
+    path = _manifest_path(archive_dir)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=1)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+def get_watermark(archive_dir: str = ARCHIVE_DIR) -> Optional[datetime]:
+    """Rows dated before this are archived; None if nothing is"""
+    watermark = load_manifest(archive_dir)["watermark"]
+    return datetime.fromisoformat(watermark) if watermark else None
+
+def _arrow_schema(model):
+    import pyarrow as pa
+
+    types = [
+        (JSON, pa.string()),  # stored as JSON text
+        (DateTime, pa.timestamp("us")),
+        (Date, pa.date32()),
+        (Boolean, pa.bool_()),
+        (Integer, pa.int64()),
+        (Float, pa.float64()),
+        ((String, Text), pa.string()),
+    ]
+    fields = []
+    for column in model.__table__.columns:
+        arrow_type = next(t for sql_type, t in types if isinstance(column.type, sql_type))
+        fields.append(pa.field(column.name, arrow_type))
+    return pa.schema(fields)
+
+def _json_columns(model) -> List[str]:
+    return [c.name for c in model.__table__.columns if isinstance(c.type, JSON)]
+
+def _write_parts(model, rows: List[Dict], archive_dir: str, run_id: str, seq: int) -> List[Dict]:
+    """Write one part file per month present in ``rows``"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _arrow_schema(model)
+    json_columns = _json_columns(model)
+    by_month: Dict[tuple, List[Dict]] = {}
+    for row in rows:
+        by_month.setdefault((row["date"].year, row["date"].month), []).append(row)
+
+    entries = []
+    for (year, month), month_rows in sorted(by_month.items()):
+        columns = {
+            name: [json.dumps(r[name]) if name in json_columns and r[name] is not None else r[name]
+                   for r in month_rows]
+            for name in schema.names
+        }
+        relative = os.path.join(model.__tablename__, f"year={year}", f"month={month:02d}",
+                                f"part-{run_id}-{seq}.parquet")
+        path = os.path.join(archive_dir, relative)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        pq.write_table(pa.table(columns, schema=schema), path + ".tmp", compression="zstd")
+        os.replace(path + ".tmp", path)
+        entries.append({
+            "table": model.__tablename__,
+            "path": relative,
+            "rows": len(month_rows),
+            "min_date": min(r["date"] for r in month_rows).isoformat(),
+            "max_date": max(r["date"] for r in month_rows).isoformat(),
+        })
+    return entries
+
+def _finish_delete(db: Session, pending: Dict):
+    """Delete the rows a run archived: dated before its cutoff and no newer than the last id it read"""
+    cutoff = datetime.fromisoformat(pending["cutoff"])
+    max_ids = pending["max_ids"]
+    for model in ARCHIVED_TABLES:
+        db.query(model).filter(
+            model.date < cutoff, model.id <= max_ids.get(model.__tablename__, 0)
+        ).delete(synchronize_session=False)
+    db.query(TraceRule).filter(
+        TraceRule.date < cutoff, TraceRule.trace_id <= max_ids.get(DecisionTrace.__tablename__, 0)
+    ).delete(synchronize_session=False)
+    db.commit()
+
+def archive_old_data(db: Session, days: int = RETENTION_DAYS, archive_dir: str = ARCHIVE_DIR,
+                     chunk_size: int = 50000) -> Dict:
+    """Move rows older than ``days`` (whole UTC days) into the archive.
+
+    Part files are committed to the manifest, along with the last id read
+    from each table, before any row is deleted, so an interrupted run never
+    loses data and the next run finishes its deletes. Only rows that were
+    archived are deleted; rows dated below an earlier watermark but written
+    after that run are archived now.
+    """
+    _require_pyarrow()
+    today = datetime.combine(datetime.utcnow().date(), datetime.min.time())
+    manifest = load_manifest(archive_dir)
+    if manifest.get("pending"):
+        _finish_delete(db, manifest["pending"])
+        manifest = {**manifest, "pending": None}
+        _save_manifest(manifest, archive_dir)
+    previous = datetime.fromisoformat(manifest["watermark"]) if manifest["watermark"] else None
+    cutoff = today - timedelta(days=days)
+    if previous is not None:
+        cutoff = max(cutoff, previous)
+
+    run_id = f"{datetime.utcnow():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:6]}"
+    archived = {}
+    max_ids = {}
+    new_files = []
+    for model in ARCHIVED_TABLES:
+        table = model.__table__
+        last_id = 0
+        seq = 0
+        count = 0
+        while True:
+            stmt = select(table).where(table.c.date < cutoff, table.c.id > last_id)
+            rows = [dict(r._mapping) for r in db.execute(stmt.order_by(table.c.id).limit(chunk_size))]
+            if not rows:
+                break
+            new_files.extend(_write_parts(model, rows, archive_dir, run_id, seq))
+            last_id = rows[-1]["id"]
+            seq += 1
+            count += len(rows)
+        db.rollback()
+        archived[model.__tablename__] = count
+        max_ids[model.__tablename__] = last_id
+
+    if not new_files and cutoff == previous:
+        return {"watermark": cutoff.isoformat(), "archived": archived}
+    pending = {"cutoff": cutoff.isoformat(), "max_ids": max_ids}
+    manifest = {"watermark": cutoff.isoformat(), "files": manifest["files"] + new_files, "pending": pending}
+    _save_manifest(manifest, archive_dir)
+
+    _finish_delete(db, pending)
+    _save_manifest({**manifest, "pending": None}, archive_dir)
+
+    return {"watermark": cutoff.isoformat(), "archived": archived}
+
+def in_database(model, archive_dir: str = ARCHIVE_DIR):
+    """Condition for rows of ``model`` that are not also in the archive.
+
+    Only rows of an archive run whose deletes haven't finished are in both.
+    """
+    pending = load_manifest(archive_dir).get("pending")
+    if not pending:
+        return true()
+    return or_(model.date >= datetime.fromisoformat(pending["cutoff"]),
+               model.id > pending["max_ids"].get(model.__tablename__, 0))
+
+def _archive_dataset(model, start: Optional[datetime], end: Optional[datetime], archive_dir: str):
+    """Dataset over the committed part files that may hold rows in [start, end)"""
+    import pyarrow.dataset as ds
+
+    paths = [
+        os.path.join(archive_dir, entry["path"])
+        for entry in load_manifest(archive_dir)["files"]
+        if entry["table"] == model.__tablename__
+        and (start is None or datetime.fromisoformat(entry["max_date"]) >= start)
+        and (end is None or datetime.fromisoformat(entry["min_date"]) < end)
+    ]
+    if not paths:
+        return None
+    return ds.dataset(paths, schema=_arrow_schema(model), format="parquet")
+
+def _archive_filter(model, user_id: Optional[int], start: Optional[datetime], end: Optional[datetime]):
+    import pyarrow.dataset as ds
+
+    conditions = []
+    if user_id is not None:
+        conditions.append(ds.field("user_id") == user_id)
+    if start is not None:
+        conditions.append(ds.field("date") >= start)
+    if end is not None:
+        conditions.append(ds.field("date") < end)
+    expression = None
+    for condition in conditions:
+        expression = condition if expression is None else expression & condition
+    return expression
+
+def iter_archive(model, user_id: Optional[int] = None, start: Optional[datetime] = None,
+                 end: Optional[datetime] = None, columns: Optional[List[str]] = None,
+                 batch_size: int = 10000, archive_dir: str = ARCHIVE_DIR) -> Iterator[List[Dict]]:
+    """Archived rows of ``model`` in [start, end), one record batch of dicts at a time"""
+    if get_watermark(archive_dir) is None:
+        return
+    _require_pyarrow()
+    dataset = _archive_dataset(model, start, end, archive_dir)
+    if dataset is None:
+        return
+    json_columns = [c for c in _json_columns(model) if columns is None or c in columns]
+    for batch in dataset.to_batches(columns=columns, filter=_archive_filter(model, user_id, start, end),
+                                    batch_size=batch_size):
+        rows = batch.to_pylist()
+        for row in rows:
+            for name in json_columns:
+                if row[name] is not None:
+                    row[name] = json.loads(row[name])
+        if rows:
+            yield rows
+
+def read_archive(model, user_id: Optional[int] = None, start: Optional[datetime] = None,
+                 end: Optional[datetime] = None, columns: Optional[List[str]] = None,
+                 archive_dir: str = ARCHIVE_DIR) -> List[Dict]:
+    """Archived rows of ``model`` in [start, end) as dicts, JSON columns decoded"""
+    return [row for rows in iter_archive(model, user_id, start, end, columns, archive_dir=archive_dir)
+            for row in rows]
+
+def count_history(db: Session, model, user_id: int, archive_dir: str = ARCHIVE_DIR) -> int:
+    """Number of rows a user has in the database and the archive"""
+    watermark = get_watermark(archive_dir)
+    count = db.query(func.count(model.id)).filter(
+        model.user_id == user_id, in_database(model, archive_dir)
+    ).scalar()
+    if watermark is None:
+        return count
+
+    _require_pyarrow()
+    dataset = _archive_dataset(model, None, watermark, archive_dir)
+    if dataset is not None:
+        count += dataset.count_rows(filter=_archive_filter(model, user_id, None, watermark))
+    return count
+
+def vacuum(db: Session):
+    """Return freed pages to the filesystem (SQLite only)"""
+    if db.bind.dialect.name == "sqlite":
+        db.commit()
+        with db.bind.connect() as conn:
+            conn.exec_driver_sql("VACUUM")
+
+if __name__ == "__main__":
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Archive cold history to Parquet")
+    parser.add_argument("--days", type=int, default=RETENTION_DAYS, help="Keep this many days in the database")
+    parser.add_argument("--archive-dir", default=ARCHIVE_DIR)
+    parser.add_argument("--vacuum", action="store_true", help="Shrink the SQLite file afterwards")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        result = archive_old_data(db, args.days, args.archive_dir)
+        for table, count in result["archived"].items():
+            print(f"  - {table}: {count} rows archived")
+        print(f"✅ Archive watermark: {result['watermark']}")
+        if args.vacuum:
+            vacuum(db)
+            print("Vacuumed database.")
+    finally:
+        db.close()
@@ -0,0 +1,343 @@
+"""
+Micro-benchmarks for the agent and endpoint hot paths, with tracked baselines.
+
+Each benchmark runs at several data sizes against a fresh SQLite database
+filled by synth_data.py (a background population plus one user per
+history length); USDA calls are stubbed. Every case is timed in
+``--samples`` samples of enough calls to last ``--min-time`` seconds, in
+each of ``--processes`` fresh worker processes, and the samples are
+pooled so that process-to-process noise is part of the comparison.
+A case regresses when a one-sided Mann-Whitney U test finds it slower
+than the baseline (p < ``--alpha``) and its median is more than
+``--threshold`` slower; any regression makes the run exit non-zero.
+Baselines are machine specific and not tracked, so a comparison run
+refuses to start without one. Targets are imported as each benchmark is
+set up, and one that is missing from a tree is skipped there.
+
+Save a baseline on the base commit, then compare a change against it;
+on a noisy machine, measure the base revision in the same session instead:
+
+    python benchmarks/hot_paths.py --save
+    python benchmarks/hot_paths.py                      # compare, exit 1 on regression
+    python benchmarks/hot_paths.py --against main -k report --json out.json
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from statistics import median
+from typing import Callable, Dict, List, Tuple
+from unittest import mock
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BASELINE = os.path.join(BACKEND_DIR, "benchmarks", "baseline.json")
+
+HISTORY_DAYS = [30, 365, 730]
+BATCH_SIZES = [1, 100, 1000]
+INGREDIENT_COUNTS = [1, 3, 5]
+
+def build_database(population: int, seed: int) -> Dict[int, int]:
+    """Fill the database; returns history days -> id of a user with that much history"""
+    import numpy as np
+    from database import init_db, SessionLocal
+    from rollups import backfill_rollups
+    from synth_data import generate_chunk, insert_chunk
+
+    init_db()
+    rng = np.random.default_rng(seed)
+    end = datetime.utcnow()
+    db = SessionLocal(autoflush=False)
+    try:
+        next_id = 1
+        for offset in range(0, population, 100):
+            ids = np.arange(next_id, next_id + min(100, population - offset))
+            insert_chunk(db, generate_chunk(rng, ids, max(HISTORY_DAYS), end, with_traces=False), 5000)
+            next_id = int(ids[-1]) + 1
+        users = {}
+        for days in HISTORY_DAYS:
+            insert_chunk(db, generate_chunk(rng, np.array([next_id]), days, end, with_traces=False,
+                                            join_spread=0), 5000)
+            users[days] = next_id
+            next_id += 1
+        backfill_rollups(db)
+    finally:
+        db.close()
+    return users
+
+def _feature_batch(size: int) -> List[Dict]:
+    import random
+    rnd = random.Random(size)
+    return [{
+        "sleep_hours": round(rnd.uniform(4, 9), 1), "mood_score": rnd.randint(1, 10),
+        "adherence_avg": rnd.uniform(0, 100), "stress_score": rnd.randint(0, 100),
+        "motivation_score": rnd.randint(0, 100), "energy": rnd.uniform(0, 10),
+        "day_type": rnd.choice(["weekday", "weekend"]),
+    } for _ in range(size)]
+
+class _UsdaResponse:
+    status_code = 200
+
+    def __init__(self, query: str):
+        self.query = query
+
+    def json(self):
+        return {"foods": [{"description": self.query, "foodNutrients": [
+            {"nutrientName": "Energy", "value": 120}, {"nutrientName": "Protein", "value": 4.2},
+            {"nutrientName": "Fiber, total dietary", "value": 2.1}, {"nutrientName": "Calcium, Ca", "value": 30},
+            {"nutrientName": "Iron, Fe", "value": 1.1}, {"nutrientName": "Magnesium, Mg", "value": 25},
+        ]}]}
+
+def benchmarks(users: Dict[int, int]) -> List[Tuple[str, List[int], Callable[[int], Callable[[], object]]]]:
+    """(name, sizes, setup) where ``setup(size)`` returns the call to time.
+
+    Setups import their targets so that a tree without one (``--against``
+    an older revision) only loses that benchmark.
+    """
+    from database import SessionLocal
+
+    db = SessionLocal()
+
+    def predict(size):
+        from agents.ml_predictor import FatigueAppetitePredictor
+        predictor, batch = FatigueAppetitePredictor(), _feature_batch(size)
+        return lambda: [predictor.predict(features) for features in batch]
+
+    def wellness_rules(size):
+        from agents.reasoner_agent import ReasonerAgent
+        reasoner = ReasonerAgent(db)
+        observed = [{
+            "quiz": {"stress_score": f["stress_score"], "motivation_score": f["motivation_score"]},
+            "checkin": {"sleep_hours": f["sleep_hours"]},
+            "adherence": {"last_3_days_avg": f["adherence_avg"]},
+        } for f in _feature_batch(size)]
+        return lambda: [reasoner._apply_wellness_rules(data, "low", "normal") for data in observed]
+
+    def observe(days):
+        from agents.observe_agent import ObserveAgent
+        agent = ObserveAgent(db)
+        return lambda: (agent.collect_daily_data(users[days]), db.rollback())
+
+    def weekly_report(days):
+        from agents.report_agent import ReportAgent
+        agent = ReportAgent(db)
+        return lambda: (agent.generate_weekly_report(users[days]), db.rollback())
+
+    def dashboard_overview(days):
+        from routers import dashboard
+        overview = getattr(dashboard, "_dashboard_overview", None)
+        if overview is None:
+            # Before response caching the route itself was the (async) uncached body
+            loop = asyncio.new_event_loop()
+            return lambda: (loop.run_until_complete(dashboard.get_dashboard_overview(users[days], db)),
+                            db.rollback())
+        # The uncached body of GET /api/dashboard/{user_id}/overview
+        return lambda: (overview(users[days], db), db.rollback())
+
+    def recipe_nutrients(count):
+        from agents.nutrition_agent import NutritionAgent
+        agent = NutritionAgent(db)
+        agent.user_id = users[HISTORY_DAYS[0]]
+        ingredients = [{"name": name} for name in ["rice", "lentils", "spinach", "carrots", "oats"][:count]]
+        return lambda: agent._calculate_recipe_nutrients(ingredients)
+
+    return [
+        ("FatigueAppetitePredictor.predict", BATCH_SIZES, predict),
+        ("ReasonerAgent._apply_wellness_rules", BATCH_SIZES, wellness_rules),
+        ("ObserveAgent.collect_daily_data", HISTORY_DAYS, observe),
+        ("ReportAgent.generate_weekly_report", HISTORY_DAYS, weekly_report),
+        ("dashboard.get_dashboard_overview", HISTORY_DAYS, dashboard_overview),
+        ("NutritionAgent._calculate_recipe_nutrients", INGREDIENT_COUNTS, recipe_nutrients),
+    ]
+
+def calibrate(fn: Callable[[], object], min_time: float) -> int:
+    """Calls per sample so that a sample lasts at least ``min_time``"""
+    fn()
+    loops = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time:
+            return loops
+        loops = max(loops * 2, int(loops * min_time / max(elapsed, 1e-9) * 1.2))
+
+def run_worker(users: Dict[int, int], keyword: str, samples: int, min_time: float) -> Dict[str, List[float]]:
+    """Seconds per call for every case, one value per sample.
+
+    Cases are measured round-robin so that each one's samples are spread
+    over the whole run instead of sharing one stretch of machine noise.
+    """
+    cases = []
+    with mock.patch("agents.nutrition_agent.requests.get",
+                    lambda url, params=None, **kwargs: _UsdaResponse(params["query"])):
+        for name, sizes, setup in benchmarks(users):
+            if keyword and keyword.lower() not in name.lower():
+                continue
+            for size in sizes:
+                try:
+                    fn = setup(size)
+                except (ImportError, AttributeError, TypeError) as e:
+                    print(f"skipping {name}: {e}", file=sys.stderr)
+                    break
+                cases.append((f"{name}[{size}]", fn, calibrate(fn, min_time)))
+
+        results: Dict[str, List[float]] = {key: [] for key, _, _ in cases}
+        gc.disable()
+        try:
+            for _ in range(samples):
+                for key, fn, loops in cases:
+                    started = time.perf_counter()
+                    for _ in range(loops):
+                        fn()
+                    results[key].append((time.perf_counter() - started) / loops)
+                gc.collect()
+        finally:
+            gc.enable()
+    return results
+
+def compare(current: List[float], baseline: List[float], alpha: float, threshold: float) -> Dict:
+    from scipy.stats import mannwhitneyu
+
+    change = median(current) / median(baseline) - 1
+    slower = float(mannwhitneyu(current, baseline, alternative="greater").pvalue)
+    faster = float(mannwhitneyu(current, baseline, alternative="less").pvalue)
+    if slower < alpha and change > threshold:
+        verdict = "REGRESSED"
+    elif faster < alpha and change < -threshold:
+        verdict = "faster"
+    else:
+        verdict = "same"
+    return {"change": change, "p_slower": slower, "p_faster": faster, "verdict": verdict}
+
+def machine_info() -> Dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                                capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = ""
+    return {"python": platform.python_version(), "machine": platform.machine(),
+            "processor": platform.processor(), "cpus": os.cpu_count(), "commit": commit}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("-k", dest="keyword", help="Only run benchmarks whose name contains this")
+    parser.add_argument("--processes", type=int, default=3, help="Fresh worker processes to pool samples from")
+    parser.add_argument("--samples", type=int, default=10, help="Samples per case in each process")
+    parser.add_argument("--min-time", type=float, default=0.05, help="Seconds per sample")
+    parser.add_argument("--population", type=int, default=200, help="Background users with two years of history")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save", action="store_true", help="Store the results as the new baseline")
+    parser.add_argument("--alpha", type=float, default=0.01, help="Significance level of the U test")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Smallest median slowdown that counts")
+    parser.add_argument("--against", metavar="REV",
+                        help="Measure git revision REV in the same session and use it as the baseline")
+    parser.add_argument("--json", help="Also write the results to this file")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--backend-dir", default=BACKEND_DIR, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if not (args.worker or args.save or args.against or os.path.exists(args.baseline)):
+        parser.error(f"no baseline at {args.baseline}; record one with --save on the base commit "
+                     f"or compare with --against REV")
+    sys.path.insert(0, args.backend_dir)
+    os.environ.pop("METRICS_ENABLED", None)
+
+    if args.worker:
+        users = {int(days): user_id for days, user_id in json.loads(args.worker).items()}
+        print(json.dumps(run_worker(users, args.keyword, args.samples, args.min_time)))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        started = time.perf_counter()
+        users = build_database(args.population, args.seed)
+        print(f"Built the benchmark database in {time.perf_counter() - started:.1f}s")
+
+        trees = {"current": BACKEND_DIR}
+        if args.against:
+            worktree = os.path.join(tmp, "against")
+            added = subprocess.run(["git", "worktree", "add", "--detach", worktree, args.against],
+                                   cwd=BACKEND_DIR, capture_output=True, text=True)
+            if added.returncode:
+                sys.exit(f"Could not check out {args.against}: {added.stderr.strip()}")
+            root = subprocess.run(["git", "rev-parse", "--show-toplevel"], cwd=BACKEND_DIR,
+                                  capture_output=True, text=True, check=True).stdout.strip()
+            trees["against"] = os.path.join(worktree, os.path.relpath(BACKEND_DIR, root))
+
+        samples: Dict[str, Dict[str, List[float]]] = {tree: {} for tree in trees}
+        warnings = set()
+        try:
+            # Alternate the trees so that drift in machine speed hits both alike
+            for _ in range(args.processes):
+                for tree, backend_dir in trees.items():
+                    command = [sys.executable, __file__, "--worker", json.dumps(users),
+                               "--backend-dir", backend_dir, "--samples", str(args.samples),
+                               "--min-time", str(args.min_time)]
+                    if args.keyword:
+                        command += ["-k", args.keyword]
+                    worker = subprocess.run(command, cwd=backend_dir, capture_output=True, text=True)
+                    if worker.returncode:
+                        print(f"The {tree} worker failed (exit {worker.returncode}):", file=sys.stderr)
+                        print(worker.stderr, file=sys.stderr)
+                        sys.exit(worker.returncode)
+                    for line in worker.stderr.splitlines():
+                        if line.startswith("skipping ") and (tree, line) not in warnings:
+                            warnings.add((tree, line))
+                            print(f"{tree}: {line}")
+                    for key, values in json.loads(worker.stdout.strip().splitlines()[-1]).items():
+                        samples[tree].setdefault(key, []).extend(values)
+        finally:
+            if args.against:
+                subprocess.run(["git", "worktree", "remove", "--force", worktree], cwd=BACKEND_DIR,
+                               capture_output=True)
+
+    baseline = {}
+    if args.against:
+        baseline = {key: {"median": median(values), "samples": values}
+                    for key, values in samples["against"].items()}
+    elif not args.save and os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            saved = json.load(f)
+        baseline = saved["results"]
+        if {**saved.get("machine", {}), "commit": ""} != {**machine_info(), "commit": ""}:
+            print(f"warning: baseline was recorded on a different machine ({saved.get('machine')})")
+
+    results: Dict[str, Dict] = {}
+    regressions = 0
+    print(f"{'benchmark':<52} {'median':>10} {'baseline':>10} {'change':>8} {'p':>8}")
+    for key, values in samples["current"].items():
+        results[key] = {"median": median(values), "samples": values}
+        row = f"{key:<52} {median(values) * 1e6:>8.1f}us"
+        if key in baseline:
+            outcome = compare(values, baseline[key]["samples"], args.alpha, args.threshold)
+            results[key].update(outcome)
+            regressions += outcome["verdict"] == "REGRESSED"
+            p = outcome["p_slower"] if outcome["change"] >= 0 else outcome["p_faster"]
+            row += (f" {baseline[key]['median'] * 1e6:>8.1f}us {outcome['change']:>+7.1%} {p:>8.4f}"
+                    f"  {outcome['verdict']}")
+        elif not args.save:
+            row += "  (no baseline)"
+        print(row)
+
+    if args.save:
+        with open(args.baseline, "w") as f:
+            json.dump({"machine": machine_info(), "created": datetime.utcnow().isoformat(),
+                       "results": results}, f, indent=1)
+        print(f"Saved baseline to {args.baseline}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"machine": machine_info(), "results": results}, f, indent=1)
+    if regressions:
+        print(f"{regressions} benchmark(s) regressed")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Concurrent check-in write benchmark for the SQLite storage profiles.
+
+Each writer thread repeatedly does what a check-in request does: read the
+user, insert a check-in, bump the daily rollup and commit, while reader
+threads scan check-ins the way the dashboard and reports do. Every
+profile runs in a fresh subprocess against a fresh database file:
+
+    python benchmarks/sqlite_write_concurrency.py --threads 16 --writes 50
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def run_profile(threads: int, writes: int, readers: int) -> dict:
+    sys.path.insert(0, BACKEND_DIR)
+    from sqlalchemy import func
+    from database import init_db, SessionLocal, User, CheckIn
+    from rollups import apply_checkin
+
+    init_db()
+    db = SessionLocal()
+    db.add_all([User(id=i + 1, email=f"bench{i}@example.com", name="bench") for i in range(threads)])
+    db.commit()
+    db.close()
+
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    def worker(user_id: int):
+        db = SessionLocal()
+        try:
+            for _ in range(writes):
+                started = time.perf_counter()
+                try:
+                    db.query(User).filter(User.id == user_id).first()
+                    checkin = CheckIn(user_id=user_id, mood="happy", mood_score=7, adherence=80,
+                                      sleep_hours=7, energy=6, appetite=5)
+                    db.add(checkin)
+                    db.flush()
+                    apply_checkin(db, checkin)
+                    db.commit()
+                    with lock:
+                        latencies.append(time.perf_counter() - started)
+                except Exception as e:
+                    db.rollback()
+                    with lock:
+                        errors.append(type(e).__name__)
+        finally:
+            db.close()
+
+    done = threading.Event()
+    reads = []
+
+    def reader():
+        db = SessionLocal()
+        try:
+            while not done.is_set():
+                db.query(CheckIn.user_id, func.avg(CheckIn.adherence)).group_by(CheckIn.user_id).all()
+                db.rollback()
+                reads.append(1)
+                time.sleep(0.005)
+        finally:
+            db.close()
+
+    pool = [threading.Thread(target=worker, args=(i + 1,)) for i in range(threads)]
+    scanners = [threading.Thread(target=reader) for _ in range(readers)]
+    started = time.perf_counter()
+    for t in pool + scanners:
+        t.start()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - started
+    done.set()
+    for t in scanners:
+        t.join()
+
+    latencies.sort()
+    pick = lambda q: round(latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000, 1) if latencies else None
+    return {
+        "commits": len(latencies),
+        "reads": len(reads),
+        "errors": len(errors),
+        "writes_per_sec": round(len(latencies) / elapsed, 1),
+        "p50_ms": pick(0.50),
+        "p95_ms": pick(0.95),
+        "p99_ms": pick(0.99),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--writes", type=int, default=50, help="Commits per thread")
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--profiles", nargs="+", default=["basic", "production"])
+    parser.add_argument("--run", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        print(json.dumps(run_profile(args.threads, args.writes, args.readers)))
+        return
+
+    for profile in args.profiles:
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(os.environ, DB_PROFILE=profile,
+                       DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+            out = subprocess.run(
+                [sys.executable, __file__, "--run", profile,
+                 "--threads", str(args.threads), "--writes", str(args.writes),
+                 "--readers", str(args.readers)],
+                env=env, capture_output=True, text=True, check=True
+            ).stdout
+            result = json.loads(out.strip().splitlines()[-1])
+        print(f"{profile:>10}: {result['writes_per_sec']:>8} commits/s  "
+              f"p50 {result['p50_ms']} ms  p95 {result['p95_ms']} ms  p99 {result['p99_ms']} ms  "
+              f"errors {result['errors']}/{args.threads * args.writes}  reads {result['reads']}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""
+Semantic cache for chatbot answers.
+Opening questions are normalized and embedded locally as hashed word and
+character n-gram vectors. A new question whose nearest cached neighbour
+in the same personalization bucket is at least ``CHAT_CACHE_THRESHOLD`` cosine-similar is
+answered from the cache without an OpenAI call. Entries expire after
+``CHAT_CACHE_TTL`` seconds. The cache is in process memory, per worker.
+
+A bucket covers everything the prompt is personalized with: yoga
+experience, dietary preferences, goals, allergies and a digest of the
+user's memory facts. An answer is only shared between users whose
+prompts would have been the same apart from their name.
+"""
+import hashlib
+import os
+import re
+import threading
+import time
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+CACHE_THRESHOLD = float(os.getenv("CHAT_CACHE_THRESHOLD", "0.85"))
+CACHE_TTL_SECONDS = int(os.getenv("CHAT_CACHE_TTL", "86400"))
+MAX_ENTRIES_PER_BUCKET = int(os.getenv("CHAT_CACHE_MAX_ENTRIES", "2000"))
+VECTOR_DIM = 1024
+MAX_QUESTION_CHARS = 300  # longer messages are rarely repeated
+
+CONTRACTIONS = {
+    "what's": "what is", "whats": "what is", "how's": "how is", "i'm": "i am", "im": "i am",
+    "can't": "cannot", "don't": "do not", "dont": "do not", "i've": "i have", "it's": "it is",
+}
+STOPWORDS = {
+    "a", "an", "the", "is", "are", "am", "i", "me", "my", "you", "your", "to", "of", "do",
+    "does", "can", "could", "would", "should", "please", "some", "any", "for", "with", "and",
+    "on", "in", "be", "it", "this", "that", "what", "how", "tell", "about", "good", "best",
+    "recommend", "suggest", "give",
+}
+
+def normalize(text: str) -> str:
+    words = re.findall(r"[a-z0-9']+", text.lower())
+    words = " ".join(CONTRACTIONS.get(w, w) for w in words).split()
+    return " ".join(w for w in words if w not in STOPWORDS and w != "'")
+
+def _bucket_index(feature: str) -> int:
+    return zlib.crc32(feature.encode()) % VECTOR_DIM
+
+def embed(normalized: str) -> np.ndarray:
+    """Unit vector of hashed words (weight 1) and character trigrams (weight 0.5)"""
+    vector = np.zeros(VECTOR_DIM, dtype=np.float32)
+    for word in normalized.split():
+        vector[_bucket_index("w:" + word)] += 1.0
+        padded = f"#{word}#"
+        for i in range(len(padded) - 2):
+            vector[_bucket_index("c:" + padded[i:i + 3])] += 0.5
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+def _profile_values(value) -> Tuple:
+    if isinstance(value, (list, tuple)):
+        return tuple(sorted(str(v).lower() for v in value))
+    if isinstance(value, dict):
+        return tuple(sorted(f"{k}={v}" for k, v in value.items()))
+    return (str(value).lower(),) if value else ()
+
+def personalization_bucket(user, facts: str = "") -> Tuple:
+    """Key of the users an answer may be shared with; ``facts`` as from chat_context.user_facts"""
+    return (
+        (user.yoga_experience or "").lower(),
+        _profile_values(user.dietary_preferences),
+        _profile_values(user.goals),
+        _profile_values(user.allergies),
+        hashlib.sha1(facts.encode()).hexdigest()[:16] if facts else "",
+    )
+
+class _Bucket:
+    """Cached questions of one bucket as a matrix, searched with one matmul"""
+
+    def __init__(self):
+        self.vectors = np.zeros((0, VECTOR_DIM), dtype=np.float32)
+        self.answers: List[str] = []
+        self.stored_at: List[float] = []
+
+    def expire(self, now: float):
+        keep = [i for i, t in enumerate(self.stored_at) if now - t < CACHE_TTL_SECONDS]
+        keep = keep[-MAX_ENTRIES_PER_BUCKET:]
+        if len(keep) != len(self.answers):
+            self.vectors = self.vectors[keep]
+            self.answers = [self.answers[i] for i in keep]
+            self.stored_at = [self.stored_at[i] for i in keep]
+
+class SemanticCache:
+    def __init__(self, threshold: float = CACHE_THRESHOLD):
+        self.threshold = threshold
+        self._buckets: Dict[Tuple, _Bucket] = {}
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.hits = 0
+        self.stores = 0
+        self.lookup_seconds = 0.0
+
+    @staticmethod
+    def _template(answer: str, user) -> str:
+        # Answers are shared within a bucket, so don't leak one user's name to another
+        if not user.name:
+            return answer
+        return re.sub(rf"\b{re.escape(user.name)}\b", "{name}", answer)
+
+    def lookup(self, question: str, user, facts: str = "") -> Optional[str]:
+        started = time.perf_counter()
+        self.lookups += 1
+        normalized = normalize(question[:MAX_QUESTION_CHARS])
+        answer = None
+        if normalized:
+            vector = embed(normalized)
+            with self._lock:
+                bucket = self._buckets.get(personalization_bucket(user, facts))
+                if bucket is not None:
+                    bucket.expire(time.monotonic())
+                    if bucket.answers:
+                        scores = bucket.vectors @ vector
+                        best = int(np.argmax(scores))
+                        if scores[best] >= self.threshold:
+                            answer = bucket.answers[best]
+        if answer is not None:
+            self.hits += 1
+            answer = answer.replace("{name}", user.name or "")
+        self.lookup_seconds += time.perf_counter() - started
+        return answer
+
+    def store(self, question: str, user, answer: str, facts: str = ""):
+        normalized = normalize(question[:MAX_QUESTION_CHARS])
+        if not normalized or not answer:
+            return
+        vector = embed(normalized)
+        with self._lock:
+            bucket = self._buckets.setdefault(personalization_bucket(user, facts), _Bucket())
+            bucket.vectors = np.vstack([bucket.vectors, vector])
+            bucket.answers.append(self._template(answer, user))
+            bucket.stored_at.append(time.monotonic())
+            bucket.expire(time.monotonic())
+            self.stores += 1
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            entries = sum(len(b.answers) for b in self._buckets.values())
+        return {
+            "buckets": len(self._buckets),
+            "entries": entries,
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "hit_rate": round(self.hits / self.lookups, 3) if self.lookups else 0.0,
+            "stores": self.stores,
+            "avg_lookup_ms": round(self.lookup_seconds / self.lookups * 1000, 3) if self.lookups else 0.0,
+            "threshold": self.threshold,
+        }
+
+semantic_cache = SemanticCache()
+
+def cacheable_question(messages) -> Optional[str]:
+    """The question if this is the conversation's opening one, else None.
+
+    Follow-ups depend on earlier turns, so only first questions are cached.
+    """
+    user_messages = [m for m in messages if m.role == "user"]
+    if len(user_messages) != 1 or messages[-1].role != "user":
+        return None
+    return messages[-1].content
@@ -0,0 +1,253 @@
+"""
+Token-budgeted chat context.
+Builds the prompt for a chat turn within ``CHAT_CONTEXT_TOKENS``: the
+system prompt plus compact user facts from the profile and memory, an
+extractive summary of older turns, and as many recent turns verbatim as
+fit. Summaries are cached per conversation and extended as turns roll out
+of the window, so earlier turns are never re-summarized.
+"""
+import hashlib
+import math
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from database import Memory
+
+CONTEXT_TOKENS = int(os.getenv("CHAT_CONTEXT_TOKENS", "2000"))
+SUMMARY_TOKENS = int(os.getenv("CHAT_SUMMARY_TOKENS", "300"))
+SUMMARY_LINE_WORDS = 30
+FACT_MEMORY_TYPES = ("preference", "liked_meal", "disliked_meal", "successful_plan")
+MESSAGE_OVERHEAD_TOKENS = 4  # role and separators per chat message
+
+# tiktoken downloads the encoding on first use unless it is already in
+# TIKTOKEN_CACHE_DIR; set CHAT_TOKENIZER=heuristic to never try
+TOKENIZER = os.getenv("CHAT_TOKENIZER", "o200k_base")
+TOKENIZER_LOAD_TIMEOUT = float(os.getenv("CHAT_TOKENIZER_LOAD_TIMEOUT", "2"))
+
+_encoding = None
+_encoding_loaded = threading.Event()
+_encoding_lock = threading.Lock()
+_encoding_state = "idle"  # idle -> loading -> waited
+
+def _load_encoding():
+    global _encoding
+    try:
+        import tiktoken
+        _encoding = tiktoken.get_encoding(TOKENIZER)
+    except Exception as e:  # not installed, or the encoding can't be downloaded
+        print(f"Chat tokenizer unavailable, estimating token counts: {e}")
+    finally:
+        _encoding_loaded.set()
+
+def _start_loading() -> bool:
+    """Start the background load unless it already started; call with ``_encoding_lock`` held"""
+    global _encoding_state
+    if _encoding_state != "idle":
+        return False
+    _encoding_state = "loading"
+    threading.Thread(target=_load_encoding, name="tokenizer-load", daemon=True).start()
+    return True
+
+def preload_tokenizer():
+    """Start loading the encoding without waiting for it (called at startup)"""
+    if TOKENIZER != "heuristic":
+        with _encoding_lock:
+            _start_loading()
+
+def _get_encoding():
+    """The tiktoken encoding, loaded in the background on first use.
+
+    Unless ``preload_tokenizer`` started it, the first caller waits up to
+    ``TOKENIZER_LOAD_TIMEOUT`` seconds; after that, callers use the
+    estimate until the load finishes.
+    """
+    global _encoding_state
+    if _encoding_loaded.is_set() or TOKENIZER == "heuristic":
+        return _encoding
+    with _encoding_lock:
+        if _start_loading():
+            _encoding_loaded.wait(TOKENIZER_LOAD_TIMEOUT)
+            _encoding_state = "waited"
+    return _encoding
+
+def count_tokens(text: str) -> int:
+    """Token count with tiktoken, else the ~4 characters per token estimate"""
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    return math.ceil(len(text) / 4)
+
+def message_tokens(message: Dict) -> int:
+    return count_tokens(message["content"]) + MESSAGE_OVERHEAD_TOKENS
+
+def _as_list(value) -> List[str]:
+    if not value:
+        return []
+    if isinstance(value, (list, tuple)):
+        return [str(v) for v in value]
+    if isinstance(value, dict):
+        return [f"{k}: {v}" for k, v in value.items()]
+    return [str(value)]
+
+def user_facts(db: Session, user) -> str:
+    """One line per fact the coach should keep in mind, from profile and memory"""
+    facts = []
+    if user.allergies:
+        facts.append(f"Allergies: {', '.join(_as_list(user.allergies))}")
+    if user.activity_level:
+        facts.append(f"Activity level: {user.activity_level}")
+    memories = db.query(Memory).filter(
+        Memory.user_id == user.id, Memory.memory_type.in_(FACT_MEMORY_TYPES)
+    ).order_by(Memory.last_accessed.desc()).limit(5).all()
+    for memory in memories:
+        label = memory.memory_type.replace("_", " ").capitalize()
+        facts.append(f"{label}: {'; '.join(_as_list(memory.content))}"[:200])
+    return "\n".join(facts)
+
+def _first_sentence(text: str) -> str:
+    sentence = re.split(r"(?<=[.!?])\s", text.strip(), maxsplit=1)[0]
+    words = sentence.split()
+    if len(words) > SUMMARY_LINE_WORDS:
+        return " ".join(words[:SUMMARY_LINE_WORDS]) + " …"
+    return " ".join(words)
+
+def _summary_lines(messages: List[Dict]) -> List[str]:
+    return [
+        f"{'User' if m['role'] == 'user' else 'Coach'}: {_first_sentence(m['content'])}"
+        for m in messages if m["role"] in ("user", "assistant") and m["content"].strip()
+    ]
+
+def _fit_summary(lines: List[str]) -> List[str]:
+    """Drop the oldest lines until the summary fits ``SUMMARY_TOKENS``"""
+    total = sum(count_tokens(line) + 1 for line in lines)
+    start = 0
+    while total > SUMMARY_TOKENS and start < len(lines):
+        total -= count_tokens(lines[start]) + 1
+        start += 1
+    return lines[start:]
+
+def _digest(messages: List[Dict]) -> str:
+    h = hashlib.sha1()
+    for m in messages:
+        h.update(m["role"].encode())
+        h.update(b"\0")
+        h.update(m["content"].encode())
+        h.update(b"\0")
+    return h.hexdigest()
+
+class SummaryCache:
+    """Rolling summary per conversation: how many turns it covers and their digest"""
+
+    def __init__(self, max_entries: int = 2048):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def summarize(self, key: tuple, folded: List[Dict]) -> str:
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None and entry[0] <= len(folded) and _digest(folded[:entry[0]]) == entry[1]:
+            self.hits += 1
+            lines = _fit_summary(entry[2] + _summary_lines(folded[entry[0]:]))
+        else:
+            self.misses += 1
+            lines = _fit_summary(_summary_lines(folded))
+        with self._lock:
+            self._entries[key] = (len(folded), _digest(folded), lines)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return "\n".join(lines)
+
+summary_cache = SummaryCache()
+
+class UsageTotals:
+    """Process-wide token accounting across chat turns"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.turns = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.history_tokens = 0
+        self.sent_history_tokens = 0
+        self.summarized_turns = 0
+
+    def record(self, usage: Dict):
+        with self._lock:
+            self.turns += 1
+            self.prompt_tokens += usage.get("prompt_tokens") or usage["estimated_prompt_tokens"]
+            self.completion_tokens += usage.get("completion_tokens") or 0
+            self.history_tokens += usage["history_tokens"]
+            self.sent_history_tokens += usage["sent_history_tokens"]
+            self.summarized_turns += 1 if usage["summarized_messages"] else 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "turns": self.turns,
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+                "avg_prompt_tokens": round(self.prompt_tokens / self.turns, 1) if self.turns else 0.0,
+                "history_tokens_saved": self.history_tokens - self.sent_history_tokens,
+                "summarized_turns": self.summarized_turns,
+                "summary_cache_hits": summary_cache.hits,
+                "summary_cache_misses": summary_cache.misses,
+            }
+
+usage_totals = UsageTotals()
+
+def build_context(user, system_prompt: str, history: List[Dict], facts: str = "",
+                  budget: Optional[int] = None) -> Tuple[List[Dict], Dict]:
+    """The messages to send for this turn, and the turn's token accounting.
+
+    The latest message is always sent, even if it alone exceeds the budget.
+    """
+    budget = CONTEXT_TOKENS if budget is None else budget
+    system = system_prompt + (f"\nWhat you know about the user:\n{facts}\n" if facts else "")
+    system_tokens = message_tokens({"content": system})
+    costs = [message_tokens(m) for m in history]
+    history_tokens = sum(costs)
+
+    available = budget - system_tokens
+    if history_tokens > available:
+        # Older turns will be folded, so leave room for their summary
+        available -= SUMMARY_TOKENS + MESSAGE_OVERHEAD_TOKENS
+    split = len(history)
+    used = 0
+    while split > 0 and (split == len(history) or used + costs[split - 1] <= available):
+        split -= 1
+        used += costs[split]
+
+    messages = [{"role": "system", "content": system}]
+    summary = ""
+    if split:
+        key = (user.id, _digest(history[:1]))
+        summary = summary_cache.summarize(key, history[:split])
+        if summary:
+            messages.append({"role": "system", "content": f"Summary of the earlier conversation:\n{summary}"})
+    messages.extend({"role": m["role"], "content": m["content"]} for m in history[split:])
+
+    summary_tokens = count_tokens(summary) if summary else 0
+    usage = {
+        "budget": budget,
+        "estimated_prompt_tokens": sum(message_tokens(m) for m in messages),
+        "system_tokens": system_tokens,
+        "facts_tokens": count_tokens(facts),
+        "summary_tokens": summary_tokens,
+        "history_tokens": history_tokens,
+        "sent_history_tokens": used + summary_tokens,
+        "history_messages": len(history),
+        "kept_messages": len(history) - split,
+        "summarized_messages": split,
+    }
+    return messages, usage
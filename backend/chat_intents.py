@@ -0,0 +1,245 @@
+"""
+Compiled intent matching for chatbot replies that don't need the model.
+Intents are data: keyword groups that must all match, plus a reply
+template rendered with the user's profile. All keywords of all intents
+are compiled into one Aho-Corasick automaton, so a message is scanned
+once regardless of how many intents there are; the first intent in
+table order whose groups all matched wins.
+
+``fallback`` intents answer when OpenAI is unavailable. ``direct``
+intents are simple enough to answer before calling the model at all.
+"""
+import re
+from collections import deque
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+YOGA_WORDS = ["yoga", "pose", "practice", "stretch", "meditation"]
+FOOD_WORDS = ["food", "meal", "nutrition", "eat", "diet", "recipe", "ingredient"]
+WELLNESS_WORDS = ["wellness", "health", "feel", "energy", "tired", "sleep"]
+
+# Keywords match anywhere in the message unless the intent sets
+# ``whole_word``; ``max_words`` limits an intent to short messages, and
+# ``allowed_words`` to messages made only of its keywords and these words,
+# so "hi, yoga tips?" goes to the model rather than getting a greeting.
+INTENTS: List[Dict] = [
+    {
+        "id": "greeting",
+        "groups": [["hi", "hello", "hey", "namaste", "good morning", "good evening"]],
+        "whole_word": True,
+        "max_words": 3,
+        "allowed_words": ["there", "again", "coach", "friend", "everyone", "all", "ji", "and", "oh"],
+        "fallback": False,
+        "direct": True,
+        "template": "Namaste {name}! How can I help with your yoga practice, nutrition or wellness today?",
+    },
+    {
+        "id": "thanks",
+        "groups": [["thanks", "thank you", "thx"]],
+        "whole_word": True,
+        "max_words": 5,
+        "allowed_words": ["so", "much", "a", "lot", "very", "again", "ok", "okay", "great", "that", "helps",
+                          "helped", "for", "the", "your", "help", "coach", "really"],
+        "fallback": False,
+        "direct": True,
+        "template": "You're welcome, {name}! Feel free to ask whenever you need more yoga, nutrition or wellness guidance.",
+    },
+    {
+        "id": "yoga_beginner",
+        "groups": [YOGA_WORDS, ["beginner", "start"]],
+        "template": "Great question! For beginners, I recommend starting with gentle yoga poses like Child's Pose (Balasana), Mountain Pose (Tadasana), and Cat-Cow stretches. Since you're at the {yoga_experience} level, you might enjoy a 15-20 minute morning routine focusing on flexibility and breathing. Would you like me to suggest a specific yoga plan for today?",
+    },
+    {
+        "id": "yoga_stress",
+        "groups": [YOGA_WORDS, ["stress", "relax"]],
+        "template": "For stress relief, I recommend restorative yoga poses like Legs Up the Wall, Child's Pose, and Corpse Pose (Savasana). Combine this with deep breathing exercises - try alternate nostril breathing (Nadi Shodhana) for 5 minutes. A gentle 20-30 minute evening practice can work wonders for relaxation.",
+    },
+    {
+        "id": "yoga_general",
+        "groups": [YOGA_WORDS],
+        "template": "Yoga is wonderful for overall wellness! Based on your {yoga_experience} experience level, I'd suggest focusing on poses that align with your goals. For flexibility, try forward folds and twists. For strength, incorporate Warrior poses and Plank. Would you like specific recommendations?",
+    },
+    {
+        "id": "sattvic_nutrition",
+        "groups": [FOOD_WORDS, ["sattvic", "yoga"]],
+        "template": "Sattvic nutrition focuses on fresh, light, plant-based foods that promote clarity and energy. Great options include: fresh fruits, vegetables, whole grains (brown rice, oats), legumes (lentils, mung beans), nuts, seeds, and dairy products like ghee and fresh milk. Avoid processed foods, onions, garlic, and overly spicy foods. Would you like a specific meal plan?",
+    },
+    {
+        "id": "breakfast",
+        "groups": [FOOD_WORDS, ["breakfast"]],
+        "template": "A Sattvic breakfast could include: oatmeal with fresh fruits and honey, fresh fruit salad, or a smoothie with banana, dates, and nuts. These provide sustained energy without heaviness.",
+    },
+    {
+        "id": "lunch",
+        "groups": [FOOD_WORDS, ["lunch"]],
+        "template": "For lunch, consider: brown rice with dal (lentils), steamed vegetables, fresh salad, and roti (whole wheat flatbread). This combination provides protein, fiber, and essential nutrients.",
+    },
+    {
+        "id": "dinner",
+        "groups": [FOOD_WORDS, ["dinner"]],
+        "template": "A light Sattvic dinner might include: vegetable soup, steamed vegetables, or a simple khichdi (rice and lentils). Keep dinner light and early (ideally 2-3 hours before sleep) for better digestion.",
+    },
+    {
+        "id": "nutrition_general",
+        "groups": [FOOD_WORDS],
+        "template": "Based on your dietary preferences ({dietary_preferences}), I can help you plan nutritious, Sattvic meals. Focus on fresh, whole foods that align with your goals: {goals}. Would you like specific recipe suggestions?",
+    },
+    {
+        "id": "wellness",
+        "groups": [WELLNESS_WORDS],
+        "template": "Wellness is a holistic journey! Combine daily yoga practice (even 15-20 minutes), Sattvic nutrition, adequate sleep (7-8 hours), and mindfulness. Start with small, consistent habits - perhaps a morning yoga routine and mindful eating. How can I help you create a personalized wellness plan?",
+    },
+    {
+        "id": "default",
+        "groups": [],
+        "template": "Namaste {name}! I'm here to help with your wellness journey. I can assist with:\n\n• Yoga practice recommendations based on your {yoga_experience} level\n• Sattvic nutrition and meal planning\n• Wellness tips and guidance\n• Stress management through yoga and nutrition\n\nWhat would you like to explore today? Feel free to ask about specific yoga poses, meal ideas, or wellness practices!",
+    },
+]
+
+class _Automaton:
+    """Aho-Corasick over all keywords; reports (keyword id, end offset) pairs"""
+
+    def __init__(self, keywords: List[str]):
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.out: List[List[int]] = [[]]
+        for keyword_id, keyword in enumerate(keywords):
+            state = 0
+            for char in keyword:
+                nxt = self.goto[state].get(char)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto[state][char] = nxt
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.out.append([])
+                state = nxt
+            self.out[state].append(keyword_id)
+
+        queue = deque(self.goto[0].values())
+        order = []
+        while queue:
+            state = queue.popleft()
+            order.append(state)
+            for char, nxt in self.goto[state].items():
+                queue.append(nxt)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[nxt] = self.goto[fallback].get(char, 0)
+                self.out[nxt] = self.out[nxt] + self.out[self.fail[nxt]]
+
+        # Fold failure links into the transitions (breadth first, so a
+        # state's failure target is complete before the state itself).
+        # Characters absent from every keyword return to the root.
+        self.delta: List[Dict[str, int]] = [dict(self.goto[0])]
+        self.delta.extend({} for _ in range(len(self.goto) - 1))
+        for state in order:
+            self.delta[state] = {**self.delta[self.fail[state]], **self.goto[state]}
+
+    def scan(self, text: str):
+        delta, out = self.delta, self.out
+        state = 0
+        for end, char in enumerate(text, 1):
+            state = delta[state].get(char, 0)
+            if out[state]:
+                for keyword_id in out[state]:
+                    yield keyword_id, end
+
+_WORD = re.compile(r"[a-z0-9']+")
+
+class IntentMatcher:
+    def __init__(self, intents: List[Dict] = INTENTS):
+        self.intents = intents
+        # Keyword groups shared by several intents are matched once
+        group_ids: Dict[Tuple[FrozenSet[str], bool], int] = {}
+        self._required: List[FrozenSet[int]] = []
+        # Every word a message may consist of, for intents with ``allowed_words``
+        self._vocabulary: List[Optional[FrozenSet[str]]] = []
+        for intent in intents:
+            whole_word = intent.get("whole_word", False)
+            required = set()
+            for group in intent["groups"]:
+                key = (frozenset(word.lower() for word in group), whole_word)
+                required.add(group_ids.setdefault(key, len(group_ids)))
+            self._required.append(frozenset(required))
+            if "allowed_words" in intent:
+                words = {part for group in intent["groups"] for word in group for part in word.lower().split()}
+                self._vocabulary.append(frozenset(words | {w.lower() for w in intent["allowed_words"]}))
+            else:
+                self._vocabulary.append(None)
+
+        keywords: List[str] = []
+        self._keyword_groups: List[Tuple[int, bool]] = []
+        for (words, whole_word), group_id in group_ids.items():
+            for word in sorted(words):
+                keywords.append(word)
+                self._keyword_groups.append((group_id, whole_word))
+        self._lengths = [len(k) for k in keywords]
+        self._automaton = _Automaton(keywords)
+
+        self._intents_by_group: Dict[int, List[int]] = {}
+        self._unconditional: List[int] = []
+        for index, required in enumerate(self._required):
+            if not required:
+                self._unconditional.append(index)
+            for group_id in required:
+                self._intents_by_group.setdefault(group_id, []).append(index)
+
+    def _matched_groups(self, text: str) -> set:
+        matched = set()
+        for keyword_id, end in self._automaton.scan(text):
+            group_id, whole_word = self._keyword_groups[keyword_id]
+            if group_id in matched:
+                continue
+            if whole_word:
+                start = end - self._lengths[keyword_id]
+                if (start > 0 and text[start - 1].isalnum()) or (end < len(text) and text[end].isalnum()):
+                    continue
+            matched.add(group_id)
+        return matched
+
+    def match(self, query: str, fallback: bool = False, direct: bool = False) -> Optional[Dict]:
+        """The first intent whose keyword groups all occur in ``query``.
+
+        ``fallback`` or ``direct`` restrict the search to intents flagged as such.
+        """
+        text = query.lower()
+        matched = self._matched_groups(text)
+        word_count = len(text.split())
+        words = set(_WORD.findall(text))
+        candidates = set(self._unconditional)
+        for group_id in matched:
+            candidates.update(self._intents_by_group.get(group_id, ()))
+        for index in sorted(candidates):
+            intent = self.intents[index]
+            if fallback and not intent.get("fallback", True):
+                continue
+            if direct and not intent.get("direct", False):
+                continue
+            if "max_words" in intent and word_count > intent["max_words"]:
+                continue
+            if self._vocabulary[index] is not None and not words <= self._vocabulary[index]:
+                continue
+            if self._required[index] <= matched:
+                return intent
+        return None
+
+    @staticmethod
+    def render(intent: Dict, user) -> str:
+        return intent["template"].format(
+            name=user.name,
+            yoga_experience=user.yoga_experience,
+            dietary_preferences=user.dietary_preferences,
+            goals=user.goals,
+        )
+
+    def fallback_reply(self, query: str, user) -> str:
+        """The canned reply used when the model can't be reached"""
+        return self.render(self.match(query, fallback=True), user)
+
+    def direct_reply(self, query: str, user) -> Optional[Tuple[str, str]]:
+        """(intent id, reply) if ``query`` can be answered without the model"""
+        intent = self.match(query, direct=True)
+        return (intent["id"], self.render(intent, user)) if intent else None
+
+intent_matcher = IntentMatcher()
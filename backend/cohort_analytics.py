@@ -0,0 +1,205 @@
+"""
+Population-level cohort analytics.
+Reads only the needed columns in chunks into pandas and reduces each chunk
+with vectorized groupbys to small per-user partials, which are combined at
+the end, so memory is bounded by the number of users rather than the
+number of rows. Results are cached for ``COHORT_CACHE_TTL`` seconds.
+"""
+import itertools
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, Iterator, List
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from database import DailyRollup, DecisionTrace, User
+from archive import get_watermark, in_database, iter_archive
+from trace_store import load_payloads
+
+CACHE_TTL_SECONDS = int(os.getenv("COHORT_CACHE_TTL", "600"))
+READ_CHUNK_SIZE = 50000
+ADHERENCE_BINS = [0, 20, 40, 60, 80, 100]
+EXPERIENCE_LEVELS = ["beginner", "intermediate", "advanced"]
+
+_cache: Dict[tuple, tuple] = {}
+_cache_lock = threading.Lock()
+
+def _cached(key: tuple, compute: Callable[[], Dict]) -> Dict:
+    now = time.monotonic()
+    with _cache_lock:
+        entry = _cache.get(key)
+        if entry is not None and now - entry[0] < CACHE_TTL_SECONDS:
+            return entry[1]
+    result = compute()
+    result["generated_at"] = datetime.utcnow().isoformat()
+    with _cache_lock:
+        _cache[key] = (now, result)
+    return result
+
+def clear_cache():
+    with _cache_lock:
+        _cache.clear()
+
+def _read_chunks(db: Session, stmt, dtypes: Dict[str, str]) -> Iterator[pd.DataFrame]:
+    """Run ``stmt`` and yield its rows as typed frames of up to READ_CHUNK_SIZE rows"""
+    for chunk in pd.read_sql(stmt, db.connection(), chunksize=READ_CHUNK_SIZE):
+        yield chunk.astype(dtypes)
+
+def _read_frame(db: Session, stmt, dtypes: Dict[str, str]) -> pd.DataFrame:
+    """Run ``stmt`` into one typed frame (for small tables)"""
+    chunks = list(_read_chunks(db, stmt, dtypes))
+    if not chunks:
+        return pd.DataFrame({name: pd.Series(dtype=dtype) for name, dtype in dtypes.items()})
+    return pd.concat(chunks, ignore_index=True)
+
+def _combine(partials: Iterable[pd.DataFrame], by: List[str], columns: List[str]) -> pd.DataFrame:
+    """Sum per-chunk partial aggregates, indexed by ``by``, as they arrive"""
+    total = None
+    for partial in partials:
+        total = partial if total is None else pd.concat([total, partial]).groupby(level=by)[columns].sum()
+    if total is None:
+        return pd.DataFrame(columns=by + columns).astype({c: "float64" for c in columns}).set_index(by)
+    return total
+
+def _since(days: int):
+    return datetime.utcnow().date() - timedelta(days=days)
+
+def _rollup_chunks(db: Session, days: int, columns: List[str]) -> Iterator[pd.DataFrame]:
+    stmt = select(
+        DailyRollup.user_id, DailyRollup.day, *[getattr(DailyRollup, c) for c in columns]
+    ).where(DailyRollup.day >= _since(days))
+    dtypes = {"user_id": "int64", "day": "datetime64[ns]", **{c: "float64" for c in columns}}
+    return _read_chunks(db, stmt, dtypes)
+
+def adherence_distribution(db: Session, days: int = 30) -> Dict:
+    """Distribution of each user's average adherence over the window"""
+    def compute():
+        columns = ["adherence_sum", "checkin_count"]
+        partials = (
+            chunk[chunk["checkin_count"] > 0].groupby("user_id")[columns].sum()
+            for chunk in _rollup_chunks(db, days, columns)
+        )
+        per_user = _combine(partials, ["user_id"], columns)
+        averages = per_user["adherence_sum"] / per_user["checkin_count"]
+
+        labels = [f"{lo}-{hi}" for lo, hi in zip(ADHERENCE_BINS, ADHERENCE_BINS[1:])]
+        buckets = pd.cut(averages.clip(0, 100), ADHERENCE_BINS, labels=labels, include_lowest=True)
+        counts = buckets.value_counts(sort=False)
+        return {
+            "days": days,
+            "users": int(len(averages)),
+            "mean": round(float(averages.mean()), 2) if len(averages) else None,
+            "percentiles": {
+                f"p{q}": round(float(averages.quantile(q / 100)), 2)
+                for q in (10, 25, 50, 75, 90)
+            } if len(averages) else {},
+            "buckets": [{"range": label, "users": int(count)} for label, count in counts.items()],
+        }
+    return _cached(("adherence", days), compute)
+
+def rule_frequencies(db: Session, days: int = 30) -> Dict:
+    """How often each wellness rule fired and for how many users"""
+    def compute():
+        since = datetime.combine(_since(days), datetime.min.time())
+        watermark = get_watermark()
+        stmt = select(
+            DecisionTrace.user_id, DecisionTrace.triggered_rules, DecisionTrace.triggered_rules_hash
+        ).where(DecisionTrace.date >= since, in_database(DecisionTrace))
+        dtypes = {"user_id": "int64", "triggered_rules": "object", "triggered_rules_hash": "object"}
+        chunks = _read_chunks(db, stmt, dtypes)
+        if watermark is not None and since < watermark:
+            archived = iter_archive(DecisionTrace, start=since, end=watermark, columns=list(dtypes),
+                                    batch_size=READ_CHUNK_SIZE)
+            chunks = itertools.chain((pd.DataFrame(rows).astype(dtypes) for rows in archived), chunks)
+
+        payloads: Dict[str, object] = {}
+        total = 0
+
+        def partials():
+            nonlocal total
+            for frame in chunks:
+                total += len(frame)
+                # Resolve each distinct payload once; legacy rows carry theirs inline
+                hashed = frame["triggered_rules_hash"].notna()
+                missing = set(frame.loc[hashed, "triggered_rules_hash"].unique()) - payloads.keys()
+                if missing:
+                    payloads.update(load_payloads(db, list(missing)))
+                frame["triggered_rules"] = frame["triggered_rules_hash"].map(payloads).where(hashed, frame["triggered_rules"])
+
+                rules = frame.explode("triggered_rules").dropna(subset=["triggered_rules"])
+                rules["rule_id"] = rules["triggered_rules"].map(
+                    lambda rule: rule.get("rule_id") if isinstance(rule, dict) else rule
+                )
+                yield rules.groupby(["rule_id", "user_id"]).size().to_frame("triggers")
+
+        per_user = _combine(partials(), ["rule_id", "user_id"], ["triggers"])
+        stats = per_user.groupby(level="rule_id").agg(
+            triggers=("triggers", "sum"), users=("triggers", "size")
+        ).sort_values("triggers", ascending=False)
+
+        return {
+            "days": days,
+            "traces": int(total),
+            "rules": [
+                {
+                    "rule_id": rule_id,
+                    "triggers": int(row.triggers),
+                    "users": int(row.users),
+                    "trace_share": round(row.triggers / total * 100, 1) if total else 0.0,
+                }
+                for rule_id, row in stats.iterrows()
+            ],
+        }
+    return _cached(("rules", days), compute)
+
+def stress_by_experience(db: Session, days: int = 90) -> Dict:
+    """Weekly average stress per yoga experience level, with its trend"""
+    def compute():
+        columns = ["stress_sum", "quiz_count"]
+
+        def partials():
+            for chunk in _rollup_chunks(db, days, columns):
+                chunk = chunk[chunk["quiz_count"] > 0]
+                week = chunk["day"].dt.to_period("W-SUN").dt.start_time.rename("week")
+                yield chunk.groupby(["user_id", week])[columns].sum()
+
+        frame = _combine(partials(), ["user_id", "week"], columns).reset_index()
+
+        users = _read_frame(
+            db, select(User.id.label("user_id"), User.yoga_experience),
+            {"user_id": "int64", "yoga_experience": "object"}
+        )
+        frame = frame.merge(users, on="user_id", how="left")
+        frame["yoga_experience"] = frame["yoga_experience"].fillna("unknown")
+
+        weekly = frame.groupby(["yoga_experience", "week"])[columns].sum()
+        weekly["avg_stress"] = weekly["stress_sum"] / weekly["quiz_count"]
+        user_counts = frame.groupby("yoga_experience")["user_id"].nunique()
+
+        cohorts = []
+        levels = [l for l in EXPERIENCE_LEVELS if l in user_counts.index]
+        levels += sorted(set(user_counts.index) - set(EXPERIENCE_LEVELS))
+        for level in levels:
+            series = weekly.loc[level, "avg_stress"]
+            slope = float(np.polyfit(np.arange(len(series)), series.to_numpy(), 1)[0]) if len(series) >= 2 else 0.0
+            weekly_change = round(slope, 2)
+            if weekly_change == 0:
+                # A tiny negative slope rounds to -0.0
+                weekly_change = 0.0
+            cohorts.append({
+                "yoga_experience": level,
+                "users": int(user_counts[level]),
+                "avg_stress": round(float(series.mean()), 2),
+                "weekly_change": weekly_change,
+                "weeks": [
+                    {"week": week.date().isoformat(), "avg_stress": round(float(value), 2)}
+                    for week, value in series.items()
+                ],
+            })
+        return {"days": days, "cohorts": cohorts}
+    return _cached(("stress", days), compute)
@@ -1,6 +1,7 @@
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, Text, JSON, Boolean
+from sqlalchemy import create_engine, event, Column, Integer, String, Float, DateTime, Date, Text, JSON, Boolean, UniqueConstraint, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from datetime import datetime
 import os
 from dotenv import load_dotenv
@@ -9,8 +10,63 @@ load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./wellness.db")
 
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {})
+# "production" enables WAL and tuned pragmas on SQLite and sizes the pool
+# for the worker threadpool; "basic" is a plain engine with driver defaults
+DB_PROFILE = os.getenv("DB_PROFILE", "production")
+
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",  # readers no longer block the writer
+    "synchronous": "NORMAL",  # durable with WAL, fsyncs only at checkpoints
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),  # wait for the write lock
+    "cache_size": -64000,  # 64 MB page cache per connection
+    "mmap_size": 256 * 1024 * 1024,
+    "temp_store": "MEMORY",
+}
+
+def _is_file_sqlite(url: str) -> bool:
+    return url.startswith("sqlite") and ":memory:" not in url and not url.rstrip("/").endswith(":")
+
+def _engine_options(url: str) -> dict:
+    options = {}
+    if url.startswith("sqlite") and "aiosqlite" not in url:
+        options["connect_args"] = {"check_same_thread": False}
+    if DB_PROFILE == "production" and (_is_file_sqlite(url) or not url.startswith("sqlite")):
+        options.update(
+            pool_size=int(os.getenv("DB_POOL_SIZE", "20")),
+            max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "20")),
+            pool_timeout=30,
+            pool_pre_ping=not url.startswith("sqlite"),
+        )
+    return options
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+def _configure(engine):
+    if DB_PROFILE == "production" and _is_file_sqlite(str(engine.url)):
+        event.listen(engine, "connect", _set_sqlite_pragmas)
+    return engine
+
+engine = _configure(create_engine(DATABASE_URL, **_engine_options(DATABASE_URL)))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def _async_url(url: str) -> str:
+    """Same database through its asyncio driver"""
+    if url.startswith("sqlite://"):
+        return url.replace("sqlite://", "sqlite+aiosqlite://", 1)
+    if url.startswith("postgresql://"):
+        return url.replace("postgresql://", "postgresql+asyncpg://", 1)
+    return url
+
+# Used by read-only async routes; writes stay on SessionLocal so the
+# response cache and rollup hooks see them
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", _async_url(DATABASE_URL))
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **_engine_options(ASYNC_DATABASE_URL))
+_configure(async_engine.sync_engine)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
 
 # User Profile
@@ -31,8 +87,9 @@ class User(Base):
 # Daily Check-in
 class CheckIn(Base):
     __tablename__ = "checkins"
+    __table_args__ = (Index("ix_checkins_user_date", "user_id", "date"),)
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, index=True)
+    user_id = Column(Integer)
     date = Column(DateTime, default=datetime.utcnow)
     mood = Column(String)  # happy, neutral, sad, stressed
     mood_score = Column(Integer)  # 1-10
@@ -46,8 +103,9 @@ class CheckIn(Base):
 # Mental Health Quiz
 class QuizResponse(Base):
     __tablename__ = "quiz_responses"
+    __table_args__ = (Index("ix_quiz_responses_user_date", "user_id", "date"),)
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, index=True)
+    user_id = Column(Integer)
     date = Column(DateTime, default=datetime.utcnow)
     stress_score = Column(Integer)
     anxiety_score = Column(Integer)
@@ -61,8 +119,9 @@ class QuizResponse(Base):
 # Nutrition Plans
 class NutritionPlan(Base):
     __tablename__ = "nutrition_plans"
+    __table_args__ = (Index("ix_nutrition_plans_user_date", "user_id", "date"),)
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, index=True)
+    user_id = Column(Integer)
     date = Column(DateTime, default=datetime.utcnow)
     meal_type = Column(String)  # breakfast, lunch, dinner, snack
     recipe_name = Column(String)
@@ -76,8 +135,9 @@ class NutritionPlan(Base):
 # Yoga Plans
 class YogaPlan(Base):
     __tablename__ = "yoga_plans"
+    __table_args__ = (Index("ix_yoga_plans_user_date", "user_id", "date"),)
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, index=True)
+    user_id = Column(Integer)
     date = Column(DateTime, default=datetime.utcnow)
     session_type = Column(String)  # flexibility, strength, stress_relief, recovery
     duration_minutes = Column(Integer)
@@ -90,8 +150,9 @@ class YogaPlan(Base):
 # ML Predictions
 class MLPrediction(Base):
     __tablename__ = "ml_predictions"
+    __table_args__ = (Index("ix_ml_predictions_user_date", "user_id", "date"),)
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, index=True)
+    user_id = Column(Integer)
     date = Column(DateTime, default=datetime.utcnow)
     energy_trend = Column(String)  # low, medium, high
     appetite_trend = Column(String)  # low, normal, high
@@ -101,22 +162,53 @@ class MLPrediction(Base):
 # Decision Traces
 class DecisionTrace(Base):
     __tablename__ = "decision_traces"
+    __table_args__ = (
+        Index("ix_decision_traces_user_date", "user_id", "date"),
+        Index("ix_decision_traces_date", "date"),
+    )
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, index=True)
+    user_id = Column(Integer)
     date = Column(DateTime, default=datetime.utcnow)
     agent_name = Column(String)
+    # Inline payloads of traces written before trace_payloads existed
     triggered_rules = Column(JSON)
     memory_retrieved = Column(JSON)
     plan_chosen = Column(JSON)
     tools_called = Column(JSON)
+    # Content hashes into trace_payloads
+    triggered_rules_hash = Column(String(64))
+    memory_retrieved_hash = Column(String(64))
+    plan_chosen_hash = Column(String(64))
+    tools_called_hash = Column(String(64))
     explanation = Column(Text)
 
+# Rule ids fired by each trace, for filtering traces by rule
+class TraceRule(Base):
+    __tablename__ = "trace_rules"
+    __table_args__ = (Index("ix_trace_rules_rule_date", "rule_id", "date", "trace_id"),)
+    trace_id = Column(Integer, primary_key=True)
+    rule_id = Column(String, primary_key=True)
+    user_id = Column(Integer)
+    date = Column(DateTime)
+
+# Deduplicated DecisionTrace payloads, keyed by SHA-256 of their canonical JSON
+class TracePayload(Base):
+    __tablename__ = "trace_payloads"
+    hash = Column(String(64), primary_key=True)
+    payload = Column(JSON)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
 # Progress Tracking
 class Progress(Base):
     __tablename__ = "progress"
+    __table_args__ = (
+        Index("ix_progress_user_date", "user_id", "date"),
+        UniqueConstraint("user_id", "day", name="uq_progress_user_day"),
+    )
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, index=True)
+    user_id = Column(Integer)
     date = Column(DateTime, default=datetime.utcnow)
+    day = Column(Date)
     yoga_streak = Column(Integer)
     consistency_percentage = Column(Float)
     protein_total = Column(Float)
@@ -125,6 +217,53 @@ class Progress(Base):
     stress_reduction = Column(Float)
     adherence_improvement = Column(Float)
 
+# Daily Rollups (one row per user per day, maintained on every write)
+class DailyRollup(Base):
+    __tablename__ = "daily_rollups"
+    __table_args__ = (UniqueConstraint("user_id", "day", name="uq_daily_rollups_user_day"),)
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer)
+    day = Column(Date)
+    checkin_count = Column(Integer, default=0)
+    adherence_sum = Column(Float, default=0)
+    sleep_sum = Column(Float, default=0)
+    mood_sum = Column(Float, default=0)
+    energy_sum = Column(Float, default=0)
+    quiz_count = Column(Integer, default=0)
+    stress_sum = Column(Float, default=0)
+    motivation_sum = Column(Float, default=0)
+    meals = Column(Integer, default=0)
+    yoga_sessions = Column(Integer, default=0)
+    calories_total = Column(Float, default=0)
+    protein_total = Column(Float, default=0)
+    fiber_total = Column(Float, default=0)
+    calcium_total = Column(Float, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+    @property
+    def avg_adherence(self):
+        return self.adherence_sum / self.checkin_count if self.checkin_count else None
+
+    @property
+    def avg_sleep(self):
+        return self.sleep_sum / self.checkin_count if self.checkin_count else None
+
+    @property
+    def avg_mood(self):
+        return self.mood_sum / self.checkin_count if self.checkin_count else None
+
+    @property
+    def avg_energy(self):
+        return self.energy_sum / self.checkin_count if self.checkin_count else None
+
+    @property
+    def avg_stress(self):
+        return self.stress_sum / self.quiz_count if self.quiz_count else None
+
+    @property
+    def avg_motivation(self):
+        return self.motivation_sum / self.quiz_count if self.quiz_count else None
+
 # Memory System
 class Memory(Base):
     __tablename__ = "memory"
@@ -135,8 +274,38 @@ class Memory(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     last_accessed = Column(DateTime, default=datetime.utcnow)
 
+# Background jobs (see job_queue.py)
+class Job(Base):
+    __tablename__ = "jobs"
+    __table_args__ = (
+        Index("ix_jobs_status_run_at", "status", "run_at"),
+        Index("ix_jobs_user_created", "user_id", "created_at"),
+    )
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer)
+    kind = Column(String)  # e.g. checkin_plans
+    status = Column(String, default="queued")  # queued, running, succeeded, failed
+    payload = Column(JSON)
+    result = Column(JSON)
+    error = Column(Text)
+    attempts = Column(Integer, default=0)
+    max_attempts = Column(Integer, default=3)
+    run_at = Column(DateTime, default=datetime.utcnow)  # not picked up before this
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+
+# Applied schema migrations (see migrations.py)
+class SchemaVersion(Base):
+    __tablename__ = "schema_version"
+    version = Column(Integer, primary_key=True)
+    description = Column(String)
+    applied_at = Column(DateTime, default=datetime.utcnow)
+
 def init_db():
     Base.metadata.create_all(bind=engine)
+    from migrations import migrate
+    migrate()
 
 def get_db():
     db = SessionLocal()
@@ -145,3 +314,7 @@ def get_db():
     finally:
         db.close()
 
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
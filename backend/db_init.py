@@ -38,5 +38,41 @@ if __name__ == "__main__":
         print("Dropped all existing tables.")
     
     init_database()
+    
+    if "--migrate" in sys.argv:
+        from migrations import migrate, current_version
+        
+        applied = migrate()
+        with engine.connect() as conn:
+            version = current_version(conn)
+        print(f"\nApplied migrations: {applied or 'none pending'} (schema version {version})")
+    
+    if "--check-indexes" in sys.argv:
+        from migrations import explain_hot_queries
+        
+        if engine.dialect.name != "sqlite":
+            print("\n--check-indexes only supports SQLite query plans.")
+            sys.exit(1)
+        print("\nHot query plans:")
+        results = explain_hot_queries()
+        for result in results:
+            status = "✅" if result["uses_index"] and not result["sorts"] else "❌"
+            print(f"  {status} {result['table']}: {' | '.join(result['plan'])}")
+        if not all(r["uses_index"] and not r["sorts"] for r in results):
+            print("Some hot queries do not use their (user_id, date) index.")
+            sys.exit(1)
+    
+    if "--backfill-rollups" in sys.argv:
+        from database import SessionLocal
+        from rollups import backfill_rollups
+        
+        db = SessionLocal()
+        try:
+            print("\nBackfilling daily rollups...")
+            count = backfill_rollups(db)
+            print(f"Rebuilt {count} daily rollup rows.")
+        finally:
+            db.close()
+    
     print("\n✨ Database is ready to use!")
 
@@ -3,6 +3,8 @@ Database utility functions for querying and managing data.
 """
 from sqlalchemy.orm import Session
 from database import get_db, User, CheckIn, QuizResponse, NutritionPlan, YogaPlan, Progress, Memory
+from rollups import get_rollups
+from archive import count_history, archive_old_data
 from datetime import datetime, timedelta
 from typing import Optional, List, Dict
 
@@ -12,11 +14,11 @@ def get_user_stats(db: Session, user_id: int) -> Dict:
     if not user:
         return None
     
-    # Count records
-    checkin_count = db.query(CheckIn).filter(CheckIn.user_id == user_id).count()
-    quiz_count = db.query(QuizResponse).filter(QuizResponse.user_id == user_id).count()
-    nutrition_count = db.query(NutritionPlan).filter(NutritionPlan.user_id == user_id).count()
-    yoga_count = db.query(YogaPlan).filter(YogaPlan.user_id == user_id).count()
+    # Count records, including archived history
+    checkin_count = count_history(db, CheckIn, user_id)
+    quiz_count = count_history(db, QuizResponse, user_id)
+    nutrition_count = count_history(db, NutritionPlan, user_id)
+    yoga_count = count_history(db, YogaPlan, user_id)
     
     # Recent activity
     week_ago = datetime.utcnow() - timedelta(days=7)
@@ -57,15 +59,8 @@ def get_recent_activity(db: Session, user_id: int, days: int = 7) -> Dict:
         QuizResponse.date >= since
     ).order_by(QuizResponse.date.desc()).all()
     
-    nutrition = db.query(NutritionPlan).filter(
-        NutritionPlan.user_id == user_id,
-        NutritionPlan.date >= since
-    ).order_by(NutritionPlan.date.desc()).all()
-    
-    yoga = db.query(YogaPlan).filter(
-        YogaPlan.user_id == user_id,
-        YogaPlan.date >= since
-    ).order_by(YogaPlan.date.desc()).all()
+    # Plan counts only need the daily rollups, not every plan row
+    rollups = get_rollups(db, user_id, since.date())
     
     return {
         "checkins": [{
@@ -79,20 +74,13 @@ def get_recent_activity(db: Session, user_id: int, days: int = 7) -> Dict:
             "stress": q.stress_score,
             "motivation": q.motivation_score
         } for q in quizzes],
-        "nutrition_plans": len(nutrition),
-        "yoga_plans": len(yoga)
+        "nutrition_plans": sum(r.meals for r in rollups),
+        "yoga_plans": sum(r.yoga_sessions for r in rollups)
     }
 
 def cleanup_old_data(db: Session, days: int = 90):
-    """Clean up data older than specified days (for maintenance)"""
-    cutoff = datetime.utcnow() - timedelta(days=days)
-    
-    # This is a utility function - be careful with deletions!
-    # Uncomment to use:
-    # deleted_checkins = db.query(CheckIn).filter(CheckIn.date < cutoff).delete()
-    # db.commit()
-    # return {"deleted_checkins": deleted_checkins}
-    pass
+    """Move check-ins, quizzes, plans and traces older than ``days`` to the Parquet archive"""
+    return archive_old_data(db, days)
 
 if __name__ == "__main__":
     # Example usage
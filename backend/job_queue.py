@@ -0,0 +1,228 @@
+"""
+Background jobs backed by the ``jobs`` table.
+Work that waits on external APIs (meal and yoga plan generation after a
+check-in) is enqueued as a row and run by a small pool of worker threads,
+so the request that created it can return straight away. A job is
+claimed with a conditional UPDATE, so several workers or processes can
+share the table. Failed jobs are retried with exponential backoff up to
+``max_attempts``. Workers periodically sweep for jobs left running by a
+crashed process: once they are older than ``JOB_STALE_SECONDS`` they are
+requeued, or failed if that was their last attempt.
+"""
+import os
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Optional, Set
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from database import SessionLocal, Job
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "2.0"))
+JOB_RETRY_BASE_SECONDS = float(os.getenv("JOB_RETRY_BASE_SECONDS", "5"))
+JOB_STALE_SECONDS = int(os.getenv("JOB_STALE_SECONDS", "900"))
+JOB_SWEEP_INTERVAL = float(os.getenv("JOB_SWEEP_INTERVAL", "60"))
+FINISHED_STATUSES = ("succeeded", "failed")
+
+Handler = Callable[[Session, Job], Any]
+
+def job_view(job: Job) -> Dict:
+    return {
+        "job_id": job.id,
+        "user_id": job.user_id,
+        "kind": job.kind,
+        "status": job.status,
+        "attempts": job.attempts,
+        "max_attempts": job.max_attempts,
+        "result": job.result,
+        "error": job.error,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+    }
+
+class JobQueue:
+    def __init__(self, session_factory=SessionLocal, workers: int = JOB_WORKERS,
+                 poll_interval: float = JOB_POLL_INTERVAL):
+        self.session_factory = session_factory
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self._handlers: Dict[str, Handler] = {}
+        self._cond = threading.Condition()
+        self._threads = []
+        self._closed = False
+        # Jobs this process is running, which the stale sweep must leave alone
+        self._running: Set[int] = set()
+        self._next_sweep = 0.0
+        self.succeeded = 0
+        self.failed = 0
+        self.retried = 0
+
+    def register(self, kind: str, handler: Handler):
+        """``handler(db, job)`` returns the job's JSON result or raises to retry"""
+        self._handlers[kind] = handler
+
+    def enqueue(self, db: Session, kind: str, user_id: Optional[int], payload: Dict,
+                max_attempts: int = 3) -> Job:
+        """Persist a job (commits ``db``) and wake a worker"""
+        if kind not in self._handlers:
+            raise ValueError(f"No handler registered for job kind '{kind}'")
+        job = Job(user_id=user_id, kind=kind, status="queued", payload=payload,
+                  attempts=0, max_attempts=max_attempts, run_at=datetime.utcnow(),
+                  created_at=datetime.utcnow())
+        db.add(job)
+        db.commit()
+        with self._cond:
+            self._cond.notify()
+        return job
+
+    def retry(self, db: Session, job_id: int) -> Optional[Job]:
+        """Queue a failed job again with a fresh set of attempts"""
+        claimed = db.execute(update(Job).where(Job.id == job_id, Job.status == "failed").values(
+            status="queued", attempts=0, error=None, run_at=datetime.utcnow(), finished_at=None
+        )).rowcount
+        db.commit()
+        if claimed:
+            with self._cond:
+                self._cond.notify()
+        return db.get(Job, job_id) if claimed else None
+
+    def start(self):
+        with self._cond:
+            if self._threads:
+                return
+            self._closed = False
+            for index in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f"job-worker-{index}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def close(self, timeout: Optional[float] = None):
+        """Stop the workers once their current jobs finish; queued jobs stay in the table"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+            threads, self._threads = self._threads, []
+        for thread in threads:
+            thread.join(timeout)
+
+    def _requeue_stale(self, db: Session) -> int:
+        """Recover jobs whose worker died; returns how many were found"""
+        stale_before = datetime.utcnow() - timedelta(seconds=JOB_STALE_SECONDS)
+        with self._cond:
+            running = list(self._running)
+        stale = [Job.status == "running", Job.started_at < stale_before, Job.id.notin_(running)]
+        # The attempt counter was bumped when the job was claimed, so a crash counts as an attempt
+        failed = db.execute(update(Job).where(*stale, Job.attempts >= Job.max_attempts).values(
+            status="failed", error="Worker stopped while running the job", finished_at=datetime.utcnow()
+        )).rowcount
+        requeued = db.execute(update(Job).where(*stale).values(
+            status="queued", run_at=datetime.utcnow()
+        )).rowcount
+        db.commit()
+        self.failed += failed
+        return failed + requeued
+
+    def _sweep_if_due(self):
+        with self._cond:
+            now = time.monotonic()
+            if now < self._next_sweep:
+                return
+            self._next_sweep = now + JOB_SWEEP_INTERVAL
+        db = self.session_factory()
+        try:
+            self._requeue_stale(db)
+        except Exception as e:
+            print(f"Could not requeue stale jobs: {str(e)}")
+        finally:
+            db.close()
+
+    def _claim(self, db: Session) -> Optional[Job]:
+        """The oldest due job, marked running by this worker"""
+        while True:
+            job_id = db.execute(select(Job.id).where(
+                Job.status == "queued", Job.run_at <= datetime.utcnow()
+            ).order_by(Job.run_at, Job.id).limit(1)).scalar()
+            if job_id is None:
+                db.rollback()
+                return None
+            claimed = db.execute(update(Job).where(Job.id == job_id, Job.status == "queued").values(
+                status="running", attempts=Job.attempts + 1, started_at=datetime.utcnow()
+            )).rowcount
+            db.commit()
+            if claimed:
+                return db.get(Job, job_id)
+            # Another worker got it first
+
+    def run_one(self) -> bool:
+        """Claim and run a single due job; False if there was none"""
+        db = self.session_factory()
+        try:
+            job = self._claim(db)
+            if job is None:
+                return False
+            job_id = job.id
+            with self._cond:
+                self._running.add(job_id)
+            try:
+                result = self._handlers[job.kind](db, job)
+            except Exception as e:
+                db.rollback()
+                self._fail(db, job, e)
+            else:
+                job.status = "succeeded"
+                job.result = result
+                job.error = None
+                job.finished_at = datetime.utcnow()
+                db.commit()
+                self.succeeded += 1
+            finally:
+                with self._cond:
+                    self._running.discard(job_id)
+            return True
+        finally:
+            db.close()
+
+    def _fail(self, db: Session, job: Job, error: Exception):
+        print(f"Job {job.id} ({job.kind}) failed on attempt {job.attempts}: {str(error)}")
+        job.error = "".join(traceback.format_exception_only(type(error), error)).strip()
+        if job.attempts < job.max_attempts:
+            job.status = "queued"
+            job.run_at = datetime.utcnow() + timedelta(seconds=JOB_RETRY_BASE_SECONDS * 2 ** (job.attempts - 1))
+            self.retried += 1
+        else:
+            job.status = "failed"
+            job.finished_at = datetime.utcnow()
+            self.failed += 1
+        db.commit()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if self._closed:
+                    return
+            self._sweep_if_due()
+            try:
+                ran = self.run_one()
+            except Exception as e:
+                print(f"Job worker error: {str(e)}")
+                ran = False
+            if not ran:
+                with self._cond:
+                    if self._closed:
+                        return
+                    self._cond.wait(self.poll_interval)
+
+    def stats(self) -> Dict:
+        return {
+            "workers": len(self._threads),
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "retried": self.retried,
+        }
+
+job_queue = JobQueue()
@@ -0,0 +1,191 @@
+"""
+Local stand-ins for the USDA FoodData Central search, YouTube search and
+OpenAI chat-completions APIs, for load tests that must run offline.
+
+Each service answers after a log-normal delay around its median latency
+and fails a configurable fraction of calls. Point the backend at it with
+
+    USDA_API_URL=http://127.0.0.1:8900/usda
+    YOUTUBE_API_URL=http://127.0.0.1:8900/youtube
+    OPENAI_BASE_URL=http://127.0.0.1:8900/openai/v1
+
+and run it on its own with
+
+    python loadtest/fake_apis.py --port 8900 --openai 800,0.02
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import zlib
+from dataclasses import dataclass
+from typing import Dict
+
+from aiohttp import web
+
+@dataclass
+class ServiceProfile:
+    median_ms: float
+    error_rate: float = 0.0
+    sigma: float = 0.5
+
+    @classmethod
+    def parse(cls, spec: str) -> "ServiceProfile":
+        """``median_ms[,error_rate]``, e.g. ``120,0.01``"""
+        parts = [float(p) for p in spec.split(",")]
+        return cls(parts[0], parts[1] if len(parts) > 1 else 0.0)
+
+DEFAULT_PROFILES = {
+    "usda": ServiceProfile(150, 0.01),
+    "youtube": ServiceProfile(200, 0.01),
+    "openai": ServiceProfile(900, 0.01),
+}
+OPENAI_TOKEN_MS = 15
+
+NUTRIENTS = [
+    ("Energy", "KCAL", 40, 380), ("Protein", "G", 0.5, 25), ("Fiber, total dietary", "G", 0.5, 15),
+    ("Calcium, Ca", "MG", 5, 200), ("Iron, Fe", "MG", 0.1, 8), ("Magnesium, Mg", "MG", 5, 150),
+]
+CHAT_REPLY = ("A calm morning routine helps: start with a few rounds of gentle breathing, "
+              "then a light Sattvic breakfast such as warm oats with fruit and a pinch of cardamom. "
+              "Keep meals simple, fresh and at regular times, and close the day with a short restorative practice.")
+
+class FakeApis:
+    def __init__(self, profiles: Dict[str, ServiceProfile], seed: int = 0):
+        self.profiles = profiles
+        self.random = random.Random(seed)
+        self.calls = {name: 0 for name in profiles}
+        self.errors = {name: 0 for name in profiles}
+
+    async def _delay(self, service: str) -> bool:
+        """Sleep for the service's latency; False if this call should fail"""
+        profile = self.profiles[service]
+        self.calls[service] += 1
+        await asyncio.sleep(profile.median_ms / 1000 * self.random.lognormvariate(0, profile.sigma))
+        if self.random.random() < profile.error_rate:
+            self.errors[service] += 1
+            return False
+        return True
+
+    async def usda_search(self, request: web.Request) -> web.Response:
+        if not await self._delay("usda"):
+            return web.json_response({"error": {"code": "OVER_RATE_LIMIT"}}, status=503)
+        query = request.query.get("query", "food")
+        rng = random.Random(query)
+        return web.json_response({
+            "totalHits": 1,
+            "foods": [{
+                "fdcId": rng.randint(100000, 999999),
+                "description": query.upper(),
+                "foodNutrients": [
+                    {"nutrientName": name, "unitName": unit, "value": round(rng.uniform(low, high), 1)}
+                    for name, unit, low, high in NUTRIENTS
+                ],
+            }],
+        })
+
+    async def youtube_search(self, request: web.Request) -> web.Response:
+        if not await self._delay("youtube"):
+            return web.json_response({"error": {"code": 403, "message": "quotaExceeded"}}, status=403)
+        query = request.query.get("q", "yoga")
+        video_id = f"fake{zlib.crc32(query.encode()) % 10 ** 7:07d}"
+        return web.json_response({
+            "items": [{
+                "id": {"kind": "youtube#video", "videoId": video_id},
+                "snippet": {
+                    "title": f"{query.title()} | Guided Session",
+                    "description": f"A guided {query} practice for all levels.",
+                    "channelTitle": "Offline Yoga",
+                    "thumbnails": {"default": {"url": f"https://i.ytimg.com/vi/{video_id}/default.jpg"}},
+                },
+            }],
+        })
+
+    async def chat_completions(self, request: web.Request) -> web.StreamResponse:
+        body = await request.json()
+        if not await self._delay("openai"):
+            return web.json_response({"error": {"message": "The server is overloaded", "type": "server_error"}},
+                                     status=503)
+        prompt = body["messages"][-1]["content"]
+        content = _recipe_json(prompt) if "Format as JSON" in prompt else CHAT_REPLY
+        prompt_tokens = sum(len(m["content"]) for m in body["messages"]) // 4
+        completion_tokens = len(content) // 4
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                 "total_tokens": prompt_tokens + completion_tokens}
+        completion_id = f"chatcmpl-{self.calls['openai']}"
+        created = int(time.time())
+        if not body.get("stream"):
+            return web.json_response({
+                "id": completion_id, "object": "chat.completion", "created": created, "model": body["model"],
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": content}}],
+                "usage": usage,
+            })
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+
+        async def send(choices, **extra):
+            chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": created,
+                     "model": body["model"], "choices": choices, **extra}
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+
+        words = content.split(" ")
+        for i, word in enumerate(words):
+            piece = word if i == len(words) - 1 else word + " "
+            await send([{"index": 0, "delta": {"content": piece}, "finish_reason": None}])
+            await asyncio.sleep(OPENAI_TOKEN_MS / 1000)
+        await send([{"index": 0, "delta": {}, "finish_reason": "stop"}])
+        if (body.get("stream_options") or {}).get("include_usage"):
+            await send([], usage=usage)
+        await response.write(b"data: [DONE]\n\n")
+        return response
+
+    async def stats(self, request: web.Request) -> web.Response:
+        return web.json_response({"calls": self.calls, "errors": self.errors})
+
+def _recipe_json(prompt: str) -> str:
+    line = next((l for l in prompt.splitlines() if l.startswith("Ingredients available:")), "")
+    ingredients = [i.strip() for i in line.partition(":")[2].split(",") if i.strip()] or ["rice", "lentils"]
+    meal = next((l.partition(":")[2].strip() for l in prompt.splitlines() if l.startswith("Meal type:")), "meal")
+    return json.dumps({
+        "name": f"Sattvic {meal.title()} Bowl",
+        "ingredients": [{"name": i, "quantity": "1 cup"} for i in ingredients],
+        "instructions": "Rinse the ingredients. Simmer gently until tender. Season lightly and serve warm.",
+        "prep_time_minutes": 20,
+        "sattvic_score": 9,
+        "simplicity_index": 8,
+    })
+
+def build_app(profiles: Dict[str, ServiceProfile] = None, seed: int = 0) -> web.Application:
+    fakes = FakeApis({**DEFAULT_PROFILES, **(profiles or {})}, seed)
+    app = web.Application()
+    app["fakes"] = fakes
+    app.add_routes([
+        web.get("/usda/foods/search", fakes.usda_search),
+        web.get("/youtube/search", fakes.youtube_search),
+        web.post("/openai/v1/chat/completions", fakes.chat_completions),
+        web.get("/stats", fakes.stats),
+    ])
+    return app
+
+def add_profile_args(parser: argparse.ArgumentParser):
+    for name, profile in DEFAULT_PROFILES.items():
+        parser.add_argument(f"--{name}", type=ServiceProfile.parse, metavar="MS[,ERR]",
+                            help=f"{name} median latency and error rate (default {profile.median_ms:g},{profile.error_rate:g})")
+
+def profiles_from_args(args) -> Dict[str, ServiceProfile]:
+    return {name: getattr(args, name) for name in DEFAULT_PROFILES if getattr(args, name)}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--seed", type=int, default=0)
+    add_profile_args(parser)
+    args = parser.parse_args()
+    web.run_app(build_app(profiles_from_args(args), args.seed), host=args.host, port=args.port)
+
+if __name__ == "__main__":
+    main()
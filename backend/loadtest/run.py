@@ -0,0 +1,270 @@
+"""
+End-to-end load test of the API against local stand-ins for USDA, YouTube and OpenAI.
+
+Starts the fake APIs (fake_apis.py) and a uvicorn backend on a fresh
+SQLite database pointed at them, registers a synthetic user population,
+then drives check-ins, dashboards, reports and chat at a target rate.
+Arrivals are open-loop (Poisson at ``--rps``) and latency is measured
+from each request's scheduled start, so a slow backend shows up as
+latency rather than as a lower offered load. Runs fully offline:
+
+    python loadtest/run.py --rps 20 --duration 60 --users 50
+    python loadtest/run.py --base-url http://127.0.0.1:8000 --no-fakes   # an already running backend
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+import aiohttp
+from aiohttp import web
+
+from fake_apis import add_profile_args, build_app, profiles_from_args
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_MIX = "checkin=1,dashboard=4,reports=2,chat=3"
+EXPERIENCE = ["beginner", "intermediate", "advanced"]
+DIETS = [["vegetarian"], ["vegan"], ["vegetarian", "gluten_free"], ["sattvic"]]
+GOALS = [["stress_relief"], ["flexibility", "strength"], ["weight_management"], ["better_sleep", "stress_relief"]]
+INGREDIENTS = ["rice", "lentils", "spinach", "carrots", "oats", "banana", "quinoa", "chickpeas",
+               "tofu", "almonds", "sweet potato", "mung beans", "yogurt", "apple", "ginger"]
+MOODS = [("happy", 8), ("calm", 7), ("tired", 4), ("stressed", 3), ("neutral", 5)]
+QUESTIONS = [
+    "What should I eat for breakfast?", "Can you suggest yoga for stress?",
+    "How do I start yoga as a beginner?", "What is a sattvic diet?", "Ideas for a light dinner?",
+    "How can I sleep better?", "What are good high protein vegetarian foods?", "Hello!",
+]
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        if name not in ENDPOINTS:
+            raise argparse.ArgumentTypeError(f"unknown endpoint '{name}' (one of {', '.join(ENDPOINTS)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+def _checkin(rng: random.Random, user_id: int):
+    mood, score = rng.choice(MOODS)
+    body = {
+        "mood": mood, "mood_score": score, "appetite": rng.randint(3, 9), "energy": rng.randint(2, 9),
+        "sleep_hours": round(rng.uniform(5, 9), 1), "adherence": rng.randint(40, 100),
+        "ingredients": ", ".join(rng.sample(INGREDIENTS, rng.randint(3, 7))), "notes": "",
+    }
+    return "POST", f"/api/checkin/{user_id}", body
+
+def _dashboard(rng: random.Random, user_id: int):
+    return "GET", f"/api/dashboard/{user_id}/overview", None
+
+def _reports(rng: random.Random, user_id: int):
+    return "GET", f"/api/reports/weekly/{user_id}", None
+
+def _chat(rng: random.Random, user_id: int):
+    return "POST", "/api/chatbot/chat", {
+        "user_id": user_id, "messages": [{"role": "user", "content": rng.choice(QUESTIONS)}]
+    }
+
+ENDPOINTS = {"checkin": _checkin, "dashboard": _dashboard, "reports": _reports, "chat": _chat}
+
+def _checkin_ok(body: Dict) -> bool:
+    # Failed plan nodes fall back to nothing, so a 200 alone doesn't mean the pipeline worked
+    return bool((body.get("plans") or {}).get("nutrition"))
+
+# Responses that need more than a 2xx status to count as a success
+CHECKS = {"checkin": _checkin_ok}
+
+def percentile(sorted_values: List[float], q: float) -> Optional[float]:
+    if not sorted_values:
+        return None
+    return round(sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))] * 1000, 1)
+
+def summarize(samples: List[Dict], elapsed: float) -> Dict[str, Dict]:
+    by_endpoint: Dict[str, List[Dict]] = {}
+    for sample in samples:
+        by_endpoint.setdefault(sample["endpoint"], []).append(sample)
+    by_endpoint["all"] = samples
+    summary = {}
+    for endpoint, rows in by_endpoint.items():
+        latencies = sorted(r["latency"] for r in rows)
+        errors = sum(1 for r in rows if not r["ok"])
+        summary[endpoint] = {
+            "requests": len(rows),
+            "errors": errors,
+            "rps": round(len(rows) / elapsed, 2) if elapsed else 0.0,
+            "p50_ms": percentile(latencies, 0.50),
+            "p95_ms": percentile(latencies, 0.95),
+            "p99_ms": percentile(latencies, 0.99),
+            "max_ms": percentile(latencies, 1.0),
+        }
+    return summary
+
+async def register_users(session: aiohttp.ClientSession, base_url: str, count: int, rng: random.Random) -> List[int]:
+    run_tag = f"{int(time.time())}{rng.randint(0, 999):03d}"
+    user_ids = []
+    for i in range(count):
+        async with session.post(f"{base_url}/api/auth/register", json={
+            "email": f"load{run_tag}_{i}@example.com", "name": f"Load User {i}", "age": rng.randint(20, 65),
+            "gender": rng.choice(["female", "male", "other"]), "yoga_experience": rng.choice(EXPERIENCE),
+            "dietary_preferences": rng.choice(DIETS), "allergies": [], "goals": rng.choice(GOALS),
+            "activity_level": rng.choice(["low", "moderate", "high"]),
+        }) as response:
+            response.raise_for_status()
+            user_ids.append((await response.json())["id"])
+    return user_ids
+
+async def drive(base_url: str, user_ids: List[int], mix: Dict[str, float], rps: float, duration: float,
+                warmup: float, rng: random.Random, timeout: float) -> Dict:
+    names = list(mix)
+    weights = [mix[n] for n in names]
+    samples: List[Dict] = []
+    tasks = []
+
+    async def fire(session: aiohttp.ClientSession, endpoint: str, scheduled: float, measured: bool):
+        method, path, body = ENDPOINTS[endpoint](rng, rng.choice(user_ids))
+        status = None
+        ok = False
+        try:
+            async with session.request(method, base_url + path, json=body) as response:
+                payload = await response.read()
+                status = response.status
+            ok = status < 400
+            if ok and endpoint in CHECKS:
+                ok = CHECKS[endpoint](json.loads(payload))
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+            pass
+        if measured:
+            samples.append({"endpoint": endpoint, "status": status, "ok": ok,
+                            "latency": time.perf_counter() - scheduled})
+
+    connector = aiohttp.TCPConnector(limit=0)
+    async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=timeout)) as session:
+        started = time.perf_counter()
+        next_at = started
+        while next_at - started < warmup + duration:
+            delay = next_at - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            measured = next_at - started >= warmup
+            endpoint = rng.choices(names, weights)[0]
+            tasks.append(asyncio.create_task(fire(session, endpoint, next_at, measured)))
+            next_at += rng.expovariate(rps)
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started - warmup
+
+    return summarize(samples, elapsed)
+
+async def wait_until_up(base_url: str, process: Optional[subprocess.Popen], timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        while time.monotonic() < deadline:
+            if process is not None and process.poll() is not None:
+                raise RuntimeError(f"backend exited with code {process.returncode}")
+            try:
+                async with session.get(f"{base_url}/health") as response:
+                    if response.status == 200:
+                        return
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.25)
+    raise RuntimeError(f"backend at {base_url} did not come up within {timeout:.0f}s")
+
+def start_backend(port: int, fake_url: str, database_url: str, log_file) -> subprocess.Popen:
+    env = dict(
+        os.environ,
+        DATABASE_URL=database_url,
+        USDA_API_URL=f"{fake_url}/usda",
+        YOUTUBE_API_URL=f"{fake_url}/youtube",
+        OPENAI_BASE_URL=f"{fake_url}/openai/v1",
+        OPENAI_API_KEY="sk-loadtest",
+        USDA_API_KEY="loadtest",
+        YOUTUBE_API_KEY="loadtest",
+    )
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env, stdout=log_file, stderr=subprocess.STDOUT,
+    )
+
+async def run(args) -> Dict:
+    rng = random.Random(args.seed)
+    fake_runner = None
+    backend = None
+    fake_url = f"http://127.0.0.1:{args.fake_port}"
+    with tempfile.TemporaryDirectory() as tmp:
+        try:
+            if not args.no_fakes:
+                fake_app = build_app(profiles_from_args(args), args.seed)
+                fake_runner = web.AppRunner(fake_app)
+                await fake_runner.setup()
+                await web.TCPSite(fake_runner, "127.0.0.1", args.fake_port).start()
+
+            base_url = args.base_url
+            if base_url is None:
+                base_url = f"http://127.0.0.1:{args.port}"
+                database_url = args.database_url or f"sqlite:///{os.path.join(tmp, 'loadtest.db')}"
+                log_path = args.backend_log or os.path.join(tmp, "backend.log")
+                backend = start_backend(args.port, fake_url, database_url, open(log_path, "w"))
+            await wait_until_up(base_url, backend)
+
+            async with aiohttp.ClientSession() as session:
+                user_ids = await register_users(session, base_url, args.users, rng)
+            summary = await drive(base_url, user_ids, args.mix, args.rps, args.duration, args.warmup,
+                                  rng, args.timeout)
+            if fake_runner is not None:
+                fakes = fake_app["fakes"]
+                summary["upstream"] = {"calls": dict(fakes.calls), "errors": dict(fakes.errors)}
+            return summary
+        finally:
+            if backend is not None:
+                backend.terminate()
+                backend.wait(timeout=30)
+            if fake_runner is not None:
+                await fake_runner.cleanup()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rps", type=float, default=10, help="Target request rate (open loop)")
+    parser.add_argument("--duration", type=float, default=30, help="Measured seconds")
+    parser.add_argument("--warmup", type=float, default=5, help="Seconds of load before measuring")
+    parser.add_argument("--users", type=int, default=50, help="Synthetic users to register")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX),
+                        help=f"Endpoint weights (default {DEFAULT_MIX})")
+    parser.add_argument("--timeout", type=float, default=120, help="Per-request timeout in seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--port", type=int, default=8800, help="Port for the backend started by the run")
+    parser.add_argument("--fake-port", type=int, default=8900)
+    parser.add_argument("--base-url", help="Load an already running backend instead of starting one")
+    parser.add_argument("--no-fakes", action="store_true", help="Don't start the fake APIs")
+    parser.add_argument("--database-url", help="Database for the started backend (default: a fresh SQLite file)")
+    parser.add_argument("--backend-log", help="Keep the started backend's output in this file")
+    parser.add_argument("--json", help="Also write the results to this file")
+    add_profile_args(parser)
+    args = parser.parse_args()
+
+    summary = asyncio.run(run(args))
+    print(f"{'endpoint':>10} {'requests':>9} {'errors':>7} {'req/s':>7} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'p99 ms':>8} {'max ms':>8}")
+    for endpoint, row in summary.items():
+        if endpoint == "upstream":
+            continue
+        print(f"{endpoint:>10} {row['requests']:>9} {row['errors']:>7} {row['rps']:>7} {row['p50_ms']!s:>8} "
+              f"{row['p95_ms']!s:>8} {row['p99_ms']!s:>8} {row['max_ms']!s:>8}")
+    if "upstream" in summary:
+        print("upstream calls:", ", ".join(
+            f"{name} {count} ({summary['upstream']['errors'][name]} failed)"
+            for name, count in summary["upstream"]["calls"].items()
+        ))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": {k: v for k, v in vars(args).items() if k != "mix"}, "mix": args.mix,
+                       "results": summary}, f, indent=2, default=str)
+
+if __name__ == "__main__":
+    main()
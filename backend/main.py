@@ -1,25 +1,47 @@
 from fastapi import FastAPI, HTTPException, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 from contextlib import asynccontextmanager
+import asyncio
 import os
+import anyio
 from dotenv import load_dotenv
 
-from database import init_db
+from database import init_db, async_engine, SessionLocal
+from agents.tool_scheduler import tool_scheduler
+from progress_snapshots import snapshot_loop, SNAPSHOT_INTERVAL_SECONDS
+from trace_store import trace_writer
+from chat_context import preload_tokenizer, usage_totals
+from chat_cache import semantic_cache
+from job_queue import job_queue
+from response_cache import response_cache
+import metrics
 from routers import (
     auth, profile, checkin, nutrition, yoga, quiz, 
-    dashboard, reports, chatbot, trace
+    dashboard, reports, chatbot, trace, analytics, jobs
 )
 
 load_dotenv()
 
+# Sync routes (agent pipelines, OpenAI/USDA/YouTube calls, reports) run in
+# this many worker threads; async read routes stay on the event loop
+THREADPOOL_SIZE = int(os.getenv("THREADPOOL_SIZE", "40"))
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
     init_db()
+    preload_tokenizer()
+    anyio.to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
+    snapshot_task = asyncio.create_task(snapshot_loop()) if SNAPSHOT_INTERVAL_SECONDS > 0 else None
+    job_queue.start()
     yield
     # Shutdown
-    pass
+    if snapshot_task:
+        snapshot_task.cancel()
+    await asyncio.to_thread(job_queue.close)
+    await asyncio.to_thread(trace_writer.close)
+    await async_engine.dispose()
 
 app = FastAPI(
     title="Yoga Wellness Coach API",
@@ -37,6 +59,46 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+metrics.instrument_app(app)
+metrics.instrument_sessions(SessionLocal)
+
+def _collect_app_stats():
+    """Counters the caches, queues and writers already keep, read at scrape time"""
+    chat = usage_totals.stats()
+    cache = semantic_cache.stats()
+    jobs_stats = job_queue.stats()
+    traces = trace_writer.stats()
+    scheduler = tool_scheduler.metrics()
+    yield ("wellness_cache_hits_total", "counter", "Cache hits by cache", [
+        ({"cache": "response"}, response_cache.hits),
+        ({"cache": "chat_semantic"}, cache["hits"]),
+        ({"cache": "chat_summary"}, chat["summary_cache_hits"]),
+    ])
+    yield ("wellness_cache_misses_total", "counter", "Cache misses by cache", [
+        ({"cache": "response"}, response_cache.misses),
+        ({"cache": "chat_semantic"}, cache["lookups"] - cache["hits"]),
+        ({"cache": "chat_summary"}, chat["summary_cache_misses"]),
+    ])
+    yield ("wellness_chat_tokens_total", "counter", "Chat tokens by kind", [
+        ({"kind": "prompt"}, chat["prompt_tokens"]),
+        ({"kind": "completion"}, chat["completion_tokens"]),
+    ])
+    yield ("wellness_jobs_total", "counter", "Background jobs by outcome", [
+        ({"outcome": outcome}, jobs_stats[outcome]) for outcome in ("succeeded", "failed", "retried")
+    ])
+    yield ("wellness_traces_total", "counter", "Decision traces by outcome", [
+        ({"outcome": "written"}, traces["written"]),
+        ({"outcome": "dropped"}, traces["dropped"]),
+    ])
+    yield ("wellness_tool_queue_depth", "gauge", "Outbound calls waiting for a scheduler slot", [
+        ({"provider": provider}, stats["queue_depth"]) for provider, stats in scheduler.items()
+    ])
+    yield ("wellness_tool_queue_timeouts_total", "counter", "Outbound calls that timed out waiting for a slot", [
+        ({"provider": provider}, stats["timeouts"]) for provider, stats in scheduler.items()
+    ])
+
+metrics.add_collector(_collect_app_stats)
+
 # Include routers
 app.include_router(auth.router, prefix="/api/auth", tags=["Authentication"])
 app.include_router(profile.router, prefix="/api/profile", tags=["Profile"])
@@ -48,6 +110,8 @@ app.include_router(dashboard.router, prefix="/api/dashboard", tags=["Dashboard"]
 app.include_router(reports.router, prefix="/api/reports", tags=["Reports"])
 app.include_router(chatbot.router, prefix="/api/chatbot", tags=["Chatbot"])
 app.include_router(trace.router, prefix="/api/trace", tags=["Decision Trace"])
+app.include_router(analytics.router, prefix="/api/analytics", tags=["Analytics"])
+app.include_router(jobs.router, prefix="/api/jobs", tags=["Jobs"])
 
 @app.get("/")
 async def root():
@@ -57,6 +121,26 @@ async def root():
 async def health():
     return {"status": "healthy"}
 
+@app.get("/health/scheduler")
+async def scheduler_health():
+    """Outbound tool-call queue depths per provider"""
+    return tool_scheduler.metrics()
+
+@app.get("/health/jobs")
+async def jobs_health():
+    """Background job worker totals"""
+    return job_queue.stats()
+
+@app.get("/health/chat")
+async def chat_health():
+    """Chat token usage, context compaction and semantic cache totals"""
+    return {**usage_totals.stats(), "cache": semantic_cache.stats()}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Prometheus scrape endpoint; stage timings need METRICS_ENABLED=1"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,225 @@
+"""
+Prometheus metrics for the API, served at ``/metrics``.
+Agent stages are wrapped in spans that feed a latency histogram per
+stage and, within a request, a ``Server-Timing`` response header.
+External calls, quota rejections and DB commits have their own series;
+cache and queue statistics the app already keeps are read at scrape
+time. With ``METRICS_ENABLED`` unset, ``timed`` returns functions
+unwrapped and ``span`` is a shared no-op, so instrumentation costs
+nothing; scrape-time series are still served.
+"""
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "0") == "1"
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _number(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        registry.append(self)
+
+    def _key(self, labels: Dict) -> Tuple:
+        return tuple(labels.get(n, "") for n in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_labels(self.labelnames, k)} {_number(v)}" for k, v in items]
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, *args, buckets: Tuple[float, ...] = LATENCY_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = buckets
+        self._series: Dict[Tuple, list] = {}  # key -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._series.items())
+        lines = []
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                le = 'le="%s"' % bound
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+            inf = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, inf)} {series[-1]}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(round(series[-2], 6))}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {series[-1]}")
+        return lines
+
+registry: List[_Metric] = []
+# Callables returning (name, type, help, [(labels dict, value), ...]) read at scrape time
+_collectors: List[Callable[[], Iterable[Tuple[str, str, str, List[Tuple[Dict, float]]]]]] = []
+
+STAGE_SECONDS = Histogram("wellness_stage_duration_seconds", "Duration of agent stages", ["stage"])
+EXTERNAL_CALLS = Counter("wellness_external_calls_total", "Outbound API calls by outcome", ["provider", "outcome"])
+EXTERNAL_SECONDS = Histogram("wellness_external_call_duration_seconds", "Outbound API call latency", ["provider"])
+QUOTA_REJECTIONS = Counter("wellness_quota_rejections_total", "Calls skipped because a user's daily quota was used", ["api"])
+DB_COMMIT_SECONDS = Histogram("wellness_db_commit_duration_seconds", "Session commit latency")
+HTTP_SECONDS = Histogram("wellness_http_request_duration_seconds", "Request latency by endpoint", ["method", "handler", "status"])
+
+_request_spans: contextvars.ContextVar[Optional[List[Tuple[str, float]]]] = contextvars.ContextVar(
+    "request_spans", default=None
+)
+
+@contextmanager
+def _span(stage: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        spans = _request_spans.get()
+        if spans is not None:
+            spans.append((stage, elapsed))
+
+_noop_span = nullcontext()
+
+def span(stage: str):
+    """Time a block as ``stage``; a no-op when metrics are disabled"""
+    return _span(stage) if METRICS_ENABLED else _noop_span
+
+def timed(stage: str):
+    """Decorator form of ``span``; leaves the function untouched when disabled"""
+    def decorate(fn):
+        if not METRICS_ENABLED:
+            return fn
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with _span(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def record_external_call(provider: str, started: float, result=None, error: Optional[BaseException] = None):
+    if not METRICS_ENABLED:
+        return
+    EXTERNAL_SECONDS.observe(time.perf_counter() - started, provider=provider)
+    if error is not None:
+        outcome = type(error).__name__
+    elif getattr(result, "status_code", None) is not None:
+        outcome = f"{result.status_code // 100}xx"
+    else:
+        outcome = "ok"
+    EXTERNAL_CALLS.inc(provider=provider, outcome=outcome)
+
+def record_quota_rejection(api: str):
+    if METRICS_ENABLED:
+        QUOTA_REJECTIONS.inc(api=api)
+
+def add_collector(collect: Callable):
+    _collectors.append(collect)
+
+def instrument_sessions(session_factory):
+    """Time commits of sessions from ``session_factory``"""
+    if not METRICS_ENABLED:
+        return
+    from sqlalchemy import event
+
+    @event.listens_for(session_factory, "before_commit")
+    def _before_commit(session):
+        session.info["commit_started"] = time.perf_counter()
+
+    @event.listens_for(session_factory, "after_commit")
+    def _after_commit(session):
+        started = session.info.pop("commit_started", None)
+        if started is not None:
+            DB_COMMIT_SECONDS.observe(time.perf_counter() - started)
+
+def instrument_app(app):
+    """Per-endpoint latency histogram and a Server-Timing header of the request's spans"""
+    if not METRICS_ENABLED:
+        return
+
+    @app.middleware("http")
+    async def _timing_middleware(request, call_next):
+        spans: List[Tuple[str, float]] = []
+        token = _request_spans.set(spans)
+        started = time.perf_counter()
+        status = 500
+        try:
+            response = await call_next(request)
+            status = response.status_code
+        finally:
+            _request_spans.reset(token)
+            route = request.scope.get("route")
+            HTTP_SECONDS.observe(time.perf_counter() - started, method=request.method,
+                                 handler=getattr(route, "name", "unmatched"), status=status)
+        if spans:
+            response.headers["Server-Timing"] = ", ".join(
+                f"{stage};dur={elapsed * 1000:.1f}" for stage, elapsed in spans
+            )
+        return response
+
+def render() -> str:
+    """All series in the Prometheus text exposition format"""
+    lines = []
+    for metric in registry:
+        lines.extend(metric.render())
+    for collect in _collectors:
+        for name, kind, help, samples in collect():
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                names = tuple(labels)
+                lines.append(f"{name}{_labels(names, tuple(labels[n] for n in names))} {_number(value)}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,142 @@
+"""
+Versioned schema migrations.
+``create_all`` only creates missing tables, so changes to existing tables
+(indexes, columns) are applied here in order and recorded in
+``schema_version``. ``init_db`` applies pending migrations on startup;
+``python db_init.py --migrate`` runs them by hand.
+"""
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Tuple
+
+from sqlalchemy import select, func, inspect
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from database import (
+    engine as default_engine, SchemaVersion, CheckIn, QuizResponse, NutritionPlan,
+    YogaPlan, MLPrediction, DecisionTrace, Progress, TraceRule, TracePayload, DailyRollup
+)
+
+# Tables read by user and date range, newest first
+USER_DATE_TABLES = [CheckIn, QuizResponse, NutritionPlan, YogaPlan, MLPrediction, DecisionTrace, Progress]
+
+def _add_user_date_indexes(conn: Connection):
+    for model in USER_DATE_TABLES:
+        for index in model.__table__.indexes:
+            index.create(conn, checkfirst=True)
+        # The composite index's user_id prefix serves user-only lookups
+        conn.exec_driver_sql(f"DROP INDEX IF EXISTS ix_{model.__tablename__}_user_id")
+    # Covered by the (user_id, day) unique constraint
+    conn.exec_driver_sql("DROP INDEX IF EXISTS ix_daily_rollups_user_id")
+
+def _add_trace_payload_hashes(conn: Connection):
+    existing = {c["name"] for c in inspect(conn).get_columns("decision_traces")}
+    for name in ("triggered_rules_hash", "memory_retrieved_hash", "plan_chosen_hash", "tools_called_hash"):
+        if name not in existing:
+            conn.exec_driver_sql(f"ALTER TABLE decision_traces ADD COLUMN {name} VARCHAR(64)")
+
+def _index_trace_rules(conn: Connection):
+    from trace_store import rule_ids
+
+    for index in DecisionTrace.__table__.indexes:
+        index.create(conn, checkfirst=True)
+    TraceRule.__table__.create(conn, checkfirst=True)
+    conn.execute(TraceRule.__table__.delete())
+
+    payloads = dict(conn.execute(select(TracePayload.hash, TracePayload.payload)).all())
+    last_id = 0
+    while True:
+        rows = conn.execute(select(
+            DecisionTrace.id, DecisionTrace.user_id, DecisionTrace.date,
+            DecisionTrace.triggered_rules, DecisionTrace.triggered_rules_hash
+        ).where(DecisionTrace.id > last_id).order_by(DecisionTrace.id).limit(5000)).all()
+        if not rows:
+            return
+        rule_rows = [
+            {"trace_id": r.id, "rule_id": rule_id, "user_id": r.user_id, "date": r.date}
+            for r in rows
+            for rule_id in rule_ids(payloads.get(r.triggered_rules_hash) if r.triggered_rules_hash else r.triggered_rules)
+        ]
+        if rule_rows:
+            conn.execute(TraceRule.__table__.insert(), rule_rows)
+        last_id = rows[-1].id
+
+def _unique_progress_days(conn: Connection):
+    if "day" not in {c["name"] for c in inspect(conn).get_columns("progress")}:
+        conn.exec_driver_sql("ALTER TABLE progress ADD COLUMN day DATE")
+    conn.exec_driver_sql("UPDATE progress SET day = DATE(date) WHERE day IS NULL")
+    # Concurrent first reads could snapshot a day twice; keep the latest row
+    conn.exec_driver_sql(
+        "DELETE FROM progress WHERE id NOT IN (SELECT MAX(id) FROM progress GROUP BY user_id, day)"
+    )
+    unique = inspect(conn).get_unique_constraints("progress") + [
+        index for index in inspect(conn).get_indexes("progress") if index["unique"]
+    ]
+    if not any(u["column_names"] == ["user_id", "day"] for u in unique):
+        conn.exec_driver_sql("CREATE UNIQUE INDEX uq_progress_user_day ON progress (user_id, day)")
+
+def _backfill_daily_rollups(conn: Connection):
+    from rollups import backfill_rollups
+
+    # Reads come from rollups only, so history written before they existed must be rolled up
+    if conn.execute(select(func.count()).select_from(DailyRollup)).scalar() == 0:
+        backfill_rollups(Session(bind=conn))
+
+MIGRATIONS: List[Tuple[int, str, Callable[[Connection], None]]] = [
+    (1, "Composite (user_id, date) indexes", _add_user_date_indexes),
+    (2, "Content-addressed DecisionTrace payloads", _add_trace_payload_hashes),
+    (3, "trace_rules index and decision_traces(date) index", _index_trace_rules),
+    (4, "One progress snapshot per user and day", _unique_progress_days),
+    (5, "Daily rollups for existing history", _backfill_daily_rollups),
+]
+
+def current_version(conn: Connection) -> int:
+    return conn.execute(select(func.max(SchemaVersion.version))).scalar() or 0
+
+def migrate(engine: Engine = default_engine) -> List[int]:
+    """Apply pending migrations, each in its own transaction"""
+    SchemaVersion.__table__.create(engine, checkfirst=True)
+    applied = []
+    for version, description, apply in MIGRATIONS:
+        try:
+            with engine.begin() as conn:
+                if version <= current_version(conn):
+                    continue
+                apply(conn)
+                conn.execute(SchemaVersion.__table__.insert().values(
+                    version=version, description=description, applied_at=datetime.utcnow()
+                ))
+            applied.append(version)
+        except IntegrityError:
+            # Another process applied this migration first
+            continue
+    return applied
+
+def explain_hot_queries(engine: Engine = default_engine) -> List[Dict]:
+    """Query plans for the per-user date-range reads (SQLite only).
+
+    Each entry reports whether SQLite chose the table's composite index.
+    """
+    since = datetime.utcnow() - timedelta(days=30)
+    results = []
+    with engine.connect() as conn:
+        for model in USER_DATE_TABLES:
+            stmt = select(model).where(
+                model.user_id == 1, model.date >= since
+            ).order_by(model.date.desc()).limit(10)
+            compiled = stmt.compile(dialect=engine.dialect)
+            params = tuple(
+                str(value) if isinstance(value, datetime) else value
+                for value in (compiled.params[name] for name in compiled.positiontup)
+            )
+            plan = [row[-1] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", params)]
+            index_name = f"ix_{model.__tablename__}_user_date"
+            results.append({
+                "table": model.__tablename__,
+                "index": index_name,
+                "uses_index": any(index_name in step for step in plan),
+                "sorts": any("TEMP B-TREE" in step for step in plan),
+                "plan": plan,
+            })
+    return results
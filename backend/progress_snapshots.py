@@ -0,0 +1,234 @@
+"""
+Daily progress snapshots.
+Writes one `Progress` row per user per day from the user's last 8 daily
+rollups and the previous day's snapshot, so the dashboard and reports
+read a single precomputed row. A background job refreshes snapshots for
+users with new activity; readers compute a missing or stale snapshot on
+demand without storing it, so GET requests never write.
+"""
+import asyncio
+import os
+from datetime import date, datetime, timedelta
+from itertools import groupby
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from database import SessionLocal, DailyRollup, Progress
+from rollups import get_rollups
+
+SNAPSHOT_INTERVAL_SECONDS = int(os.getenv("PROGRESS_SNAPSHOT_INTERVAL", "900"))
+
+def _day_start(day: date) -> datetime:
+    return datetime.combine(day, datetime.min.time())
+
+def _snapshot_row(db: Session, user_id: int, day: date) -> Optional[Progress]:
+    return db.query(Progress).filter(
+        Progress.user_id == user_id,
+        Progress.day == day
+    ).first()
+
+def _streak_from_days(yoga_days: List[date], day: date) -> int:
+    """Consecutive days ending at ``day`` in ``yoga_days`` (newest first)"""
+    streak = 0
+    expected = day
+    for yoga_day in yoga_days:
+        if yoga_day != expected:
+            break
+        streak += 1
+        expected -= timedelta(days=1)
+    return streak
+
+def _streak_from_history(db: Session, user_id: int, day: date) -> int:
+    """Consecutive yoga days ending at ``day`` (used when no prior snapshot exists)"""
+    yoga_days = [row[0] for row in db.query(DailyRollup.day).filter(
+        DailyRollup.user_id == user_id,
+        DailyRollup.day <= day,
+        DailyRollup.yoga_sessions > 0
+    ).order_by(DailyRollup.day.desc())]
+    return _streak_from_days(yoga_days, day)
+
+def _yoga_streak(day: date, by_day: Dict[date, DailyRollup], previous: Optional[Progress],
+                 streak_to: Callable[[], int]) -> int:
+    """Current streak: consecutive yoga days ending today, or ending
+    yesterday while today's session is still pending.
+
+    ``previous`` is yesterday's snapshot; ``streak_to()`` recounts the
+    streak ending yesterday when that snapshot is missing or stale.
+    """
+    yesterday = day - timedelta(days=1)
+    did_yoga_today = bool(by_day.get(day) and by_day[day].yoga_sessions)
+    did_yoga_yesterday = bool(by_day.get(yesterday) and by_day[yesterday].yoga_sessions)
+
+    yesterday_row = by_day.get(yesterday)
+    if previous is not None and (yesterday_row is None or yesterday_row.updated_at <= previous.date):
+        # Yesterday's snapshot equals the streak ending yesterday whenever
+        # yesterday had a session; otherwise that streak is zero.
+        streak_to_yesterday = previous.yoga_streak if did_yoga_yesterday else 0
+    else:
+        streak_to_yesterday = streak_to()
+
+    return streak_to_yesterday + 1 if did_yoga_today else streak_to_yesterday
+
+def _snapshot_values(day: date, days: List[DailyRollup], previous: Optional[Progress],
+                     streak_to: Callable[[], int]) -> Dict:
+    """Snapshot columns from the rollups of ``day`` and the 7 days before it"""
+    by_day = {d.day: d for d in days}
+
+    yoga_days = len([d for d in days if d.yoga_sessions and d.day > day - timedelta(days=7)])
+    quiz_count = sum(d.quiz_count for d in days)
+    avg_stress = sum(d.stress_sum for d in days) / quiz_count if quiz_count else 50
+
+    adherence = [d.avg_adherence for d in days if d.checkin_count]
+    if len(adherence) >= 2:
+        half = len(adherence) // 2
+        adherence_improvement = sum(adherence[half:]) / (len(adherence) - half) - sum(adherence[:half]) / half
+    else:
+        adherence_improvement = 0
+
+    return {
+        "date": datetime.utcnow() if day == datetime.utcnow().date() else _day_start(day),
+        "yoga_streak": _yoga_streak(day, by_day, previous, streak_to),
+        "consistency_percentage": yoga_days / 7 * 100,
+        "protein_total": sum(d.protein_total for d in days),
+        "fiber_total": sum(d.fiber_total for d in days),
+        "calcium_total": sum(d.calcium_total for d in days),
+        "stress_reduction": 100 - avg_stress if avg_stress else 0,
+        "adherence_improvement": adherence_improvement,
+    }
+
+def snapshot_user(db: Session, user_id: int, day: Optional[date] = None, persist: bool = True) -> Progress:
+    """Compute the user's snapshot for ``day`` (default today) and upsert it.
+
+    With ``persist=False`` the snapshot is returned without being stored.
+    """
+    day = day or datetime.utcnow().date()
+    yesterday = day - timedelta(days=1)
+    values = _snapshot_values(
+        day, get_rollups(db, user_id, day - timedelta(days=7), day), _snapshot_row(db, user_id, yesterday),
+        lambda: _streak_from_history(db, user_id, yesterday)
+    )
+    if not persist:
+        return Progress(user_id=user_id, day=day, **values)
+
+    dialect = db.bind.dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        # Several workers may snapshot the same user and day at once
+        db.execute(dialect_insert(Progress).values(user_id=user_id, day=day, **values).on_conflict_do_update(
+            index_elements=["user_id", "day"], set_=values
+        ))
+    else:
+        snapshot = _snapshot_row(db, user_id, day)
+        if snapshot is None:
+            snapshot = Progress(user_id=user_id, day=day)
+            db.add(snapshot)
+        for key, value in values.items():
+            setattr(snapshot, key, value)
+    db.commit()
+
+    return _snapshot_row(db, user_id, day)
+
+def get_snapshot(db: Session, user_id: int, day: Optional[date] = None) -> Progress:
+    """The stored snapshot for ``day`` (default today), or a freshly computed
+    one if it is missing or rollups changed since it was taken"""
+    day = day or datetime.utcnow().date()
+    snapshot = _snapshot_row(db, user_id, day)
+    if snapshot is not None:
+        last_write = db.query(func.max(DailyRollup.updated_at)).filter(
+            DailyRollup.user_id == user_id
+        ).scalar()
+        if last_write is None or last_write <= snapshot.date:
+            return snapshot
+    return snapshot_user(db, user_id, day, persist=False)
+
+def get_snapshots(db: Session, user_ids: List[int], day: date) -> Dict[int, Progress]:
+    """``get_snapshot`` for many users with a fixed number of queries.
+
+    Missing or stale snapshots are computed for the whole group at once
+    and, like in ``get_snapshot``, not stored.
+    """
+    stored = db.query(Progress).filter(Progress.user_id.in_(user_ids), Progress.day == day).all()
+    last_writes = dict(db.query(DailyRollup.user_id, func.max(DailyRollup.updated_at)).filter(
+        DailyRollup.user_id.in_([p.user_id for p in stored])
+    ).group_by(DailyRollup.user_id).all()) if stored else {}
+    snapshots = {
+        p.user_id: p for p in stored
+        if last_writes.get(p.user_id) is None or last_writes[p.user_id] <= p.date
+    }
+    missing = [user_id for user_id in user_ids if user_id not in snapshots]
+    if not missing:
+        return snapshots
+
+    yesterday = day - timedelta(days=1)
+    rows = db.query(DailyRollup).filter(
+        DailyRollup.user_id.in_(missing),
+        DailyRollup.day >= day - timedelta(days=7),
+        DailyRollup.day <= day
+    ).order_by(DailyRollup.user_id, DailyRollup.day).all()
+    rollups = {user_id: list(days) for user_id, days in groupby(rows, key=lambda r: r.user_id)}
+    previous = {p.user_id: p for p in db.query(Progress).filter(
+        Progress.user_id.in_(missing), Progress.day == yesterday
+    )}
+    histories: Optional[Dict[int, List[date]]] = None
+
+    def streak_to(user_id: int) -> int:
+        nonlocal histories
+        if histories is None:
+            # Loaded on first use, for every user that may need it
+            histories = {}
+            for row in db.query(DailyRollup.user_id, DailyRollup.day).filter(
+                DailyRollup.user_id.in_(missing),
+                DailyRollup.day <= yesterday,
+                DailyRollup.yoga_sessions > 0
+            ).order_by(DailyRollup.user_id, DailyRollup.day.desc()):
+                histories.setdefault(row[0], []).append(row[1])
+        return _streak_from_days(histories.get(user_id, []), yesterday)
+
+    for user_id in missing:
+        values = _snapshot_values(day, rollups.get(user_id, []), previous.get(user_id),
+                                  lambda: streak_to(user_id))
+        snapshots[user_id] = Progress(user_id=user_id, day=day, **values)
+    return snapshots
+
+def run_snapshots(db: Session, since: Optional[datetime] = None) -> int:
+    """Snapshot every user whose rollups changed since ``since``.
+
+    On a new day every user with activity in the last week is refreshed,
+    since their streak and weekly window move even without new writes.
+    """
+    today = datetime.utcnow().date()
+    query = db.query(DailyRollup.user_id).distinct()
+    if since is not None and since.date() == today:
+        query = query.filter(DailyRollup.updated_at >= since)
+    else:
+        query = query.filter(DailyRollup.day >= today - timedelta(days=8))
+
+    user_ids: List[int] = [row[0] for row in query]
+    for user_id in user_ids:
+        snapshot_user(db, user_id, today)
+    return len(user_ids)
+
+async def snapshot_loop(interval: int = SNAPSHOT_INTERVAL_SECONDS):
+    """Background task started from the app lifespan"""
+    last_run: Optional[datetime] = None
+    while True:
+        started = datetime.utcnow()
+
+        def work():
+            db = SessionLocal()
+            try:
+                return run_snapshots(db, last_run)
+            finally:
+                db.close()
+
+        try:
+            await asyncio.to_thread(work)
+            last_run = started
+        except Exception as e:
+            print(f"Progress snapshot job failed: {str(e)}")
+        await asyncio.sleep(interval)
@@ -0,0 +1,195 @@
+"""
+Bulk weekly/monthly report generation for every user.
+
+Users are processed in chunks of ids. Each chunk loads the rollups for all
+of its users with a single query and builds their reports; chunks run in
+parallel worker processes and are written to the output as they complete,
+in order, so memory stays bounded by the number of in-flight chunks.
+
+A checkpoint file records the last finished chunk, so an interrupted run
+picks up where it stopped; once a run completes, the next one starts over:
+
+    python report_batch.py weekly --out weekly.ndjson
+    python report_batch.py monthly --out monthly_parquet/ --format parquet --workers 4
+"""
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+from itertools import groupby
+from typing import Dict, Iterator, List, Optional
+
+from sqlalchemy.orm import Session
+
+from database import SessionLocal, User, DailyRollup
+from agents.report_agent import ReportAgent
+from progress_snapshots import get_snapshots
+
+def iter_user_chunks(db: Session, chunk_size: int, after_user_id: int = 0) -> Iterator[List[int]]:
+    """Yield ascending lists of user ids using keyset pagination"""
+    last_id = after_user_id
+    while True:
+        ids = [row[0] for row in db.query(User.id).filter(
+            User.id > last_id
+        ).order_by(User.id).limit(chunk_size)]
+        if not ids:
+            return
+        yield ids
+        last_id = ids[-1]
+
+def build_chunk_reports(db: Session, period: str, user_ids: List[int], as_of: date) -> List[Dict]:
+    """Reports for a chunk of users from one rollup query (and, for weekly
+    reports, a few snapshot queries)"""
+    start = as_of - timedelta(days=ReportAgent.PERIOD_DAYS[period])
+    rows = db.query(DailyRollup).filter(
+        DailyRollup.user_id.in_(user_ids),
+        DailyRollup.day >= start,
+        DailyRollup.day <= as_of
+    ).order_by(DailyRollup.user_id, DailyRollup.day).all()
+
+    by_user = {user_id: list(days) for user_id, days in groupby(rows, key=lambda r: r.user_id)}
+    agent = ReportAgent(db)
+    build = agent.build_weekly_report if period == "weekly" else agent.build_monthly_report
+
+    # Same shape as GET /api/reports/weekly/{user_id}, with the chunk's snapshots read together
+    snapshots = get_snapshots(db, user_ids, as_of) if period == "weekly" else {}
+
+    reports = []
+    for user_id in user_ids:
+        report = build(by_user.get(user_id, []), start, as_of)
+        if period == "weekly":
+            report["progress"] = agent.progress_summary(user_id, as_of, snapshots[user_id])
+        reports.append({"user_id": user_id, "report": report})
+    return reports
+
+def _build_chunk_in_worker(period: str, user_ids: List[int], as_of: date) -> List[Dict]:
+    db = SessionLocal()
+    try:
+        return build_chunk_reports(db, period, user_ids, as_of)
+    finally:
+        db.close()
+
+class _NDJSONSink:
+    def __init__(self, path: str, offset: int):
+        self.file = open(path, "ab")
+        # Drop any partial chunk written after the last checkpoint
+        self.file.truncate(offset)
+        self.file.seek(offset)
+
+    def write(self, reports: List[Dict]) -> int:
+        self.file.write(b"".join(json.dumps(r).encode() + b"\n" for r in reports))
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        return self.file.tell()
+
+    def close(self):
+        self.file.close()
+
+class _ParquetSink:
+    """One compressed part file per chunk, named after its first user id"""
+
+    def __init__(self, path: str, offset: int):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise SystemExit("Parquet output requires pyarrow (pip install pyarrow)")
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.parts = offset
+        if offset == 0:
+            # A fresh run replaces the parts of any earlier one
+            for name in os.listdir(path):
+                if name.startswith("part-") and name.endswith(".parquet"):
+                    os.remove(os.path.join(path, name))
+
+    def write(self, reports: List[Dict]) -> int:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        table = pa.table({
+            "user_id": [r["user_id"] for r in reports],
+            "start_date": [r["report"]["start_date"] for r in reports],
+            "end_date": [r["report"]["end_date"] for r in reports],
+            "report": [json.dumps(r["report"]) for r in reports],
+        })
+        part = os.path.join(self.path, f"part-{reports[0]['user_id']:010d}.parquet")
+        pq.write_table(table, part, compression="zstd")
+        self.parts += 1
+        return self.parts
+
+    def close(self):
+        pass
+
+def _load_checkpoint(path: Optional[str], period: str) -> Dict:
+    if path and os.path.exists(path):
+        with open(path) as f:
+            checkpoint = json.load(f)
+        if checkpoint.get("period") == period and not checkpoint.get("completed"):
+            return checkpoint
+    return {"period": period, "as_of": datetime.utcnow().date().isoformat(),
+            "last_user_id": 0, "offset": 0, "users": 0}
+
+def _save_checkpoint(path: Optional[str], checkpoint: Dict):
+    if not path:
+        return
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp, path)
+
+def run_batch(period: str, out: str, fmt: str = "ndjson", workers: int = 1,
+              chunk_size: int = 500, checkpoint_path: Optional[str] = None) -> Dict:
+    """Generate reports for all users, resuming from the checkpoint if present"""
+    checkpoint = _load_checkpoint(checkpoint_path, period)
+    as_of = date.fromisoformat(checkpoint["as_of"])
+    sink = (_ParquetSink if fmt == "parquet" else _NDJSONSink)(out, checkpoint["offset"])
+
+    db = SessionLocal()
+    try:
+        chunks = iter_user_chunks(db, chunk_size, checkpoint["last_user_id"])
+
+        def finish(reports: List[Dict]):
+            if not reports:
+                return
+            checkpoint["offset"] = sink.write(reports)
+            checkpoint["last_user_id"] = reports[-1]["user_id"]
+            checkpoint["users"] += len(reports)
+            _save_checkpoint(checkpoint_path, checkpoint)
+
+        if workers <= 1:
+            for ids in chunks:
+                finish(build_chunk_reports(db, period, ids, as_of))
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                pending = []
+                for ids in chunks:
+                    pending.append(pool.submit(_build_chunk_in_worker, period, ids, as_of))
+                    # Keep a bounded window of chunks in flight, written in order
+                    if len(pending) >= workers * 2:
+                        finish(pending.pop(0).result())
+                for future in pending:
+                    finish(future.result())
+        checkpoint["completed"] = True
+        _save_checkpoint(checkpoint_path, checkpoint)
+    finally:
+        db.close()
+        sink.close()
+
+    return checkpoint
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate reports for all users")
+    parser.add_argument("period", choices=sorted(ReportAgent.PERIOD_DAYS))
+    parser.add_argument("--out", required=True, help="NDJSON file, or directory for parquet")
+    parser.add_argument("--format", choices=["ndjson", "parquet"], default="ndjson")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--checkpoint", help="Checkpoint file (default: <out>.checkpoint)")
+    args = parser.parse_args()
+
+    result = run_batch(
+        args.period, args.out, args.format, args.workers, args.chunk_size,
+        args.checkpoint or args.out.rstrip("/") + ".checkpoint"
+    )
+    print(f"✅ Wrote {result['users']} {args.period} reports (as of {result['as_of']}) to {args.out}")
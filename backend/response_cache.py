@@ -0,0 +1,119 @@
+"""
+Per-user response cache for report and dashboard endpoints.
+Each user has a data version that is bumped after any commit writing one
+of their check-ins, quizzes or plans. Cached bodies and ETags carry the
+version they were computed at, so a write invalidates them implicitly.
+Versions live in process memory; each worker keeps its own cache.
+"""
+import hashlib
+import json
+import threading
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from database import SessionLocal, CheckIn, QuizResponse, NutritionPlan, YogaPlan
+
+WATCHED_MODELS = (CheckIn, QuizResponse, NutritionPlan, YogaPlan)
+
+class ResponseCache:
+    """LRU of serialized responses keyed by user, endpoint and parameters"""
+
+    def __init__(self, max_entries: int = 4096):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._versions: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        # Distinguishes ETags issued before a restart from current ones
+        self._epoch = uuid.uuid4().hex[:8]
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def version(self, user_id: int) -> int:
+        return self._versions.get(user_id, 0)
+
+    def bump(self, user_id: int):
+        with self._lock:
+            self._versions[user_id] = self._versions.get(user_id, 0) + 1
+
+    def etag(self, key: tuple) -> str:
+        digest = hashlib.sha1(repr(key).encode()).hexdigest()[:12]
+        return f'W/"{self._epoch}-{key[0]}-{self.version(key[0])}-{digest}"'
+
+    def get(self, key: tuple, version: int) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: tuple, version: int, body: bytes):
+        with self._lock:
+            self._entries[key] = (version, body)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "not_modified": self.not_modified,
+        }
+
+response_cache = ResponseCache()
+
+def _cache_key(request: Request, user_id: int) -> tuple:
+    # Reports and dashboards cover windows ending today, so the key (and the
+    # ETag derived from it) changes at midnight UTC even without new writes
+    return (user_id, request.url.path, tuple(sorted(request.query_params.multi_items())),
+            datetime.utcnow().date().isoformat())
+
+def cached_response(request: Request, user_id: int, compute: Callable[[], Any]) -> Response:
+    """Serve ``compute()`` from the cache, or a 304 if the client's ETag is current.
+
+    Routes must resolve 404s before calling this; a matching ETag is
+    answered without running ``compute``.
+    """
+    key = _cache_key(request, user_id)
+    version = response_cache.version(user_id)
+    etag = response_cache.etag(key)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+    if etag in request.headers.get("if-none-match", ""):
+        response_cache.not_modified += 1
+        return Response(status_code=304, headers=headers)
+
+    body = response_cache.get(key, version)
+    if body is None:
+        body = json.dumps(jsonable_encoder(compute())).encode()
+        response_cache.put(key, version, body)
+
+    return Response(content=body, media_type="application/json", headers=headers)
+
+@event.listens_for(SessionLocal, "after_flush")
+def _collect_written_users(session: Session, flush_context):
+    touched = session.info.setdefault("cache_touched_users", set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, WATCHED_MODELS) and obj.user_id is not None:
+            touched.add(obj.user_id)
+
+@event.listens_for(SessionLocal, "after_commit")
+def _bump_written_users(session: Session):
+    for user_id in session.info.pop("cache_touched_users", ()):
+        response_cache.bump(user_id)
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _discard_written_users(session: Session):
+    session.info.pop("cache_touched_users", None)
@@ -0,0 +1,162 @@
+"""
+Per-user daily rollups.
+Every check-in, quiz and plan write bumps the user's row for that day, so
+reports and trends read one small row per day instead of every raw event.
+"""
+from sqlalchemy.orm import Session
+from sqlalchemy import func
+from database import DailyRollup, CheckIn, QuizResponse, NutritionPlan, YogaPlan
+from datetime import date, datetime
+from typing import Dict, List, Optional
+
+COUNTERS = [
+    "checkin_count", "adherence_sum", "sleep_sum", "mood_sum", "energy_sum",
+    "quiz_count", "stress_sum", "motivation_sum", "meals", "yoga_sessions",
+    "calories_total", "protein_total", "fiber_total", "calcium_total",
+]
+
+def _as_date(value) -> date:
+    """Normalize DATE() results, which SQLite returns as strings"""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, str):
+        return date.fromisoformat(value[:10])
+    return value
+
+def _bump(db: Session, user_id: int, when: datetime, **deltas):
+    """Add deltas to the user's rollup row for the day of ``when``"""
+    day = (when or datetime.utcnow()).date()
+    now = datetime.utcnow()
+    dialect = db.bind.dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        # One statement, so two first writes of the day can't both insert
+        stmt = dialect_insert(DailyRollup).values(
+            user_id=user_id, day=day, updated_at=now, **{**{key: 0 for key in COUNTERS}, **deltas}
+        )
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=["user_id", "day"],
+            set_={"updated_at": now, **{key: getattr(DailyRollup, key) + value for key, value in deltas.items()}},
+        ))
+        return
+
+    row = db.query(DailyRollup).filter(
+        DailyRollup.user_id == user_id,
+        DailyRollup.day == day
+    ).first()
+
+    if row is None:
+        row = DailyRollup(user_id=user_id, day=day, **{key: 0 for key in COUNTERS})
+        for key, value in deltas.items():
+            setattr(row, key, value)
+        db.add(row)
+    else:
+        # Increment in SQL so concurrent writers don't lose updates
+        for key, value in deltas.items():
+            setattr(row, key, getattr(DailyRollup, key) + value)
+        row.updated_at = now
+    db.flush()
+
+def apply_checkin(db: Session, checkin: CheckIn):
+    _bump(db, checkin.user_id, checkin.date,
+          checkin_count=1,
+          adherence_sum=checkin.adherence or 0,
+          sleep_sum=checkin.sleep_hours or 0,
+          mood_sum=checkin.mood_score or 0,
+          energy_sum=checkin.energy or 0)
+
+def apply_quiz(db: Session, quiz: QuizResponse):
+    _bump(db, quiz.user_id, quiz.date,
+          quiz_count=1,
+          stress_sum=quiz.stress_score or 0,
+          motivation_sum=quiz.motivation_score or 0)
+
+def apply_nutrition_plan(db: Session, plan: NutritionPlan):
+    nutrients = plan.nutrients or {}
+    _bump(db, plan.user_id, plan.date,
+          meals=1,
+          calories_total=nutrients.get("calories", 0) or 0,
+          protein_total=nutrients.get("protein", 0) or 0,
+          fiber_total=nutrients.get("fiber", 0) or 0,
+          calcium_total=nutrients.get("calcium", 0) or 0)
+
+def apply_yoga_plan(db: Session, plan: YogaPlan):
+    _bump(db, plan.user_id, plan.date, yoga_sessions=1)
+
+def get_rollups(db: Session, user_id: int, start: date, end: Optional[date] = None) -> List[DailyRollup]:
+    """Rollup rows for a user between start and end (inclusive), oldest first"""
+    query = db.query(DailyRollup).filter(
+        DailyRollup.user_id == user_id,
+        DailyRollup.day >= start
+    )
+    if end is not None:
+        query = query.filter(DailyRollup.day <= end)
+    return query.order_by(DailyRollup.day).all()
+
+def backfill_rollups(db: Session, user_id: Optional[int] = None, chunk_size: int = 5000) -> int:
+    """Rebuild rollups from raw rows with one GROUP BY per source table.
+
+    Days before the archive watermark have no raw rows left in the
+    database, so their rollups are kept as they are.
+    """
+    from archive import get_watermark
+    watermark = get_watermark()
+    sources = [
+        (CheckIn, [
+            ("checkin_count", func.count(CheckIn.id)),
+            ("adherence_sum", func.sum(CheckIn.adherence)),
+            ("sleep_sum", func.sum(CheckIn.sleep_hours)),
+            ("mood_sum", func.sum(CheckIn.mood_score)),
+            ("energy_sum", func.sum(CheckIn.energy)),
+        ]),
+        (QuizResponse, [
+            ("quiz_count", func.count(QuizResponse.id)),
+            ("stress_sum", func.sum(QuizResponse.stress_score)),
+            ("motivation_sum", func.sum(QuizResponse.motivation_score)),
+        ]),
+        (NutritionPlan, [
+            ("meals", func.count(NutritionPlan.id)),
+            ("calories_total", func.sum(NutritionPlan.nutrients["calories"].as_float())),
+            ("protein_total", func.sum(NutritionPlan.nutrients["protein"].as_float())),
+            ("fiber_total", func.sum(NutritionPlan.nutrients["fiber"].as_float())),
+            ("calcium_total", func.sum(NutritionPlan.nutrients["calcium"].as_float())),
+        ]),
+        (YogaPlan, [
+            ("yoga_sessions", func.count(YogaPlan.id)),
+        ]),
+    ]
+
+    merged: Dict[tuple, Dict] = {}
+    for model, columns in sources:
+        day = func.date(model.date)
+        query = db.query(model.user_id, day, *[expr for _, expr in columns])
+        if user_id is not None:
+            query = query.filter(model.user_id == user_id)
+        if watermark is not None:
+            query = query.filter(model.date >= watermark)
+        for row in query.group_by(model.user_id, day):
+            key = (row[0], _as_date(row[1]))
+            values = merged.setdefault(key, {name: 0 for name in COUNTERS})
+            for (name, _), value in zip(columns, row[2:]):
+                values[name] = value or 0
+
+    delete = db.query(DailyRollup)
+    if user_id is not None:
+        delete = delete.filter(DailyRollup.user_id == user_id)
+    if watermark is not None:
+        delete = delete.filter(DailyRollup.day >= watermark.date())
+    delete.delete(synchronize_session=False)
+
+    now = datetime.utcnow()
+    mappings = [
+        {"user_id": uid, "day": day, "updated_at": now, **values}
+        for (uid, day), values in merged.items()
+    ]
+    for i in range(0, len(mappings), chunk_size):
+        db.bulk_insert_mappings(DailyRollup, mappings[i:i + chunk_size])
+    db.commit()
+
+    return len(mappings)
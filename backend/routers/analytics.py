@@ -0,0 +1,30 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+from database import get_db
+from cohort_analytics import adherence_distribution, rule_frequencies, stress_by_experience
+
+router = APIRouter()
+
+@router.get("/cohorts")
+def get_cohort_overview(days: int = Query(30, ge=1, le=365), db: Session = Depends(get_db)):
+    """All cohort analytics for the window"""
+    return {
+        "adherence": adherence_distribution(db, days),
+        "rules": rule_frequencies(db, days),
+        "stress_by_experience": stress_by_experience(db, days),
+    }
+
+@router.get("/adherence")
+def get_adherence_distribution(days: int = Query(30, ge=1, le=365), db: Session = Depends(get_db)):
+    """Distribution of per-user average adherence"""
+    return adherence_distribution(db, days)
+
+@router.get("/rules")
+def get_rule_frequencies(days: int = Query(30, ge=1, le=365), db: Session = Depends(get_db)):
+    """Wellness rule trigger frequencies from decision traces"""
+    return rule_frequencies(db, days)
+
+@router.get("/stress")
+def get_stress_by_experience(days: int = Query(90, ge=7, le=365), db: Session = Depends(get_db)):
+    """Weekly stress trend by yoga experience"""
+    return stress_by_experience(db, days)
@@ -1,11 +1,24 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Header
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel, EmailStr
-from database import get_db, User
+from database import get_db, get_async_db, User
 from typing import Optional
+import os
+import secrets
+
+# Endpoints that expose every user's data are only served to callers holding this token
+ADMIN_API_TOKEN = os.getenv("ADMIN_API_TOKEN")
 
 router = APIRouter()
 
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Dependency for admin-only endpoints; they are disabled while ADMIN_API_TOKEN is unset"""
+    if not ADMIN_API_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled; set ADMIN_API_TOKEN")
+    if not x_admin_token or not secrets.compare_digest(x_admin_token, ADMIN_API_TOKEN):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
 class UserCreate(BaseModel):
     email: EmailStr
     name: str
@@ -28,7 +41,7 @@ class UserResponse(BaseModel):
         from_attributes = True
 
 @router.post("/register", response_model=UserResponse)
-async def register(user_data: UserCreate, db: Session = Depends(get_db)):
+def register(user_data: UserCreate, db: Session = Depends(get_db)):
     """Register a new user"""
     # Check if user exists
     existing = db.query(User).filter(User.email == user_data.email).first()
@@ -43,9 +56,9 @@ async def register(user_data: UserCreate, db: Session = Depends(get_db)):
     return user
 
 @router.get("/user/{user_id}", response_model=UserResponse)
-async def get_user(user_id: int, db: Session = Depends(get_db)):
+async def get_user(user_id: int, db: AsyncSession = Depends(get_async_db)):
     """Get user by ID"""
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.get(User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     return user
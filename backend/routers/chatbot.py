@@ -1,10 +1,19 @@
+import asyncio
+import json
 import os
-from fastapi import APIRouter, HTTPException, Depends
+import re
+from fastapi import APIRouter, HTTPException, Depends, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
-from database import get_db, User
-from typing import List, Optional
+from database import get_db, get_async_db, User
+from typing import List, Optional, Tuple
 import openai
+from agents.tool_scheduler import SchedulerTimeout, tool_scheduler
+from chat_context import build_context, user_facts, usage_totals
+from chat_cache import semantic_cache, cacheable_question
+from chat_intents import intent_matcher
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -23,23 +32,16 @@ class ChatResponse(BaseModel):
     message: str
     role: str = "assistant"
 
-@router.post("/chat")
-async def chat(request: ChatRequest, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.id == request.user_id).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    openai_api_key = os.getenv("OPENAI_API_KEY")
-    if not openai_api_key:
-        return {
-            "message": "I'm a wellness coach focused on Sattvic nutrition and yoga. How can I help you today?",
-            "role": "assistant"
-        }
-    
-    try:
-        client = openai.OpenAI(api_key=openai_api_key)
-        
-        system_prompt = f"""You are a Yoga-Driven Wellness & Nutrition Coach. You help users with:
+NO_API_KEY_REPLY = "I'm a wellness coach focused on Sattvic nutrition and yoga. How can I help you today?"
+MODEL_ERROR_REPLY = "I'm here to help with your wellness journey! However, I'm experiencing some technical difficulties with the AI service. You can still use the other features like check-ins, nutrition planning, and yoga recommendations. Please try again later or contact support if the issue persists."
+CHAT_MODELS = ("gpt-4o-mini", "gpt-3.5-turbo")
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+# Answer greetings and thanks locally instead of calling the model
+INTENT_PREFILTER = os.getenv("CHAT_INTENT_PREFILTER", "1") == "1"
+
+def _build_messages(request: ChatRequest, user, facts: str = "") -> Tuple[List[dict], dict]:
+    """The token-budgeted prompt for this turn, and its token accounting"""
+    system_prompt = f"""You are a Yoga-Driven Wellness & Nutrition Coach. You help users with:
 - Sattvic nutrition (yoga-aligned, light, fresh, plant-based)
 - Yoga practice recommendations
 - Mental wellness support (non-clinical)
@@ -59,22 +61,79 @@ Remember:
 - Suggest specific yoga practices when relevant
 - Recommend nutrient-rich, plant-based meals
 """
-        
-        messages = [{"role": "system", "content": system_prompt}]
-        for msg in request.messages:
-            messages.append({"role": msg.role, "content": msg.content})
+    history = [{"role": msg.role, "content": msg.content} for msg in request.messages]
+    return build_context(user, system_prompt, history, facts)
+
+def _record_usage(usage: dict, reported) -> dict:
+    if reported is not None:
+        usage["prompt_tokens"] = reported.prompt_tokens
+        usage["completion_tokens"] = reported.completion_tokens
+    usage_totals.record(usage)
+    return usage
+
+def _error_reply(e: Exception, request: ChatRequest, user) -> str:
+    """The reply to send when the OpenAI call fails"""
+    error_msg = str(e).lower()
+    print(f"Chatbot error: {e}")
+
+    user_query = request.messages[-1].content if request.messages else ""
+    if "quota" in error_msg or "429" in error_msg or "billing" in error_msg:
+        return intent_matcher.fallback_reply(user_query, user)
+
+    if "model" in error_msg or "404" in error_msg or "not found" in error_msg:
+        return MODEL_ERROR_REPLY
+
+    return intent_matcher.fallback_reply(user_query, user)
+
+def _direct_reply(request: ChatRequest, user) -> Optional[Tuple[str, str]]:
+    if not INTENT_PREFILTER or not request.messages or request.messages[-1].role != "user":
+        return None
+    return intent_matcher.direct_reply(request.messages[-1].content, user)
+
+@router.post("/chat")
+def chat(request: ChatRequest, db: Session = Depends(get_db)):
+    user = db.query(User).filter(User.id == request.user_id).first()
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    openai_api_key = os.getenv("OPENAI_API_KEY")
+    if not openai_api_key:
+        return {
+            "message": NO_API_KEY_REPLY,
+            "role": "assistant"
+        }
+    
+    direct = _direct_reply(request, user)
+    if direct is not None:
+        return {"message": direct[1], "role": "assistant", "intent": direct[0]}
+
+    facts = user_facts(db, user)
+    question = cacheable_question(request.messages)
+    if question is not None:
+        cached = semantic_cache.lookup(question, user, facts)
+        if cached is not None:
+            return {"message": cached, "role": "assistant", "cached": True}
+
+    try:
+        client = openai.OpenAI(api_key=openai_api_key)
+        messages, usage = _build_messages(request, user, facts)
         
         try:
-            response = client.chat.completions.create(
-                model="gpt-4o-mini",
+            response = tool_scheduler.call(
+                "openai", user.id, client.chat.completions.create,
+                model=CHAT_MODELS[0],
                 messages=messages,
                 temperature=0.7,
                 max_tokens=500
             )
+        except SchedulerTimeout:
+            # The provider is saturated; queueing again for the fallback model only doubles the wait
+            raise
         except Exception as e:
             try:
-                response = client.chat.completions.create(
-                    model="gpt-3.5-turbo",
+                response = tool_scheduler.call(
+                    "openai", user.id, client.chat.completions.create,
+                    model=CHAT_MODELS[1],
                     messages=messages,
                     temperature=0.7,
                     max_tokens=500
@@ -82,62 +141,112 @@ Remember:
             except Exception as e2:
                 raise e2
         
+        reply = response.choices[0].message.content
+        if question is not None:
+            semantic_cache.store(question, user, reply, facts)
         return {
-            "message": response.choices[0].message.content,
-            "role": "assistant"
+            "message": reply,
+            "role": "assistant",
+            "usage": _record_usage(usage, response.usage)
         }
     except Exception as e:
-        error_msg = str(e).lower()
-        error_str = str(e)
-        
-        print(f"Chatbot error: {error_str}")
-        
-        if "quota" in error_msg or "429" in error_msg or "billing" in error_msg:
-            user_query = request.messages[-1].content.lower() if request.messages else ""
-            fallback_response = _get_fallback_response(user_query, user)
-            return {
-                "message": fallback_response,
-                "role": "assistant"
-            }
-        
-        if "model" in error_msg or "404" in error_msg or "not found" in error_msg:
-            return {
-                "message": "I'm here to help with your wellness journey! However, I'm experiencing some technical difficulties with the AI service. You can still use the other features like check-ins, nutrition planning, and yoga recommendations. Please try again later or contact support if the issue persists.",
-                "role": "assistant"
-            }
-        
-        user_query = request.messages[-1].content.lower() if request.messages else ""
-        fallback_response = _get_fallback_response(user_query, user)
         return {
-            "message": fallback_response,
+            "message": _error_reply(e, request, user),
             "role": "assistant"
         }
 
-def _get_fallback_response(user_query: str, user) -> str:
-    query_lower = user_query.lower()
-    
-    if any(word in query_lower for word in ["yoga", "pose", "practice", "stretch", "meditation"]):
-        if "beginner" in query_lower or "start" in query_lower:
-            return f"Great question! For beginners, I recommend starting with gentle yoga poses like Child's Pose (Balasana), Mountain Pose (Tadasana), and Cat-Cow stretches. Since you're at the {user.yoga_experience} level, you might enjoy a 15-20 minute morning routine focusing on flexibility and breathing. Would you like me to suggest a specific yoga plan for today?"
-        elif "stress" in query_lower or "relax" in query_lower:
-            return "For stress relief, I recommend restorative yoga poses like Legs Up the Wall, Child's Pose, and Corpse Pose (Savasana). Combine this with deep breathing exercises - try alternate nostril breathing (Nadi Shodhana) for 5 minutes. A gentle 20-30 minute evening practice can work wonders for relaxation."
-        else:
-            return f"Yoga is wonderful for overall wellness! Based on your {user.yoga_experience} experience level, I'd suggest focusing on poses that align with your goals. For flexibility, try forward folds and twists. For strength, incorporate Warrior poses and Plank. Would you like specific recommendations?"
-    
-    if any(word in query_lower for word in ["food", "meal", "nutrition", "eat", "diet", "recipe", "ingredient"]):
-        if "sattvic" in query_lower or "yoga" in query_lower:
-            return "Sattvic nutrition focuses on fresh, light, plant-based foods that promote clarity and energy. Great options include: fresh fruits, vegetables, whole grains (brown rice, oats), legumes (lentils, mung beans), nuts, seeds, and dairy products like ghee and fresh milk. Avoid processed foods, onions, garlic, and overly spicy foods. Would you like a specific meal plan?"
-        elif "breakfast" in query_lower:
-            return "A Sattvic breakfast could include: oatmeal with fresh fruits and honey, fresh fruit salad, or a smoothie with banana, dates, and nuts. These provide sustained energy without heaviness."
-        elif "lunch" in query_lower:
-            return "For lunch, consider: brown rice with dal (lentils), steamed vegetables, fresh salad, and roti (whole wheat flatbread). This combination provides protein, fiber, and essential nutrients."
-        elif "dinner" in query_lower:
-            return "A light Sattvic dinner might include: vegetable soup, steamed vegetables, or a simple khichdi (rice and lentils). Keep dinner light and early (ideally 2-3 hours before sleep) for better digestion."
+def _sse(data: dict, event: Optional[str] = None) -> str:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+async def _stream_text(text: str):
+    """Stream a canned reply word by word, like a model would"""
+    for piece in re.findall(r"\S+\s*", text):
+        yield _sse({"delta": piece})
+        await asyncio.sleep(0)
+
+async def _stream_canned(text: str, **done_fields):
+    async for event in _stream_text(text):
+        yield event
+    yield _sse({"message": text, "role": "assistant", **done_fields}, event="done")
+
+async def _open_stream(client: "openai.AsyncOpenAI", messages: List[dict]):
+    try:
+        return await client.chat.completions.create(
+            model=CHAT_MODELS[0], messages=messages, temperature=0.7, max_tokens=500,
+            stream=True, stream_options={"include_usage": True}
+        )
+    except Exception:
+        return await client.chat.completions.create(
+            model=CHAT_MODELS[1], messages=messages, temperature=0.7, max_tokens=500,
+            stream=True, stream_options={"include_usage": True}
+        )
+
+async def _stream_reply(request: ChatRequest, user, facts: str, question: Optional[str],
+                        http_request: Request):
+    """SSE events for one reply: ``delta`` chunks, then ``done`` with the full message.
+
+    Model tokens are relayed as they arrive. If the client goes away the
+    upstream stream is closed, which stops the generation.
+    """
+    parts: List[str] = []
+    usage = None
+    try:
+        client = openai.AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        # Token counting may wait for the tokenizer to load and encodes the whole history
+        messages, usage = await asyncio.to_thread(_build_messages, request, user, facts)
+        async with tool_scheduler.slot("openai", user.id):
+            stream = await _open_stream(client, messages)
+            try:
+                async for chunk in stream:
+                    if await http_request.is_disconnected():
+                        return
+                    if chunk.usage is not None:
+                        _record_usage(usage, chunk.usage)
+                    delta = chunk.choices[0].delta.content if chunk.choices else None
+                    if delta:
+                        parts.append(delta)
+                        yield _sse({"delta": delta})
+            finally:
+                await stream.close()
+        if question is not None:
+            semantic_cache.store(question, user, "".join(parts), facts)
+    except Exception as e:
+        if parts:
+            # Part of the answer is already on screen; don't append a different one
+            print(f"Chatbot stream error: {e}")
+            yield _sse({"error": "The reply was interrupted. Please try again."}, event="error")
         else:
-            return f"Based on your dietary preferences ({user.dietary_preferences}), I can help you plan nutritious, Sattvic meals. Focus on fresh, whole foods that align with your goals: {user.goals}. Would you like specific recipe suggestions?"
-    
-    if any(word in query_lower for word in ["wellness", "health", "feel", "energy", "tired", "sleep"]):
-        return "Wellness is a holistic journey! Combine daily yoga practice (even 15-20 minutes), Sattvic nutrition, adequate sleep (7-8 hours), and mindfulness. Start with small, consistent habits - perhaps a morning yoga routine and mindful eating. How can I help you create a personalized wellness plan?"
-    
-    return f"Namaste {user.name}! I'm here to help with your wellness journey. I can assist with:\n\n• Yoga practice recommendations based on your {user.yoga_experience} level\n• Sattvic nutrition and meal planning\n• Wellness tips and guidance\n• Stress management through yoga and nutrition\n\nWhat would you like to explore today? Feel free to ask about specific yoga poses, meal ideas, or wellness practices!"
+            reply = _error_reply(e, request, user)
+            async for event in _stream_text(reply):
+                yield event
+            parts.append(reply)
+            usage = None
+
+    done = {"message": "".join(parts), "role": "assistant"}
+    if usage is not None:
+        done["usage"] = usage
+    yield _sse(done, event="done")
+
+@router.post("/chat/stream")
+async def chat_stream(request: ChatRequest, http_request: Request, db: AsyncSession = Depends(get_async_db)):
+    """Like ``/chat``, but the reply is streamed as Server-Sent Events"""
+    user = await db.get(User, request.user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    def respond(events):
+        return StreamingResponse(events, media_type="text/event-stream", headers=SSE_HEADERS)
 
+    if not os.getenv("OPENAI_API_KEY"):
+        return respond(_stream_canned(NO_API_KEY_REPLY))
+    direct = _direct_reply(request, user)
+    if direct is not None:
+        return respond(_stream_canned(direct[1], intent=direct[0]))
+    facts = await db.run_sync(user_facts, user)
+    question = cacheable_question(request.messages)
+    if question is not None:
+        cached = semantic_cache.lookup(question, user, facts)
+        if cached is not None:
+            return respond(_stream_canned(cached, cached=True))
+    return respond(_stream_reply(request, user, facts, question, http_request))
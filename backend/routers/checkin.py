@@ -1,14 +1,15 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Response
+from fastapi.encoders import jsonable_encoder
 from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
-from database import get_db, CheckIn, User
+from database import get_db, get_async_db, CheckIn, User
 from datetime import datetime
-from typing import Optional
-from agents.observe_agent import ObserveAgent
-from agents.reasoner_agent import ReasonerAgent
-from agents.nutrition_agent import NutritionAgent
-from agents.yoga_agent import YogaAgent
-from agents.fairness_agent import FairnessAgent
+from typing import Dict, List, Optional, Tuple
+from agents.orchestrator import checkin_pipeline, checkin_plans
+from rollups import apply_checkin
+from job_queue import job_queue
 
 router = APIRouter()
 
@@ -23,8 +24,12 @@ class CheckInData(BaseModel):
     notes: Optional[str] = ""
 
 @router.post("/{user_id}")
-async def submit_checkin(user_id: int, checkin_data: CheckInData, db: Session = Depends(get_db)):
-    """Submit daily check-in and trigger agentic planning"""
+def submit_checkin(user_id: int, checkin_data: CheckInData, response: Response, async_mode: bool = False,
+                   db: Session = Depends(get_db)):
+    """Submit daily check-in and trigger agentic planning.
+
+    With ``async_mode`` the plans are generated in the background and a job id is returned.
+    """
     # Verify user exists
     user = db.query(User).filter(User.id == user_id).first()
     if not user:
@@ -37,109 +42,92 @@ async def submit_checkin(user_id: int, checkin_data: CheckInData, db: Session =
         **checkin_data.dict()
     )
     db.add(checkin)
+    apply_checkin(db, checkin)
     db.commit()
     
     # Trigger agentic system
-    reasoner = ReasonerAgent(db)
-    reasoning_result = reasoner.reason(user_id)
-    
-    # Generate plans based on reasoning
-    nutrition_agent = NutritionAgent(db)
-    yoga_agent = YogaAgent(db)
-    fairness_agent = FairnessAgent(db)
-    
-    plans = {
-        "nutrition": [],
-        "yoga": None
+    context = {
+        "user_id": user_id,
+        "yoga_experience": user.yoga_experience,
+        "ingredients": checkin_data.ingredients,
     }
-    
-    # Generate nutrition plans if ingredients provided
-    if checkin_data.ingredients:
-        ingredients_list = [ing.strip() for ing in checkin_data.ingredients.split(",") if ing.strip()]
-        if ingredients_list:
-            # Check API quota
-            quota_check = fairness_agent.check_api_quota("usda", user_id)
-            if quota_check["allowed"]:
-                # Generate complete daily meal plan: breakfast, lunch, dinner, and snacks
-                meal_types = ["breakfast", "lunch", "dinner", "snack"]
-                
-                # Distribute ingredients intelligently across meals
-                total_ingredients = len(ingredients_list)
-                ingredients_per_meal = max(3, total_ingredients // len(meal_types))
-                
-                for idx, meal_type in enumerate(meal_types):
-                    try:
-                        # Distribute ingredients across meals
-                        start_idx = idx * ingredients_per_meal
-                        end_idx = start_idx + ingredients_per_meal if idx < len(meal_types) - 1 else total_ingredients
-                        meal_ingredients = ingredients_list[start_idx:end_idx]
-                        
-                        # Ensure each meal has at least some ingredients
-                        if not meal_ingredients and ingredients_list:
-                            # For snacks, use remaining ingredients or a subset
-                            if meal_type == "snack":
-                                meal_ingredients = ingredients_list[-3:] if len(ingredients_list) >= 3 else ingredients_list
-                            else:
-                                meal_ingredients = ingredients_list[:3] if len(ingredients_list) >= 3 else ingredients_list
-                        
-                        if meal_ingredients:
-                            plan = nutrition_agent.create_nutrition_plan(
-                                user_id=user_id,
-                                meal_type=meal_type,
-                                ingredients=meal_ingredients,
-                                recommendations=reasoning_result["recommendations"]
-                            )
-                            plans["nutrition"].append({
-                                "id": plan.id,
-                                "meal_type": plan.meal_type,
-                                "recipe_name": plan.recipe_name,
-                                "nutrients": plan.nutrients,
-                                "instructions": plan.recipe_instructions,
-                                "ingredients": plan.ingredients,
-                                "sattvic_score": plan.sattvic_score,
-                                "simplicity_index": plan.meal_simplicity_index
-                            })
-                            fairness_agent.record_api_call("usda", user_id)
-                    except Exception as e:
-                        print(f"Error creating {meal_type} plan: {str(e)}")
-                        continue
-    
-    # Generate yoga plan
-    quota_check = fairness_agent.check_api_quota("youtube", user_id)
-    if quota_check["allowed"]:
-        try:
-            yoga_plan = yoga_agent.generate_yoga_plan(
-                user_id=user_id,
-                session_type=reasoning_result["recommendations"]["yoga"]["session_type"],
-                duration_minutes=reasoning_result["recommendations"]["yoga"]["duration_minutes"],
-                energy_trend=reasoning_result["energy_trend"],
-                stress_level=reasoning_result.get("rules_triggered", [{}])[0].get("condition", "50") if reasoning_result.get("rules_triggered") else 50,
-                yoga_experience=user.yoga_experience
-            )
-            plans["yoga"] = {
-                "id": yoga_plan.id,
-                "session_type": yoga_plan.session_type,
-                "duration_minutes": yoga_plan.duration_minutes,
-                "youtube_url": yoga_plan.youtube_url,
-                "youtube_title": yoga_plan.youtube_title,
-                "description": yoga_plan.description
-            }
-            fairness_agent.record_api_call("youtube", user_id)
-        except Exception as e:
-            pass
-    
+
+    if async_mode:
+        # Only reason now; plans are generated by a background worker (poll /api/jobs/{job_id})
+        values, _ = checkin_pipeline.run(context, targets=["reasoning"], trace_user_id=user_id)
+        reasoning_result = values["reasoning"]
+        job = job_queue.enqueue(db, "checkin_plans", user_id, {
+            "checkin_id": checkin.id,
+            "ingredients": checkin_data.ingredients,
+            "reasoning": jsonable_encoder(reasoning_result),
+        })
+        response.status_code = 202
+        return {
+            "checkin_id": checkin.id,
+            "reasoning": reasoning_result,
+            "job_id": job.id,
+            "status": job.status,
+            "status_url": f"/api/jobs/{job.id}",
+        }
+
+    # Observe -> Reason -> meal and yoga plans, the plans concurrently
+    values, _ = checkin_pipeline.run(context, trace_user_id=user_id)
     return {
         "checkin_id": checkin.id,
-        "reasoning": reasoning_result,
-        "plans": plans
+        "reasoning": values["reasoning"],
+        "plans": checkin_plans(values)
     }
 
+class PlansIncomplete(Exception):
+    """Raised by a plan job when some plans fell back, so the job queue retries it"""
+
+def generate_plans(user: User, ingredients: Optional[str], reasoning_result: Dict,
+                   completed: Optional[Dict] = None) -> Tuple[Dict, Dict, List[str]]:
+    """Meal plans from the check-in's ingredients and a yoga plan, per the reasoning.
+
+    ``completed`` holds node outputs from an earlier attempt, which are not
+    produced again. Returns the plans, the outputs produced so far and the
+    nodes that fell back.
+    """
+    values, summary = checkin_pipeline.run({
+        "user_id": user.id,
+        "yoga_experience": user.yoga_experience,
+        "ingredients": ingredients,
+        "reasoning": reasoning_result,
+        **(completed or {}),
+    }, trace_user_id=user.id)
+    outputs = {node.name: node.output for node in checkin_pipeline.nodes}
+    completed = dict(completed or {})
+    failed = []
+    for timing in summary["nodes"]:
+        if timing["status"] == "ok":
+            completed[outputs[timing["node"]]] = jsonable_encoder(values[outputs[timing["node"]]])
+        else:
+            failed.append(timing["node"])
+    return checkin_plans(values), completed, failed
+
+def _run_plan_job(db: Session, job) -> Dict:
+    user = db.query(User).filter(User.id == job.user_id).first()
+    if not user:
+        raise ValueError(f"User {job.user_id} no longer exists")
+    payload = job.payload
+    plans, completed, failed = generate_plans(user, payload["ingredients"], payload["reasoning"],
+                                              payload.get("completed"))
+    if failed:
+        # Keep the plans that were made, so a retry only redoes the rest
+        job.payload = {**payload, "completed": completed}
+        db.commit()
+        raise PlansIncomplete(f"fell back to defaults for {', '.join(failed)}")
+    return {"checkin_id": payload["checkin_id"], "plans": plans}
+
+job_queue.register("checkin_plans", _run_plan_job)
+
 @router.get("/{user_id}/recent")
-async def get_recent_checkins(user_id: int, limit: int = 7, db: Session = Depends(get_db)):
+async def get_recent_checkins(user_id: int, limit: int = 7, db: AsyncSession = Depends(get_async_db)):
     """Get recent check-ins"""
-    checkins = db.query(CheckIn).filter(
+    checkins = (await db.scalars(select(CheckIn).where(
         CheckIn.user_id == user_id
-    ).order_by(CheckIn.date.desc()).limit(limit).all()
+    ).order_by(CheckIn.date.desc()).limit(limit))).all()
     
     return checkins
 
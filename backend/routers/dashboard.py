@@ -1,75 +1,52 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Request, Query
 from sqlalchemy.orm import Session
-from database import get_db, CheckIn, QuizResponse, NutritionPlan, YogaPlan, Progress
+from database import get_db, NutritionPlan, YogaPlan, DailyRollup
 from datetime import datetime, timedelta
+from typing import Dict, Optional
 from sqlalchemy import func
+from rollups import get_rollups
+from response_cache import cached_response
+from timeseries import downsample
+from progress_snapshots import get_snapshot
 
 router = APIRouter()
 
 @router.get("/{user_id}/overview")
-async def get_dashboard_overview(user_id: int, db: Session = Depends(get_db)):
+def get_dashboard_overview(user_id: int, request: Request, db: Session = Depends(get_db)):
     """Get dashboard overview data"""
+    return cached_response(request, user_id, lambda: _dashboard_overview(user_id, db))
+
+def _dashboard_overview(user_id: int, db: Session) -> Dict:
     today = datetime.utcnow().date()
     week_start = today - timedelta(days=7)
     
-    # Yoga streak
-    recent_yoga = db.query(YogaPlan).filter(
-        YogaPlan.user_id == user_id,
-        YogaPlan.date >= week_start
-    ).all()
-    
-    yoga_streak = len(recent_yoga)
-    yoga_consistency = (yoga_streak / 7) * 100
-    
-    # Recent check-ins
-    recent_checkins = db.query(CheckIn).filter(
-        CheckIn.user_id == user_id,
-        CheckIn.date >= week_start
-    ).all()
-    
-    avg_adherence = sum(c.adherence for c in recent_checkins) / len(recent_checkins) if recent_checkins else 0
-    
-    # Nutrition totals
-    recent_nutrition = db.query(NutritionPlan).filter(
-        NutritionPlan.user_id == user_id,
-        NutritionPlan.date >= week_start
-    ).all()
-    
-    total_protein = sum(n.nutrients.get("protein", 0) for n in recent_nutrition if n.nutrients)
-    total_fiber = sum(n.nutrients.get("fiber", 0) for n in recent_nutrition if n.nutrients)
-    total_calcium = sum(n.nutrients.get("calcium", 0) for n in recent_nutrition if n.nutrients)
-    
-    # Stress trend
-    recent_quizzes = db.query(QuizResponse).filter(
-        QuizResponse.user_id == user_id,
-        QuizResponse.date >= week_start
-    ).all()
+    # Streak, consistency, nutrient totals and wellness deltas come from
+    # the precomputed daily progress snapshot
+    snapshot = get_snapshot(db, user_id)
     
-    avg_stress = sum(q.stress_score for q in recent_quizzes) / len(recent_quizzes) if recent_quizzes else 50
-    stress_reduction = 100 - avg_stress if avg_stress else 0
-    
-    # Adherence improvement
-    if len(recent_checkins) >= 2:
-        first_half = sum(c.adherence for c in recent_checkins[:len(recent_checkins)//2]) / (len(recent_checkins)//2)
-        second_half = sum(c.adherence for c in recent_checkins[len(recent_checkins)//2:]) / (len(recent_checkins) - len(recent_checkins)//2)
-        adherence_improvement = second_half - first_half
-    else:
-        adherence_improvement = 0
+    adherence_sum, checkin_count = db.query(
+        func.sum(DailyRollup.adherence_sum),
+        func.sum(DailyRollup.checkin_count)
+    ).filter(
+        DailyRollup.user_id == user_id,
+        DailyRollup.day >= week_start
+    ).one()
+    avg_adherence = adherence_sum / checkin_count if checkin_count else 0
     
     return {
         "yoga": {
-            "streak": yoga_streak,
-            "consistency_percentage": round(yoga_consistency, 1)
+            "streak": snapshot.yoga_streak,
+            "consistency_percentage": round(snapshot.consistency_percentage, 1)
         },
         "nutrition": {
-            "protein_total": round(total_protein, 1),
-            "fiber_total": round(total_fiber, 1),
-            "calcium_total": round(total_calcium, 1)
+            "protein_total": round(snapshot.protein_total, 1),
+            "fiber_total": round(snapshot.fiber_total, 1),
+            "calcium_total": round(snapshot.calcium_total, 1)
         },
         "wellness": {
-            "stress_reduction": round(stress_reduction, 1),
+            "stress_reduction": round(snapshot.stress_reduction, 1),
             "adherence_avg": round(avg_adherence, 1),
-            "adherence_improvement": round(adherence_improvement, 1)
+            "adherence_improvement": round(snapshot.adherence_improvement, 1)
         },
         "period": {
             "start": week_start.isoformat(),
@@ -78,45 +55,52 @@ async def get_dashboard_overview(user_id: int, db: Session = Depends(get_db)):
     }
 
 @router.get("/{user_id}/trends")
-async def get_trends(user_id: int, days: int = 30, db: Session = Depends(get_db)):
-    """Get trend data for charts"""
+def get_trends(user_id: int, request: Request, days: int = 30,
+               points: Optional[int] = Query(None, ge=3),
+               format: str = Query("rows", pattern="^(rows|columnar)$"),
+               db: Session = Depends(get_db)):
+    """Get trend data for charts (one point per day).
+    
+    ``points`` downsamples each series with LTTB; ``format=columnar``
+    returns parallel ``date``/``value`` arrays instead of row objects.
+    """
+    return cached_response(request, user_id, lambda: _trends(user_id, days, points, format, db))
+
+def _trends(user_id: int, days: int, points: Optional[int], format: str, db: Session) -> Dict:
     today = datetime.utcnow().date()
     start_date = today - timedelta(days=days)
     
     # Daily data points
-    checkins = db.query(CheckIn).filter(
-        CheckIn.user_id == user_id,
-        CheckIn.date >= start_date
-    ).order_by(CheckIn.date).all()
-    
-    quizzes = db.query(QuizResponse).filter(
-        QuizResponse.user_id == user_id,
-        QuizResponse.date >= start_date
-    ).order_by(QuizResponse.date).all()
-    
-    nutrition = db.query(NutritionPlan).filter(
-        NutritionPlan.user_id == user_id,
-        NutritionPlan.date >= start_date
-    ).order_by(NutritionPlan.date).all()
+    rollups = get_rollups(db, user_id, start_date)
+    
+    checkin_days = [r for r in rollups if r.checkin_count]
+    quiz_days = [r for r in rollups if r.quiz_count]
+    meal_days = [r for r in rollups if r.meals]
+    
+    series = {
+        "adherence": (checkin_days, lambda r: round(r.avg_adherence, 1)),
+        "stress": (quiz_days, lambda r: round(r.avg_stress, 1)),
+        "motivation": (quiz_days, lambda r: round(r.avg_motivation, 1)),
+        "protein": (meal_days, lambda r: float(r.protein_total)),
+        "fiber": (meal_days, lambda r: float(r.fiber_total)),
+    }
     
-    # Format dates properly and ensure data exists
-    adherence_data = [{"date": c.date.isoformat(), "value": float(c.adherence)} for c in checkins] if checkins else []
-    stress_data = [{"date": q.date.isoformat(), "value": int(q.stress_score)} for q in quizzes] if quizzes else []
-    motivation_data = [{"date": q.date.isoformat(), "value": int(q.motivation_score)} for q in quizzes] if quizzes else []
-    protein_data = [{"date": n.date.isoformat(), "value": float(n.nutrients.get("protein", 0))} for n in nutrition if n.nutrients] if nutrition else []
-    fiber_data = [{"date": n.date.isoformat(), "value": float(n.nutrients.get("fiber", 0))} for n in nutrition if n.nutrients] if nutrition else []
+    result = {}
+    for name, (rows, value) in series.items():
+        dates, values = downsample([r.day for r in rows], [value(r) for r in rows], points)
+        if format == "columnar":
+            result[name] = {"date": [d.isoformat() for d in dates], "value": values}
+        else:
+            result[name] = [{"date": d.isoformat(), "value": v} for d, v in zip(dates, values)]
     
-    return {
-        "adherence": adherence_data,
-        "stress": stress_data,
-        "motivation": motivation_data,
-        "protein": protein_data,
-        "fiber": fiber_data,
-    }
+    return result
 
 @router.get("/{user_id}/top-items")
-async def get_top_items(user_id: int, db: Session = Depends(get_db)):
+def get_top_items(user_id: int, request: Request, db: Session = Depends(get_db)):
     """Get top liked meals and videos"""
+    return cached_response(request, user_id, lambda: _top_items(user_id, db))
+
+def _top_items(user_id: int, db: Session) -> Dict:
     # This would typically come from user feedback/memory
     # For now, return most frequent items
     recent_nutrition = db.query(NutritionPlan).filter(
@@ -0,0 +1,62 @@
+from fastapi import APIRouter, HTTPException, Depends, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from database import get_db, get_async_db, AsyncSessionLocal, Job
+from job_queue import job_queue, job_view, FINISHED_STATUSES
+import asyncio
+import json
+
+router = APIRouter()
+
+EVENTS_POLL_SECONDS = 0.5
+EVENTS_MAX_SECONDS = 600
+
+@router.get("/{job_id}")
+async def get_job(job_id: int, db: AsyncSession = Depends(get_async_db)):
+    """Status of a background job, with its result once finished"""
+    job = await db.get(Job, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_view(job)
+
+@router.get("/{job_id}/events")
+async def job_events(job_id: int, request: Request, db: AsyncSession = Depends(get_async_db)):
+    """Server-Sent Events: ``status`` on every change, then ``done`` with the result"""
+    if not await db.get(Job, job_id):
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def generate():
+        last = None
+        for _ in range(int(EVENTS_MAX_SECONDS / EVENTS_POLL_SECONDS)):
+            if await request.is_disconnected():
+                return
+            async with AsyncSessionLocal() as session:
+                job = await session.get(Job, job_id)
+                if job is None:
+                    yield f"event: error\ndata: {json.dumps({'detail': 'Job not found'})}\n\n"
+                    return
+                view = jsonable_encoder(job_view(job))
+            if job.status in FINISHED_STATUSES:
+                yield f"event: done\ndata: {json.dumps(view)}\n\n"
+                return
+            state = (job.status, job.attempts)
+            if state != last:
+                last = state
+                yield f"event: status\ndata: {json.dumps(view)}\n\n"
+            await asyncio.sleep(EVENTS_POLL_SECONDS)
+
+    return StreamingResponse(generate(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@router.post("/{job_id}/retry")
+def retry_job(job_id: int, db: Session = Depends(get_db)):
+    """Run a failed job again"""
+    job = db.get(Job, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    retried = job_queue.retry(db, job_id)
+    if retried is None:
+        raise HTTPException(status_code=409, detail=f"Job is {job.status}; only failed jobs can be retried")
+    return job_view(retried)
@@ -1,7 +1,9 @@
 from fastapi import APIRouter, HTTPException, Depends
 from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
-from database import get_db, NutritionPlan, User
+from database import get_db, get_async_db, NutritionPlan, User
 from agents.nutrition_agent import NutritionAgent
 from typing import List, Optional
 
@@ -16,14 +18,14 @@ class RecipeRequest(BaseModel):
     focus: Optional[str] = "balanced_sattvic"
 
 @router.get("/lookup/{ingredient}")
-async def lookup_nutrient(ingredient: str, db: Session = Depends(get_db)):
+def lookup_nutrient(ingredient: str, db: Session = Depends(get_db)):
     """Lookup nutrients for an ingredient"""
     nutrition_agent = NutritionAgent(db)
     result = nutrition_agent.lookup_nutrients(ingredient)
     return result
 
 @router.post("/recipe/generate")
-async def generate_recipe(request: RecipeRequest, db: Session = Depends(get_db)):
+def generate_recipe(request: RecipeRequest, db: Session = Depends(get_db)):
     """Generate a recipe"""
     nutrition_agent = NutritionAgent(db)
     result = nutrition_agent.generate_recipe(
@@ -34,24 +36,24 @@ async def generate_recipe(request: RecipeRequest, db: Session = Depends(get_db))
     return result
 
 @router.get("/plans/{user_id}")
-async def get_nutrition_plans(user_id: int, limit: int = 10, db: Session = Depends(get_db)):
+async def get_nutrition_plans(user_id: int, limit: int = 10, db: AsyncSession = Depends(get_async_db)):
     """Get user's nutrition plans"""
-    plans = db.query(NutritionPlan).filter(
+    plans = (await db.scalars(select(NutritionPlan).where(
         NutritionPlan.user_id == user_id
-    ).order_by(NutritionPlan.date.desc()).limit(limit).all()
+    ).order_by(NutritionPlan.date.desc()).limit(limit))).all()
     
     return plans
 
 @router.get("/plans/{user_id}/today")
-async def get_today_plans(user_id: int, db: Session = Depends(get_db)):
+async def get_today_plans(user_id: int, db: AsyncSession = Depends(get_async_db)):
     """Get today's nutrition plans"""
     from datetime import datetime, date
     today = date.today()
     
-    plans = db.query(NutritionPlan).filter(
+    plans = (await db.scalars(select(NutritionPlan).where(
         NutritionPlan.user_id == user_id,
         NutritionPlan.date >= datetime.combine(today, datetime.min.time())
-    ).order_by(NutritionPlan.date.desc()).all()
+    ).order_by(NutritionPlan.date.desc()))).all()
     
     return [{
         "id": p.id,
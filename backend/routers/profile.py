@@ -1,7 +1,8 @@
 from fastapi import APIRouter, HTTPException, Depends
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
-from database import get_db, User
+from database import get_db, get_async_db, User
 from typing import Optional
 
 router = APIRouter()
@@ -17,15 +18,15 @@ class ProfileUpdate(BaseModel):
     activity_level: Optional[str] = None
 
 @router.get("/{user_id}")
-async def get_profile(user_id: int, db: Session = Depends(get_db)):
+async def get_profile(user_id: int, db: AsyncSession = Depends(get_async_db)):
     """Get user profile"""
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.get(User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     return user
 
 @router.put("/{user_id}")
-async def update_profile(user_id: int, profile_data: ProfileUpdate, db: Session = Depends(get_db)):
+def update_profile(user_id: int, profile_data: ProfileUpdate, db: Session = Depends(get_db)):
     """Update user profile"""
     user = db.query(User).filter(User.id == user_id).first()
     if not user:
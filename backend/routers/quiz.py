@@ -1,9 +1,12 @@
 from fastapi import APIRouter, HTTPException, Depends
 from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
-from database import get_db, QuizResponse, User
+from database import get_db, get_async_db, QuizResponse, User
 from datetime import datetime
 from typing import Dict, List
+from rollups import apply_quiz
 
 router = APIRouter()
 
@@ -11,7 +14,7 @@ class QuizSubmission(BaseModel):
     responses: Dict[str, int]  # question_id: answer_score
 
 @router.post("/{user_id}")
-async def submit_quiz(user_id: int, quiz_data: QuizSubmission, db: Session = Depends(get_db)):
+def submit_quiz(user_id: int, quiz_data: QuizSubmission, db: Session = Depends(get_db)):
     """Submit mental health quiz"""
     user = db.query(User).filter(User.id == user_id).first()
     if not user:
@@ -44,6 +47,7 @@ async def submit_quiz(user_id: int, quiz_data: QuizSubmission, db: Session = Dep
     )
     
     db.add(quiz_response)
+    apply_quiz(db, quiz_response)
     db.commit()
     db.refresh(quiz_response)
     
@@ -62,11 +66,11 @@ async def submit_quiz(user_id: int, quiz_data: QuizSubmission, db: Session = Dep
     }
 
 @router.get("/{user_id}/recent")
-async def get_recent_quizzes(user_id: int, limit: int = 5, db: Session = Depends(get_db)):
+async def get_recent_quizzes(user_id: int, limit: int = 5, db: AsyncSession = Depends(get_async_db)):
     """Get recent quiz responses"""
-    quizzes = db.query(QuizResponse).filter(
+    quizzes = (await db.scalars(select(QuizResponse).where(
         QuizResponse.user_id == user_id
-    ).order_by(QuizResponse.date.desc()).limit(limit).all()
+    ).order_by(QuizResponse.date.desc()).limit(limit))).all()
     
     return [{
         "id": q.id,
@@ -1,31 +1,83 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Request, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from database import get_db, User
+from database import get_db, User, SessionLocal
+from datetime import date, datetime
+from typing import Optional
 from agents.report_agent import ReportAgent
+from response_cache import cached_response
+from report_batch import iter_user_chunks, build_chunk_reports
+from routers.auth import require_admin
+import json
+
+MAX_BULK_CHUNK_SIZE = 1000
 
 router = APIRouter()
 
+def _require_user(db: Session, user_id: int):
+    # Checked before the cache so a stale ETag can't turn a 404 into a 304
+    if db.query(User.id).filter(User.id == user_id).first() is None:
+        raise HTTPException(status_code=404, detail="User not found")
+
 @router.get("/weekly/{user_id}")
-async def get_weekly_report(user_id: int, db: Session = Depends(get_db)):
+def get_weekly_report(user_id: int, request: Request, db: Session = Depends(get_db)):
     """Generate weekly report"""
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+    _require_user(db, user_id)
     
-    report_agent = ReportAgent(db)
-    report = report_agent.generate_weekly_report(user_id)
+    def build():
+        report_agent = ReportAgent(db)
+        return report_agent.generate_weekly_report(user_id)
     
-    return report
+    return cached_response(request, user_id, build)
 
 @router.get("/monthly/{user_id}")
-async def get_monthly_report(user_id: int, db: Session = Depends(get_db)):
+def get_monthly_report(user_id: int, request: Request, db: Session = Depends(get_db)):
     """Generate monthly report"""
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+    _require_user(db, user_id)
+    
+    def build():
+        report_agent = ReportAgent(db)
+        return report_agent.generate_monthly_report(user_id)
     
-    report_agent = ReportAgent(db)
-    report = report_agent.generate_monthly_report(user_id)
+    return cached_response(request, user_id, build)
+
+@router.get("/range/{user_id}")
+def get_range_report(user_id: int, start: date, end: date, request: Request,
+                     db: Session = Depends(get_db)):
+    """Generate a report for an arbitrary date range (e.g. quarterly or yearly)"""
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must be on or before end")
+    
+    _require_user(db, user_id)
+    
+    def build():
+        report_agent = ReportAgent(db)
+        return report_agent.generate_range_report(user_id, start, end)
     
-    return report
+    return cached_response(request, user_id, build)
 
+@router.get("/bulk/{period}", dependencies=[Depends(require_admin)])
+async def stream_bulk_reports(period: str, after_user_id: int = Query(0, ge=0),
+                              chunk_size: int = Query(500, ge=1, le=MAX_BULK_CHUNK_SIZE)):
+    """Stream weekly or monthly reports for all users as NDJSON.
+    
+    Requires the ``X-Admin-Token`` header. Users are emitted in id order;
+    pass the last received ``user_id`` as ``after_user_id`` to resume an
+    interrupted download.
+    """
+    if period not in ReportAgent.PERIOD_DAYS:
+        raise HTTPException(status_code=404, detail="Unknown report period")
+    as_of = datetime.utcnow().date()
+    
+    def generate():
+        db = SessionLocal()
+        try:
+            for ids in iter_user_chunks(db, chunk_size, after_user_id):
+                for report in build_chunk_reports(db, period, ids, as_of):
+                    yield json.dumps(report) + "\n"
+                # Chunks are independent; don't keep their rows in the identity map
+                db.expunge_all()
+        finally:
+            db.close()
+    
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
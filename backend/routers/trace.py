@@ -1,54 +1,129 @@
-from fastapi import APIRouter, HTTPException, Depends
-from sqlalchemy.orm import Session
-from database import get_db, DecisionTrace, User
+from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_async_db, DecisionTrace, User, SessionLocal
+from trace_store import (
+    hydrate_traces, trace_writer, query_traces, decode_cursor, resolve_payloads, rule_ids, TRACE_FIELDS
+)
+from archive import get_watermark, iter_archive
+from routers.auth import require_admin
 from datetime import datetime, timedelta
+from typing import List, Optional
+import json
 
 router = APIRouter()
 
 @router.get("/{user_id}/recent")
-async def get_recent_traces(user_id: int, limit: int = 10, db: Session = Depends(get_db)):
+async def get_recent_traces(user_id: int, limit: int = 10, db: AsyncSession = Depends(get_async_db)):
     """Get recent decision traces"""
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.get(User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    traces = db.query(DecisionTrace).filter(
+    traces = (await db.scalars(select(DecisionTrace).where(
         DecisionTrace.user_id == user_id
-    ).order_by(DecisionTrace.date.desc()).limit(limit).all()
-    
-    return [{
-        "id": t.id,
-        "date": t.date.isoformat(),
-        "agent_name": t.agent_name,
-        "triggered_rules": t.triggered_rules,
-        "memory_retrieved": t.memory_retrieved,
-        "plan_chosen": t.plan_chosen,
-        "tools_called": t.tools_called,
-        "explanation": t.explanation
-    } for t in traces]
+    ).order_by(DecisionTrace.date.desc()).limit(limit))).all()
+    
+    # Include traces still waiting in the write-behind buffer
+    return (trace_writer.pending(user_id) + await db.run_sync(hydrate_traces, traces))[:limit]
 
 @router.get("/{user_id}/today")
-async def get_today_traces(user_id: int, db: Session = Depends(get_db)):
+async def get_today_traces(user_id: int, db: AsyncSession = Depends(get_async_db)):
     """Get today's decision traces"""
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.get(User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
     today = datetime.utcnow().date()
     
-    traces = db.query(DecisionTrace).filter(
+    since = datetime.combine(today, datetime.min.time())
+    traces = (await db.scalars(select(DecisionTrace).where(
         DecisionTrace.user_id == user_id,
-        DecisionTrace.date >= datetime.combine(today, datetime.min.time())
-    ).order_by(DecisionTrace.date.desc()).all()
-    
-    return [{
-        "id": t.id,
-        "date": t.date.isoformat(),
-        "agent_name": t.agent_name,
-        "triggered_rules": t.triggered_rules,
-        "memory_retrieved": t.memory_retrieved,
-        "plan_chosen": t.plan_chosen,
-        "tools_called": t.tools_called,
-        "explanation": t.explanation
-    } for t in traces]
+        DecisionTrace.date >= since
+    ).order_by(DecisionTrace.date.desc()))).all()
+    
+    pending = [t for t in trace_writer.pending(user_id) if t["date"] >= since.isoformat()]
+    return pending + await db.run_sync(hydrate_traces, traces)
+
+
+def _parse_fields(fields: Optional[str]) -> List[str]:
+    if not fields:
+        return list(TRACE_FIELDS)
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = set(requested) - set(TRACE_FIELDS)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    return requested
+
+@router.get("/query")
+async def query_decision_traces(user_id: Optional[int] = None, agent_name: Optional[str] = None,
+                                rule_id: Optional[str] = None, start: Optional[datetime] = None,
+                                end: Optional[datetime] = None, fields: Optional[str] = None,
+                                cursor: Optional[str] = None, limit: int = Query(50, ge=1, le=500),
+                                db: AsyncSession = Depends(get_async_db)):
+    """Page through traces newest first.
+    
+    ``fields`` is a comma-separated projection (default: all). Pass the
+    returned ``next_cursor`` as ``cursor`` to get the next page.
+    Traces older than ``archived_before`` are only in the NDJSON export.
+    """
+    selected = _parse_fields(fields)
+    if cursor is not None:
+        try:
+            decode_cursor(cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    
+    page = await db.run_sync(lambda session: query_traces(
+        session, user_id=user_id, agent_name=agent_name, rule_id=rule_id,
+        start=start, end=end, fields=selected, cursor=cursor, limit=limit
+    ))
+    watermark = get_watermark()
+    page["archived_before"] = watermark.isoformat() if watermark else None
+    return page
+
+@router.get("/export", dependencies=[Depends(require_admin)])
+async def export_decision_traces(user_id: Optional[int] = None, agent_name: Optional[str] = None,
+                                 rule_id: Optional[str] = None, start: Optional[datetime] = None,
+                                 end: Optional[datetime] = None, fields: Optional[str] = None):
+    """Stream every matching trace as NDJSON, including archived ones.
 
+    Requires the ``X-Admin-Token`` header. Traces in the database come
+    newest first; archived traces follow in archive order.
+    """
+    selected = _parse_fields(fields)
+    
+    def generate():
+        db = SessionLocal()
+        try:
+            cursor = None
+            while True:
+                page = query_traces(db, user_id=user_id, agent_name=agent_name, rule_id=rule_id,
+                                    start=start, end=end, fields=selected, cursor=cursor, limit=1000)
+                for item in page["items"]:
+                    yield json.dumps(item).encode() + b"\n"
+                cursor = page["next_cursor"]
+                if cursor is None:
+                    break
+                # Don't hold a read transaction open between pages
+                db.rollback()
+            
+            watermark = get_watermark()
+            if watermark is None or (start is not None and start >= watermark):
+                return
+            archive_end = min(end, watermark) if end else watermark
+            for batch in iter_archive(DecisionTrace, user_id, start, archive_end, batch_size=1000):
+                if agent_name is not None:
+                    batch = [t for t in batch if t["agent_name"] == agent_name]
+                for trace in resolve_payloads(db, batch):
+                    if rule_id is not None and rule_id not in rule_ids(trace["triggered_rules"]):
+                        continue
+                    yield json.dumps(
+                        {f: trace["date"].isoformat() if f == "date" else trace[f] for f in selected}
+                    ).encode() + b"\n"
+                db.rollback()
+        finally:
+            db.close()
+    
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
@@ -1,7 +1,9 @@
 from fastapi import APIRouter, HTTPException, Depends
 from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
-from database import get_db, YogaPlan, User
+from database import get_db, get_async_db, YogaPlan, User
 from agents.yoga_agent import YogaAgent
 from typing import Optional
 
@@ -14,13 +16,13 @@ class YogaPlanRequest(BaseModel):
     stress_level: Optional[int] = 50
 
 @router.post("/plan/{user_id}")
-async def create_yoga_plan(user_id: int, request: YogaPlanRequest, db: Session = Depends(get_db)):
+def create_yoga_plan(user_id: int, request: YogaPlanRequest, db: Session = Depends(get_db)):
     """Create a yoga plan"""
     user = db.query(User).filter(User.id == user_id).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    yoga_agent = YogaAgent(db)
+    yoga_agent = YogaAgent(db, user_id=user_id)
     plan = yoga_agent.generate_yoga_plan(
         user_id=user_id,
         session_type=request.session_type,
@@ -40,13 +42,13 @@ async def create_yoga_plan(user_id: int, request: YogaPlanRequest, db: Session =
     }
 
 @router.post("/weekly/{user_id}")
-async def create_weekly_plan(user_id: int, db: Session = Depends(get_db)):
+def create_weekly_plan(user_id: int, db: Session = Depends(get_db)):
     """Create weekly yoga plan"""
     user = db.query(User).filter(User.id == user_id).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    yoga_agent = YogaAgent(db)
+    yoga_agent = YogaAgent(db, user_id=user_id)
     plans = yoga_agent.generate_weekly_plan(
         user_id=user_id,
         recommendations={"energy_trend": "medium", "stress_level": 50},
@@ -63,24 +65,24 @@ async def create_weekly_plan(user_id: int, db: Session = Depends(get_db)):
     } for p in plans]
 
 @router.get("/plans/{user_id}")
-async def get_yoga_plans(user_id: int, limit: int = 10, db: Session = Depends(get_db)):
+async def get_yoga_plans(user_id: int, limit: int = 10, db: AsyncSession = Depends(get_async_db)):
     """Get user's yoga plans"""
-    plans = db.query(YogaPlan).filter(
+    plans = (await db.scalars(select(YogaPlan).where(
         YogaPlan.user_id == user_id
-    ).order_by(YogaPlan.date.desc()).limit(limit).all()
+    ).order_by(YogaPlan.date.desc()).limit(limit))).all()
     
     return plans
 
 @router.get("/plans/{user_id}/today")
-async def get_today_yoga_plan(user_id: int, db: Session = Depends(get_db)):
+async def get_today_yoga_plan(user_id: int, db: AsyncSession = Depends(get_async_db)):
     """Get today's yoga plan"""
     from datetime import datetime, date
     today = date.today()
     
-    plan = db.query(YogaPlan).filter(
+    plan = (await db.scalars(select(YogaPlan).where(
         YogaPlan.user_id == user_id,
         YogaPlan.date >= datetime.combine(today, datetime.min.time())
-    ).order_by(YogaPlan.date.desc()).first()
+    ).order_by(YogaPlan.date.desc()).limit(1))).first()
     
     if not plan:
         return {"message": "No yoga plan for today"}
@@ -0,0 +1,341 @@
+"""
+Synthetic history generator for scale testing.
+
+Fills the database with users and days of check-ins, weekly quizzes,
+meal and yoga plans, memories and Reasoner decision traces, so the
+dashboard, reports and ObserveAgent can be exercised at production
+sizes. Each user has latent traits (baseline sleep, stress, discipline,
+engagement); a day-to-day stress process drives sleep, mood, energy,
+appetite and adherence, so the series are correlated the way real
+check-ins are, and stress eases slowly as users stay with the program.
+
+The daily series are generated with numpy per chunk of users and the
+rows bulk inserted with executemany, one transaction per chunk and no
+autoflush; decision traces go through
+``write_traces`` so their payloads are deduplicated as in production.
+Daily rollups are rebuilt at the end:
+
+    python synth_data.py --users 1000 --days 365
+    python synth_data.py --users 100000 --days 730 --chunk-users 200 --no-traces
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+import numpy as np
+from sqlalchemy import func, insert
+from sqlalchemy.orm import Session
+
+from database import init_db, SessionLocal, User, CheckIn, QuizResponse, NutritionPlan, YogaPlan, Memory
+from rollups import backfill_rollups
+from trace_store import write_traces
+from agents.reasoner_agent import default_recommendations
+
+FIRST_NAMES = ["Aarav", "Maya", "Liam", "Priya", "Noah", "Ana", "Kenji", "Zara", "Omar", "Lena",
+               "Ravi", "Sofia", "Ethan", "Isha", "Mateo", "Amara", "Yuki", "Nina", "Arjun", "Chloe"]
+EXPERIENCE = ["beginner", "intermediate", "advanced"]
+DIETS = [["vegetarian"], ["vegan"], ["vegetarian", "gluten_free"], ["sattvic"], ["vegetarian", "dairy_free"]]
+ALLERGIES = [[], [], [], ["nuts"], ["gluten"], ["dairy"], ["soy"]]
+GOALS = [["stress_relief"], ["flexibility", "strength"], ["weight_loss"], ["better_sleep", "stress_relief"],
+         ["muscle_gain"], ["flexibility"]]
+ACTIVITY = ["low", "moderate", "high"]
+INGREDIENTS = ["rice", "lentils", "spinach", "carrots", "oats", "banana", "quinoa", "chickpeas",
+               "tofu", "almonds", "sweet potato", "mung beans", "yogurt", "apple", "ginger",
+               "millet", "pumpkin", "dates", "cucumber", "coconut"]
+MEALS = {
+    # meal type: (recipe name templates, median calories)
+    "breakfast": (["Warm {} Porridge", "{} Smoothie Bowl", "Spiced {} Upma"], 380),
+    "lunch": (["{} Kitchari", "{} Buddha Bowl", "{} Dal with Rice"], 620),
+    "dinner": (["Light {} Soup", "Steamed {} with Herbs", "{} Khichdi"], 480),
+    "snack": (["{} and Dates", "Roasted {}", "{} Chaat"], 180),
+}
+MEAL_TYPES = list(MEALS)
+SESSION_TYPES = ["stress_relief", "recovery", "energizing", "flexibility", "strength"]
+SESSION_FOCUS = {"stress_relief": "magnesium_rich", "recovery": "restorative", "energizing": "energizing",
+                 "flexibility": "balanced_sattvic", "strength": "protein_rich"}
+
+def _user_rows(rnd: random.Random, user_ids: np.ndarray, joined: List[datetime]) -> List[Dict]:
+    rows = []
+    for uid, created in zip(user_ids.tolist(), joined):
+        rows.append({
+            "id": uid,
+            "email": f"synth{uid}@example.com",
+            "name": f"{FIRST_NAMES[uid % len(FIRST_NAMES)]} {uid}",
+            "age": rnd.randrange(18, 75),
+            "gender": rnd.choices(["female", "male", "other"], [0.55, 0.42, 0.03])[0],
+            "yoga_experience": rnd.choices(EXPERIENCE, [0.5, 0.35, 0.15])[0],
+            "dietary_preferences": rnd.choice(DIETS),
+            "allergies": rnd.choice(ALLERGIES),
+            "goals": rnd.choice(GOALS),
+            "activity_level": rnd.choice(ACTIVITY),
+            "created_at": created,
+        })
+    return rows
+
+def _daily_series(rng: np.random.Generator, users: int, days: int, weekday: np.ndarray,
+                  join_spread: float = 0.8) -> Dict[str, np.ndarray]:
+    """Correlated (users, days) metrics from per-user traits and an AR(1) stress process"""
+    sleep_base = np.clip(rng.normal(7.1, 0.6, users), 5.5, 8.5)[:, None]
+    stress_base = rng.normal(0, 1, users)[:, None]
+    discipline = rng.beta(4, 3, users)[:, None]
+    engagement = rng.beta(5, 2, users)[:, None]
+    joined_day = (rng.beta(1, 2, users) * days * join_spread).astype(int)
+
+    shocks = rng.normal(0, np.sqrt(1 - 0.85 ** 2), (users, days))
+    drift = np.empty((users, days))
+    drift[:, 0] = rng.normal(0, 1, users)
+    for d in range(1, days):
+        drift[:, d] = 0.85 * drift[:, d - 1] + shocks[:, d]
+
+    tenure = np.arange(days)[None, :] - joined_day[:, None]
+    active = tenure >= 0
+    benefit = 0.6 * discipline * (1 - np.exp(-np.maximum(tenure, 0) / 120))
+    weekend = (weekday >= 5)[None, :]
+    stress = 0.7 * stress_base + 0.7 * drift - benefit + np.where(weekend, -0.3, 0.15)
+
+    sleep = np.clip(sleep_base - 0.45 * stress + 0.4 * weekend + rng.normal(0, 0.5, (users, days)), 3.5, 10)
+    energy = np.clip(5 + 1.1 * (sleep - 7) - 0.8 * stress + rng.normal(0, 1, (users, days)), 0, 10)
+    mood = np.clip(np.rint(5.5 + 0.8 * (sleep - 7) - 1.2 * stress + rng.normal(0, 1, (users, days))), 1, 10)
+    appetite = np.clip(5.5 - 0.5 * stress + 0.3 * (energy - 5) + rng.normal(0, 1.2, (users, days)), 0, 10)
+    adherence = np.clip(100 * discipline + 8 * (mood - 5.5) - 6 * stress + rng.normal(0, 10, (users, days)), 0, 100)
+
+    # Engagement fades for some users the longer they have been signed up
+    fade = 0.5 + 0.5 * np.exp(-np.maximum(tenure, 0) / rng.uniform(60, 720, users)[:, None])
+    checked_in = active & (rng.random((users, days)) < engagement * fade)
+    return {
+        "joined_day": joined_day, "stress": stress, "sleep": np.round(sleep, 1), "energy": np.round(energy, 1),
+        "mood": mood.astype(int), "appetite": np.round(appetite, 1), "adherence": np.round(adherence, 1),
+        "checked_in": checked_in,
+    }
+
+def _score(value: float) -> int:
+    return int(min(max(value, 0), 100))
+
+def _mood_label(mood: int, stress: float) -> str:
+    if stress > 1.0:
+        return "stressed"
+    if mood >= 7:
+        return "happy"
+    if mood <= 3:
+        return "sad"
+    return "neutral"
+
+def _session_type(stress: float, sleep: float, energy: float, rnd: random.Random) -> str:
+    if stress > 0.8:
+        return "stress_relief"
+    if sleep < 6:
+        return "recovery"
+    if energy < 4:
+        return "energizing"
+    return "flexibility" if rnd.random() < 0.6 else "strength"
+
+def _rules(stress_score: int, motivation: int, sleep: float, adherence: float) -> List[Dict]:
+    """The ReasonerAgent rules these values would trigger"""
+    rules = []
+    if stress_score > 80:
+        rules.append({"rule_id": "high_stress_relief", "condition": f"stress_score > 80 ({stress_score})",
+                      "action": "gentle_yoga_meditation_magnesium", "priority": "high"})
+    if motivation < 40:
+        rules.append({"rule_id": "low_motivation_boost", "condition": f"motivation_score < 40 ({motivation})",
+                      "action": "energizing_yoga_favorite_meal", "priority": "high"})
+    if adherence < 40:
+        rules.append({"rule_id": "poor_adherence_simplify", "condition": f"adherence < 40% ({adherence:.1f}%)",
+                      "action": "simplified_plans", "priority": "high"})
+    if sleep < 6:
+        rules.append({"rule_id": "low_sleep_recovery", "condition": f"sleep < 6 hours ({sleep})",
+                      "action": "recovery_yoga_restorative_meals", "priority": "medium"})
+    return rules
+
+def generate_chunk(rng: np.random.Generator, user_ids: np.ndarray, days: int, end: datetime,
+                   with_traces: bool, join_spread: float = 0.8) -> Dict[str, List[Dict]]:
+    """All rows for one chunk of users, keyed by table.
+
+    Sign-ups are spread over the first ``join_spread`` of the history; 0 starts everyone on day one.
+    """
+    users = len(user_ids)
+    start = (end - timedelta(days=days - 1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    day_starts = [start + timedelta(days=d) for d in range(days)]
+    weekdays = [d.weekday() for d in day_starts]
+    series = _daily_series(rng, users, days, np.array(weekdays), join_spread)
+    # Per-row draws use the stdlib generator; numpy scalar calls are far slower
+    rnd = random.Random(int(rng.integers(2 ** 63)))
+
+    joined = [day_starts[d] + timedelta(hours=rnd.randrange(7, 22)) for d in series["joined_day"]]
+    rows: Dict[str, List[Dict]] = {name: [] for name in
+                                   ("users", "checkins", "quizzes", "meals", "yoga", "memories", "traces")}
+    rows["users"] = _user_rows(rnd, user_ids, joined)
+
+    quiz_weekday = rng.integers(0, 7, users).tolist()
+    for u, uid in enumerate(user_ids.tolist()):
+        stress_u, sleep_u, energy_u, mood_u, appetite_u, adherence_u = (
+            series[name][u].tolist() for name in ("stress", "sleep", "energy", "mood", "appetite", "adherence")
+        )
+        memories = _memories(rnd, uid, joined[u], end)
+        rows["memories"].extend(memories)
+        memory_view = [{"type": m["memory_type"], "content": m["content"], "last_accessed": None}
+                       for m in memories[:5]]
+        last_stress, last_motivation = 50, 50
+        recent_adherence: List[float] = []
+
+        for d in np.flatnonzero(series["checked_in"][u]).tolist():
+            stress, sleep, energy, mood, adherence = stress_u[d], sleep_u[d], energy_u[d], mood_u[d], adherence_u[d]
+            when = day_starts[d] + timedelta(seconds=rnd.randrange(6 * 3600, 22 * 3600))
+
+            rows["checkins"].append({
+                "user_id": uid, "date": when, "mood": _mood_label(mood, stress), "mood_score": mood,
+                "appetite": appetite_u[d], "energy": energy, "sleep_hours": sleep,
+                "adherence": adherence,
+                "ingredients": ", ".join(rnd.sample(INGREDIENTS, rnd.randrange(3, 7))),
+                "notes": "",
+            })
+
+            if weekdays[d] == quiz_weekday[u] and rnd.random() < 0.7:
+                last_stress = _score(50 + 18 * stress + rnd.gauss(0, 8))
+                last_motivation = _score(50 + 5 * (mood - 5.5) + 0.25 * (adherence - 60) + rnd.gauss(0, 8))
+                scores = {
+                    "stress": last_stress,
+                    "anxiety": _score(0.7 * last_stress + rnd.gauss(12, 10)),
+                    "motivation": last_motivation,
+                    "mindfulness": _score(55 - 10 * stress + rnd.gauss(0, 10)),
+                    "appetite": _score(10 * appetite_u[d] + rnd.gauss(0, 8)),
+                    "sleep": _score(50 + 15 * (sleep - 7) + rnd.gauss(0, 8)),
+                }
+                rows["quizzes"].append({
+                    "user_id": uid, "date": when + timedelta(minutes=5),
+                    "stress_score": scores["stress"], "anxiety_score": scores["anxiety"],
+                    "motivation_score": scores["motivation"], "mindfulness_score": scores["mindfulness"],
+                    "appetite_indicator": scores["appetite"], "sleep_quality": scores["sleep"],
+                    "total_score": sum(scores.values()) // 6, "responses": scores,
+                })
+
+            session = _session_type(stress, sleep, energy, rnd)
+            for meal_type in MEAL_TYPES:
+                if rnd.random() < 0.15 + 0.6 * adherence / 100:
+                    rows["meals"].append(_meal(rnd, uid, when, meal_type, session))
+            if rnd.random() < 0.2 + 0.5 * adherence / 100:
+                duration = rnd.choice([15, 20, 30, 45])
+                rows["yoga"].append({
+                    "user_id": uid, "date": when + timedelta(minutes=2), "session_type": session,
+                    "duration_minutes": duration, "youtube_video_id": f"synth{session[:3]}{duration}",
+                    "youtube_title": f"{session.replace('_', ' ').title()} Yoga - {duration} Minutes",
+                    "youtube_url": f"https://www.youtube.com/watch?v=synth{session[:3]}{duration}",
+                    "description": f"A {duration}-minute {session} yoga session",
+                    "created_by_agent": "YogaAgent",
+                })
+
+            recent_adherence = (recent_adherence + [adherence])[-3:]
+            if with_traces:
+                rules = _rules(last_stress, last_motivation, sleep, sum(recent_adherence) / len(recent_adherence))
+                plan = default_recommendations()
+                plan["yoga"]["session_type"] = session
+                plan["nutrition"]["focus"] = SESSION_FOCUS[session]
+                rows["traces"].append({
+                    "user_id": uid, "date": when + timedelta(seconds=1), "agent_name": "ReasonerAgent",
+                    "triggered_rules": rules, "memory_retrieved": memory_view, "plan_chosen": plan,
+                    "tools_called": {"ml_predictor": True},
+                    "explanation": "Rules applied: " + (", ".join(r["rule_id"] for r in rules) or "none"),
+                })
+    return rows
+
+def _meal(rnd: random.Random, uid: int, when: datetime, meal_type: str, session: str) -> Dict:
+    templates, calories = MEALS[meal_type]
+    ingredients = rnd.sample(INGREDIENTS, 3)
+    scale = rnd.lognormvariate(0, 0.2)
+    return {
+        "user_id": uid, "date": when + timedelta(minutes=1), "meal_type": meal_type,
+        "recipe_name": rnd.choice(templates).format(ingredients[0].title()),
+        "ingredients": ingredients,
+        "nutrients": {
+            "calories": round(calories * scale, 1),
+            "protein": round(calories * scale * rnd.uniform(0.03, 0.06), 1),
+            "fiber": round(calories * scale * rnd.uniform(0.01, 0.025), 1),
+            "calcium": round(calories * scale * rnd.uniform(0.2, 0.6), 1),
+            "iron": round(calories * scale * rnd.uniform(0.005, 0.012), 1),
+            "magnesium": round(calories * scale * rnd.uniform(0.1, 0.3), 1),
+        },
+        "recipe_instructions": "1. Prepare the ingredients\n2. Cook gently\n3. Serve warm and mindfully",
+        "meal_simplicity_index": round(rnd.uniform(5, 10), 1),
+        "sattvic_score": round(rnd.uniform(6, 10), 1),
+        "created_by_agent": "NutritionAgent",
+    }
+
+def _memories(rnd: random.Random, uid: int, joined: datetime, end: datetime) -> List[Dict]:
+    span = max((end - joined).total_seconds(), 1)
+    at = lambda: joined + timedelta(seconds=rnd.uniform(0, span))
+    memories = [{"memory_type": "preference",
+                 "content": {"spice_level": rnd.choice(["mild", "medium"]),
+                             "meal_size": rnd.choice(["light", "regular"])}}]
+    for memory_type in ("liked_meal", "disliked_meal"):
+        for _ in range(rnd.randrange(0, 3)):
+            meal_type = rnd.choice(MEAL_TYPES)
+            templates, _ = MEALS[meal_type]
+            name = rnd.choice(templates).format(rnd.choice(INGREDIENTS).title())
+            memories.append({"memory_type": memory_type, "content": [name]})
+    if rnd.random() < 0.5:
+        memories.append({"memory_type": "successful_plan",
+                         "content": {"session_type": rnd.choice(SESSION_TYPES),
+                                     "adherence": round(rnd.uniform(70, 100), 1)}})
+    rows = []
+    for memory in memories:
+        created = at()
+        rows.append({"user_id": uid, "created_at": created, "last_accessed": created, **memory})
+    rows.sort(key=lambda m: m["last_accessed"], reverse=True)
+    return rows
+
+def insert_chunk(db: Session, rows: Dict[str, List[Dict]], batch_size: int) -> Dict[str, int]:
+    """Insert one chunk's rows in a single transaction"""
+    tables = [("users", User), ("checkins", CheckIn), ("quizzes", QuizResponse), ("meals", NutritionPlan),
+              ("yoga", YogaPlan), ("memories", Memory)]
+    counts = {}
+    for name, model in tables:
+        for i in range(0, len(rows[name]), batch_size):
+            db.execute(insert(model.__table__), rows[name][i:i + batch_size])
+        counts[name] = len(rows[name])
+    # write_traces commits, which ends the chunk's transaction
+    counts["traces"] = write_traces(db, rows["traces"]) if rows["traces"] else 0
+    if not rows["traces"]:
+        db.commit()
+    return counts
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--days", type=int, default=365, help="Days of history, ending today")
+    parser.add_argument("--chunk-users", type=int, default=100, help="Users per transaction")
+    parser.add_argument("--batch-size", type=int, default=5000, help="Rows per executemany")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-traces", action="store_true", help="Skip decision traces")
+    parser.add_argument("--no-rollups", action="store_true", help="Skip rebuilding daily rollups")
+    args = parser.parse_args()
+
+    init_db()
+    rng = np.random.default_rng(args.seed)
+    end = datetime.utcnow()
+    db = SessionLocal(autoflush=False)
+    try:
+        first_id = (db.query(func.max(User.id)).scalar() or 0) + 1
+        totals: Dict[str, int] = {}
+        started = time.perf_counter()
+        for offset in range(0, args.users, args.chunk_users):
+            user_ids = np.arange(first_id + offset, first_id + min(offset + args.chunk_users, args.users))
+            counts = insert_chunk(db, generate_chunk(rng, user_ids, args.days, end, not args.no_traces),
+                                  args.batch_size)
+            for name, count in counts.items():
+                totals[name] = totals.get(name, 0) + count
+            elapsed = time.perf_counter() - started
+            print(f"users {offset + len(user_ids)}/{args.users}  check-ins {totals['checkins']}  "
+                  f"{sum(totals.values()) / elapsed:,.0f} rows/s")
+
+        print("Inserted " + ", ".join(f"{count} {name}" for name, count in totals.items())
+              + f" in {time.perf_counter() - started:.1f}s")
+        if not args.no_rollups:
+            rollup_started = time.perf_counter()
+            count = backfill_rollups(db)
+            print(f"Rebuilt {count} daily rollup rows in {time.perf_counter() - rollup_started:.1f}s")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, func
+from sqlalchemy.orm import sessionmaker
+
+import archive
+from archive import archive_old_data, count_history, read_archive
+from database import Base, CheckIn
+
+
+@pytest.fixture
+def db(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'archive.db'}")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+
+def _checkin(db, days_ago):
+    checkin = CheckIn(user_id=1, date=datetime.utcnow() - timedelta(days=days_ago), adherence=days_ago)
+    db.add(checkin)
+    db.commit()
+    return checkin.id
+
+
+def _archived_ids(archive_dir):
+    return sorted(r["id"] for r in read_archive(CheckIn, user_id=1, archive_dir=archive_dir))
+
+
+def test_rows_backdated_below_the_watermark_are_archived_before_deletion(db, tmp_path):
+    archive_dir = str(tmp_path / "archive")
+    old, recent = _checkin(db, 40), _checkin(db, 1)
+    archive_old_data(db, days=30, archive_dir=archive_dir)
+    assert _archived_ids(archive_dir) == [old]
+
+    late = _checkin(db, 45)
+    assert count_history(db, CheckIn, 1, archive_dir) == 3
+
+    archive_old_data(db, days=30, archive_dir=archive_dir)
+    assert _archived_ids(archive_dir) == [old, late]
+    assert [c.id for c in db.query(CheckIn)] == [recent]
+    assert count_history(db, CheckIn, 1, archive_dir) == 3
+
+
+def test_interrupted_run_is_not_counted_twice_and_finishes_later(db, tmp_path, monkeypatch):
+    archive_dir = str(tmp_path / "archive")
+    _checkin(db, 40)
+    _checkin(db, 1)
+
+    def interrupted(db, pending):
+        raise RuntimeError("killed")
+
+    finish = archive._finish_delete
+    monkeypatch.setattr(archive, "_finish_delete", interrupted)
+    with pytest.raises(RuntimeError):
+        archive_old_data(db, days=30, archive_dir=archive_dir)
+    db.rollback()
+    assert db.query(func.count(CheckIn.id)).scalar() == 2
+    assert count_history(db, CheckIn, 1, archive_dir) == 2
+
+    monkeypatch.setattr(archive, "_finish_delete", finish)
+    archive_old_data(db, days=30, archive_dir=archive_dir)
+    assert db.query(func.count(CheckIn.id)).scalar() == 1
+    assert count_history(db, CheckIn, 1, archive_dir) == 2
+    assert len(_archived_ids(archive_dir)) == 1
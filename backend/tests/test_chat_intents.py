@@ -0,0 +1,21 @@
+import pytest
+
+from chat_intents import intent_matcher
+
+
+@pytest.mark.parametrize("message, intent", [
+    ("hi", "greeting"),
+    ("Hello!", "greeting"),
+    ("good morning coach", "greeting"),
+    ("thanks so much!", "thanks"),
+    ("hi, yoga tips?", None),
+    ("hello sattvic dinner", None),
+    ("thank you, what about lunch?", None),
+])
+def test_direct_replies_only_for_messages_with_nothing_else_to_answer(message, intent):
+    match = intent_matcher.match(message, direct=True)
+    assert (match and match["id"]) == intent
+
+
+def test_other_intents_still_answer_greeting_messages_when_offline():
+    assert intent_matcher.match("hi, yoga tips?", fallback=True)["id"] == "yoga_general"
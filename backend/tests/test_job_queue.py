@@ -0,0 +1,58 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from database import Base, Job
+from job_queue import JOB_STALE_SECONDS, JobQueue
+
+
+def _queue(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'jobs.db'}")
+    Base.metadata.create_all(engine)
+    return JobQueue(sessionmaker(bind=engine), workers=0)
+
+
+def _running_job(db, attempts, age=JOB_STALE_SECONDS + 60):
+    started = datetime.utcnow() - timedelta(seconds=age)
+    job = Job(kind="test", status="running", payload={}, attempts=attempts, max_attempts=3,
+              run_at=started, started_at=started, created_at=started)
+    db.add(job)
+    db.commit()
+    return job.id
+
+
+def test_stale_jobs_are_requeued_until_out_of_attempts(tmp_path):
+    queue = _queue(tmp_path)
+    db = queue.session_factory()
+    retry = _running_job(db, attempts=1)
+    exhausted = _running_job(db, attempts=3)
+    fresh = _running_job(db, attempts=1, age=5)
+    local = _running_job(db, attempts=1)
+    queue._running.add(local)
+
+    assert queue._requeue_stale(db) == 2
+
+    db.expire_all()
+    assert db.get(Job, retry).status == "queued"
+    assert db.get(Job, exhausted).status == "failed"
+    assert db.get(Job, exhausted).finished_at is not None
+    assert db.get(Job, fresh).status == "running"
+    assert db.get(Job, local).status == "running"
+    assert queue.failed == 1
+
+
+def test_sweep_runs_at_most_once_per_interval(tmp_path):
+    queue = _queue(tmp_path)
+    db = queue.session_factory()
+    queue._sweep_if_due()
+    orphan = _running_job(db, attempts=1)
+
+    queue._sweep_if_due()
+    db.expire_all()
+    assert db.get(Job, orphan).status == "running"
+
+    queue._next_sweep = 0.0
+    queue._sweep_if_due()
+    db.expire_all()
+    assert db.get(Job, orphan).status == "queued"
@@ -0,0 +1,70 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.exc import IntegrityError
+
+from database import Base
+import migrations
+
+
+def _legacy_engine(tmp_path):
+    """A database laid out like one created before the composite indexes existed"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        for model in migrations.USER_DATE_TABLES:
+            conn.exec_driver_sql(f"DROP INDEX ix_{model.__tablename__}_user_date")
+            conn.exec_driver_sql(f"CREATE INDEX ix_{model.__tablename__}_user_id ON {model.__tablename__} (user_id)")
+    return engine
+
+
+def test_hot_queries_use_composite_indexes_after_migrating(tmp_path):
+    engine = _legacy_engine(tmp_path)
+    assert not any(r["uses_index"] for r in migrations.explain_hot_queries(engine))
+
+    assert migrations.migrate(engine) == [version for version, _, _ in migrations.MIGRATIONS]
+
+    results = migrations.explain_hot_queries(engine)
+    assert {r["table"] for r in results} == {m.__tablename__ for m in migrations.USER_DATE_TABLES}
+    for result in results:
+        assert result["uses_index"], result
+        assert not result["sorts"], result
+
+
+def test_migrate_is_idempotent(tmp_path):
+    engine = _legacy_engine(tmp_path)
+    migrations.migrate(engine)
+    assert migrations.migrate(engine) == []
+
+
+def test_progress_from_before_snapshot_days_gets_one_row_per_day(tmp_path):
+    engine = _legacy_engine(tmp_path)
+    with engine.begin() as conn:
+        conn.exec_driver_sql("DROP TABLE progress")
+        conn.exec_driver_sql("CREATE TABLE progress (id INTEGER PRIMARY KEY, user_id INTEGER, date DATETIME, "
+                             "yoga_streak INTEGER, consistency_percentage FLOAT, protein_total FLOAT, "
+                             "fiber_total FLOAT, calcium_total FLOAT, stress_reduction FLOAT, "
+                             "adherence_improvement FLOAT)")
+        conn.exec_driver_sql("INSERT INTO progress (user_id, date, yoga_streak) VALUES "
+                             "(1, '2026-01-05 08:00:00', 1), (1, '2026-01-05 20:00:00', 2), "
+                             "(1, '2026-01-06 08:00:00', 3)")
+
+    migrations.migrate(engine)
+
+    with engine.begin() as conn:
+        rows = conn.exec_driver_sql("SELECT day, yoga_streak FROM progress ORDER BY day").all()
+        assert rows == [("2026-01-05", 2), ("2026-01-06", 3)]
+        with pytest.raises(IntegrityError):
+            conn.exec_driver_sql("INSERT INTO progress (user_id, day) VALUES (1, '2026-01-06')")
+
+
+def test_existing_history_is_rolled_up(tmp_path):
+    engine = _legacy_engine(tmp_path)
+    with engine.begin() as conn:
+        conn.exec_driver_sql("INSERT INTO checkins (user_id, date, adherence, sleep_hours, mood_score, energy) "
+                             "VALUES (1, '2026-01-05 08:00:00', 80, 7, 6, 5), (1, '2026-01-05 20:00:00', 60, 7, 6, 5)")
+
+    migrations.migrate(engine)
+
+    with engine.begin() as conn:
+        rows = conn.exec_driver_sql("SELECT user_id, day, checkin_count, adherence_sum FROM daily_rollups").all()
+    assert rows == [(1, "2026-01-05", 2, 140)]
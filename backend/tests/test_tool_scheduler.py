@@ -0,0 +1,69 @@
+import threading
+import time
+
+import pytest
+
+from agents.tool_scheduler import SchedulerTimeout, ToolCallScheduler
+
+
+def _wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "scheduler did not reach the expected state"
+        time.sleep(0.001)
+
+
+def _stats(scheduler, provider="usda"):
+    return scheduler.metrics().get(provider, {"queue_depth": 0, "in_flight": 0})
+
+
+def _dispatch_order(scheduler, users):
+    """Queue one call per entry of ``users`` behind a held slot; return the order they ran in"""
+    release = threading.Event()
+    order = []
+    holder = threading.Thread(target=scheduler.call, args=("usda", "holder", release.wait))
+    holder.start()
+    _wait_for(lambda: _stats(scheduler)["in_flight"] == 1)
+
+    threads = []
+    for user in users:
+        depth = _stats(scheduler)["queue_depth"]
+        thread = threading.Thread(target=scheduler.call, args=("usda", user, order.append, user))
+        thread.start()
+        threads.append(thread)
+        # Enqueue one at a time so the arrival order is deterministic
+        _wait_for(lambda: _stats(scheduler)["queue_depth"] == depth + 1)
+
+    release.set()
+    for thread in [holder, *threads]:
+        thread.join(timeout=5)
+    return order
+
+
+def test_light_user_is_not_stuck_behind_a_backlog():
+    scheduler = ToolCallScheduler(concurrency={"usda": 1})
+    order = _dispatch_order(scheduler, ["heavy", "heavy", "heavy", "light"])
+    assert order == ["heavy", "light", "heavy", "heavy"]
+
+
+def test_weights_set_the_share_of_dispatches():
+    scheduler = ToolCallScheduler(concurrency={"usda": 1})
+    scheduler.set_weight("half", 0.5)
+    order = _dispatch_order(scheduler, ["half", "half", "full", "full", "full"])
+    assert order == ["full", "half", "full", "full", "half"]
+
+
+def test_queued_call_times_out():
+    scheduler = ToolCallScheduler(concurrency={"usda": 1})
+    release = threading.Event()
+    holder = threading.Thread(target=scheduler.call, args=("usda", "holder", release.wait))
+    holder.start()
+    _wait_for(lambda: _stats(scheduler)["in_flight"] == 1)
+    try:
+        with pytest.raises(SchedulerTimeout):
+            scheduler.call("usda", "late", lambda: None, queue_timeout=0.05)
+    finally:
+        release.set()
+        holder.join(timeout=5)
+    stats = _stats(scheduler)
+    assert stats["timeouts"] == 1 and stats["queue_depth"] == 0
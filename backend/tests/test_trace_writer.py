@@ -0,0 +1,55 @@
+from datetime import datetime
+
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from database import Base, DecisionTrace
+from trace_store import MAX_ATTEMPTS, TraceWriter
+
+
+def _writer(tmp_path, **kwargs):
+    engine = create_engine(f"sqlite:///{tmp_path / 'traces.db'}")
+    Base.metadata.create_all(engine)
+    return TraceWriter(sessionmaker(bind=engine), flush_interval=3600, **kwargs), engine
+
+
+def _count(engine):
+    with engine.connect() as conn:
+        return conn.execute(select(func.count(DecisionTrace.id))).scalar()
+
+
+def test_unwritable_trace_is_dropped_without_blocking_the_rest(tmp_path):
+    writer, engine = _writer(tmp_path, batch_size=8)
+    for i in range(20):
+        # An object the JSON column can't serialize
+        plan = object() if i == 5 else {"n": i}
+        writer._buffer.append({"user_id": 1, "date": datetime.utcnow(), "agent_name": "Test", "plan_chosen": plan})
+
+    writer.flush()
+    assert _count(engine) == 12
+    for _ in range(MAX_ATTEMPTS - 1):
+        writer.flush()
+
+    assert _count(engine) == 19
+    assert writer.rejected == 1
+    assert writer.pending(1) == []
+
+
+def test_traces_are_kept_while_the_database_is_unavailable(tmp_path):
+    writer, engine = _writer(tmp_path)
+    factory = writer.session_factory
+
+    def unavailable():
+        raise OperationalError("connect", {}, Exception("database is locked"))
+
+    writer.session_factory = unavailable
+    writer._buffer.extend({"user_id": 1, "date": datetime.utcnow(), "agent_name": "Test"} for _ in range(3))
+    for _ in range(MAX_ATTEMPTS + 2):
+        writer.flush()
+    assert writer.rejected == 0
+    assert len(writer.pending(1)) == 3
+
+    writer.session_factory = factory
+    writer.flush()
+    assert _count(engine) == 3
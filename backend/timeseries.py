@@ -0,0 +1,173 @@
+"""
+Time-series helpers shared by the dashboard and report endpoints.
+"""
+import numpy as np
+from typing import List, Sequence
+
+def lttb_indices(x: Sequence[float], y: Sequence[float], threshold: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets downsampling.
+
+    Returns the indices of at most ``threshold`` points that preserve the
+    visual shape of the series: the first and last points are kept and each
+    bucket in between contributes the point forming the largest triangle
+    with the previously selected point and the next bucket's average.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    every = (n - 2) / (threshold - 2)
+    indices = np.empty(threshold, dtype=int)
+    indices[0] = 0
+    a = 0
+
+    for i in range(threshold - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, n)
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+
+        areas = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(areas.argmax())
+        indices[i + 1] = a
+
+    indices[-1] = n - 1
+    return indices
+
+def downsample(dates: List, values: List[float], points: int):
+    """Downsample parallel date/value lists to at most ``points`` entries"""
+    if not points or len(values) <= points:
+        return dates, values
+    x = [d.toordinal() for d in dates]
+    keep = lttb_indices(x, values, points)
+    return [dates[i] for i in keep], [values[i] for i in keep]
+
+def _linear_fit(x: np.ndarray, y: np.ndarray):
+    """Least-squares slope, intercept and the slope's standard error"""
+    n = len(y)
+    x_centered = x - x.mean()
+    sxx = float(np.dot(x_centered, x_centered))
+    if sxx == 0:
+        return 0.0, float(y.mean()), float("inf")
+    slope = float(np.dot(x_centered, y - y.mean()) / sxx)
+    intercept = float(y.mean() - slope * x.mean())
+    if n <= 2:
+        return slope, intercept, float("inf")
+    residuals = y - (slope * x + intercept)
+    stderr = float(np.sqrt(np.dot(residuals, residuals) / (n - 2) / sxx))
+    return slope, intercept, stderr
+
+def trend_label(values: Sequence[float], days: Sequence = None, min_change: float = 2.0) -> str:
+    """Classify a series as improving, declining or stable.
+
+    The slope must be significant (|t| >= 2) and the fitted change across
+    the window must be at least ``min_change`` points.
+    """
+    y = np.asarray(values, dtype=float)
+    if len(y) < 2:
+        return "insufficient_data"
+    x = np.array([d.toordinal() for d in days], dtype=float) if days is not None else np.arange(len(y), dtype=float)
+
+    slope, _, stderr = _linear_fit(x, y)
+    change = slope * (x[-1] - x[0])
+    significant = stderr == 0 or (stderr != float("inf") and abs(slope) / stderr >= 2)
+    if len(y) == 2:
+        # Two points carry no noise estimate; fall back to the size of the change
+        significant = True
+    if not significant or abs(change) < min_change:
+        return "stable"
+    return "improving" if change > 0 else "declining"
+
+def rolling_mean(values: Sequence[float], window: int = 7) -> np.ndarray:
+    """Trailing mean over ``window`` observations (shorter at the start)"""
+    y = np.asarray(values, dtype=float)
+    if len(y) == 0:
+        return y
+    sums = np.cumsum(np.insert(y, 0, 0.0))
+    counts = np.minimum(np.arange(1, len(y) + 1), window)
+    return (sums[1:] - sums[np.arange(1, len(y) + 1) - counts]) / counts
+
+def change_points(values: Sequence[float], min_size: int = 5, max_points: int = 3) -> List[int]:
+    """Indices where the mean shifts, found by binary segmentation.
+
+    A split is accepted when two segment means explain the segment better
+    than a single straight line by more than a BIC-style penalty of
+    ``2 * noise_variance * log(n)``, so a steady slope is not reported as
+    a shift.
+    """
+    y = np.asarray(values, dtype=float)
+    n = len(y)
+    if n < 2 * min_size:
+        return []
+    noise = float(np.var(np.diff(y)) / 2) or 1e-9
+    penalty = 2 * noise * np.log(n)
+
+    found: List[int] = []
+    segments = [(0, n)]
+    while segments and len(found) < max_points:
+        best = None
+        for lo, hi in segments:
+            seg = y[lo:hi]
+            size = hi - lo
+            if size < 2 * min_size:
+                continue
+            # Variance explained by a line through the segment
+            x = np.arange(size, dtype=float) - (size - 1) / 2
+            line_gain = float(np.dot(x, seg - seg.mean()) ** 2 / np.dot(x, x))
+            # Variance explained by splitting into two means at each k
+            sums = np.cumsum(seg)
+            k = np.arange(min_size, size - min_size + 1)
+            left_mean = sums[k - 1] / k
+            right_mean = (sums[-1] - sums[k - 1]) / (size - k)
+            gain = k * (size - k) / size * (left_mean - right_mean) ** 2 - line_gain
+            i = int(gain.argmax())
+            if gain[i] > penalty and (best is None or gain[i] > best[0]):
+                best = (float(gain[i]), lo, hi, lo + int(k[i]))
+        if best is None:
+            break
+        _, lo, hi, split = best
+        found.append(split)
+        segments.remove((lo, hi))
+        segments.extend([(lo, split), (split, hi)])
+
+    return sorted(found)
+
+def series_stats(days: Sequence, values: Sequence[float], window: int = 7) -> dict:
+    """Summary statistics for one daily metric"""
+    y = np.asarray(values, dtype=float)
+    if len(y) == 0:
+        return {"count": 0, "trend": "insufficient_data"}
+
+    x = np.array([d.toordinal() for d in days], dtype=float)
+    slope, _, _ = _linear_fit(x, y) if len(y) >= 2 else (0.0, 0.0, 0.0)
+    rolling = rolling_mean(y, window)
+    points = change_points(y)
+    # Each change point compares the segments on either side of it, which
+    # end at the neighbouring change points (or the ends of the series)
+    bounds = [0, *points, len(y)]
+
+    return {
+        "count": int(len(y)),
+        "mean": round(float(y.mean()), 2),
+        "min": round(float(y.min()), 2),
+        "max": round(float(y.max()), 2),
+        "latest": round(float(y[-1]), 2),
+        "slope_per_day": round(slope, 4),
+        "trend": trend_label(y, days),
+        "volatility": round(float(np.diff(y).std()), 2) if len(y) >= 3 else 0.0,
+        "rolling_mean_latest": round(float(rolling[-1]), 2),
+        "change_points": [
+            {
+                "date": days[i].isoformat(),
+                "before_mean": round(float(y[lo:i].mean()), 2),
+                "after_mean": round(float(y[i:hi].mean()), 2),
+            }
+            for lo, i, hi in zip(bounds, bounds[1:-1], bounds[2:])
+        ],
+    }
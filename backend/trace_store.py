@@ -0,0 +1,395 @@
+"""
+Content-addressed, write-behind DecisionTrace storage.
+
+Trace payloads (triggered rules, retrieved memory, chosen plan, tools)
+repeat heavily across users, so each distinct payload is stored once in
+``trace_payloads`` under the SHA-256 of its canonical JSON and a trace
+row keeps only the hashes. Agents hand traces to ``trace_writer``, which
+buffers them and inserts them in batches from a background thread, off
+the request path; the buffer is flushed on shutdown. The rule ids of
+each trace also go to ``trace_rules`` so ``query_traces`` can filter on
+them through an index.
+"""
+import atexit
+import base64
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import insert, select, and_, or_
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from database import SessionLocal, DecisionTrace, TracePayload, TraceRule
+
+PAYLOAD_FIELDS = ("triggered_rules", "memory_retrieved", "plan_chosen", "tools_called")
+FLUSH_INTERVAL_SECONDS = float(os.getenv("TRACE_FLUSH_INTERVAL", "1.0"))
+BATCH_SIZE = int(os.getenv("TRACE_BATCH_SIZE", "500"))
+MAX_BUFFERED = int(os.getenv("TRACE_MAX_BUFFERED", "50000"))
+# Failed writes of a batch before it is split to find the traces that can't be written
+MAX_ATTEMPTS = int(os.getenv("TRACE_MAX_ATTEMPTS", "3"))
+
+TRACE_FIELDS = ("id", "user_id", "date", "agent_name") + PAYLOAD_FIELDS + ("explanation",)
+
+def payload_hash(payload: Any) -> str:
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+class _PayloadCache:
+    """LRU of payloads known to be stored; they never change once written"""
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, hashes: Iterable[str]) -> Dict[str, Any]:
+        found = {}
+        with self._lock:
+            for h in hashes:
+                if h in self._entries:
+                    self._entries.move_to_end(h)
+                    found[h] = self._entries[h]
+        return found
+
+    def put_many(self, payloads: Dict[str, Any]):
+        with self._lock:
+            for h, payload in payloads.items():
+                self._entries[h] = payload
+                self._entries.move_to_end(h)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+_payload_cache = _PayloadCache()
+
+def load_payloads(db: Session, hashes: Iterable[str]) -> Dict[str, Any]:
+    """Payloads for ``hashes``, from the cache or one IN query"""
+    hashes = {h for h in hashes if h}
+    found = _payload_cache.get_many(hashes)
+    missing = list(hashes - set(found))
+    for i in range(0, len(missing), 500):
+        loaded = {
+            row.hash: row.payload
+            for row in db.query(TracePayload.hash, TracePayload.payload).filter(
+                TracePayload.hash.in_(missing[i:i + 500])
+            )
+        }
+        _payload_cache.put_many(loaded)
+        found.update(loaded)
+    return found
+
+def _insert_payloads(db: Session, rows: List[Dict]):
+    dialect = db.bind.dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        # Another writer may have stored the same payload since we looked
+        db.execute(dialect_insert(TracePayload).on_conflict_do_nothing(index_elements=["hash"]), rows)
+    else:
+        db.execute(insert(TracePayload), rows)
+
+def rule_ids(triggered_rules: Any) -> List[str]:
+    """Distinct rule ids in a triggered_rules payload"""
+    ids = []
+    for rule in triggered_rules or []:
+        rule_id = rule.get("rule_id") if isinstance(rule, dict) else rule
+        if isinstance(rule_id, str) and rule_id not in ids:
+            ids.append(rule_id)
+    return ids
+
+def write_traces(db: Session, traces: List[Dict]) -> int:
+    """Insert traces, storing each distinct payload once"""
+    payloads: Dict[str, Any] = {}
+    rows = []
+    for trace in traces:
+        row = {
+            "user_id": trace["user_id"],
+            "date": trace.get("date") or datetime.utcnow(),
+            "agent_name": trace.get("agent_name"),
+            "explanation": trace.get("explanation"),
+        }
+        for field in PAYLOAD_FIELDS:
+            value = trace.get(field)
+            if value is None:
+                row[f"{field}_hash"] = None
+                continue
+            h = payload_hash(value)
+            payloads[h] = value
+            row[f"{field}_hash"] = h
+        rows.append(row)
+
+    known = set(load_payloads(db, payloads))
+    new = [
+        {"hash": h, "payload": payload, "created_at": datetime.utcnow()}
+        for h, payload in payloads.items() if h not in known
+    ]
+    if new:
+        _insert_payloads(db, new)
+    if rows:
+        ids = db.execute(
+            insert(DecisionTrace).returning(DecisionTrace.id, sort_by_parameter_order=True), rows
+        ).scalars().all()
+        rule_rows = [
+            {"trace_id": trace_id, "rule_id": rule_id, "user_id": row["user_id"], "date": row["date"]}
+            for trace_id, row, trace in zip(ids, rows, traces)
+            for rule_id in rule_ids(trace.get("triggered_rules"))
+        ]
+        if rule_rows:
+            db.execute(insert(TraceRule), rule_rows)
+    db.commit()
+    _payload_cache.put_many(payloads)
+    return len(rows)
+
+def _view(trace_id: Optional[int], date: datetime, agent_name: str, payloads: Dict, explanation: str) -> Dict:
+    return {
+        "id": trace_id,
+        "date": date.isoformat(),
+        "agent_name": agent_name,
+        **{field: payloads.get(field) for field in PAYLOAD_FIELDS},
+        "explanation": explanation,
+    }
+
+def hydrate_traces(db: Session, traces: List[DecisionTrace]) -> List[Dict]:
+    """Trace rows as dicts with their payloads resolved"""
+    hashes = {getattr(t, f"{field}_hash") for t in traces for field in PAYLOAD_FIELDS}
+    payloads = load_payloads(db, hashes)
+    return [
+        _view(t.id, t.date, t.agent_name, {
+            field: getattr(t, field) if getattr(t, f"{field}_hash") is None
+            else payloads.get(getattr(t, f"{field}_hash"))
+            for field in PAYLOAD_FIELDS
+        }, t.explanation)
+        for t in traces
+    ]
+
+def resolve_payloads(db: Session, rows: List[Dict]) -> List[Dict]:
+    """Fill payload fields of trace dicts (e.g. archived rows) from their hashes"""
+    payloads = load_payloads(db, {row.get(f"{f}_hash") for row in rows for f in PAYLOAD_FIELDS})
+    for row in rows:
+        for field in PAYLOAD_FIELDS:
+            h = row.get(f"{field}_hash")
+            if h is not None:
+                row[field] = payloads.get(h)
+    return rows
+
+def encode_cursor(date: datetime, trace_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{date.isoformat()}|{trace_id}".encode()).decode()
+
+def decode_cursor(cursor: str):
+    """(date, id) of the last trace on the previous page; ValueError if malformed"""
+    try:
+        date, trace_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(date), int(trace_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+def query_traces(db: Session, user_id: Optional[int] = None, agent_name: Optional[str] = None,
+                 rule_id: Optional[str] = None, start: Optional[datetime] = None,
+                 end: Optional[datetime] = None, fields: Iterable[str] = TRACE_FIELDS,
+                 cursor: Optional[str] = None, limit: int = 50) -> Dict:
+    """One page of traces, newest first, with only the requested fields.
+
+    Pages are keyed on (date, id), so each page is an index range scan
+    however deep the caller has paged; pass ``next_cursor`` back to
+    continue. A rule filter is answered from the ``trace_rules`` index.
+    """
+    fields = [f for f in TRACE_FIELDS if f in set(fields)]
+    payload_fields = [f for f in PAYLOAD_FIELDS if f in fields]
+    columns = [DecisionTrace.id, DecisionTrace.date] + [
+        getattr(DecisionTrace, f) for f in ("user_id", "agent_name", "explanation") if f in fields
+    ]
+    for field in payload_fields:
+        columns += [getattr(DecisionTrace, field), getattr(DecisionTrace, f"{field}_hash")]
+
+    if rule_id is not None:
+        # Walk the rule index in (date, id) order and join back by primary key
+        order_date, order_id = TraceRule.date, TraceRule.trace_id
+        stmt = select(*columns).select_from(TraceRule).join(
+            DecisionTrace, DecisionTrace.id == TraceRule.trace_id
+        ).where(TraceRule.rule_id == rule_id)
+    else:
+        order_date, order_id = DecisionTrace.date, DecisionTrace.id
+        stmt = select(*columns)
+
+    if user_id is not None:
+        stmt = stmt.where(DecisionTrace.user_id == user_id)
+    if agent_name is not None:
+        stmt = stmt.where(DecisionTrace.agent_name == agent_name)
+    if start is not None:
+        stmt = stmt.where(order_date >= start)
+    if end is not None:
+        stmt = stmt.where(order_date < end)
+    if cursor is not None:
+        after_date, after_id = decode_cursor(cursor)
+        stmt = stmt.where(or_(order_date < after_date, and_(order_date == after_date, order_id < after_id)))
+
+    rows = db.execute(stmt.order_by(order_date.desc(), order_id.desc()).limit(limit + 1)).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    payloads = load_payloads(db, {getattr(r, f"{f}_hash") for r in rows for f in payload_fields})
+    items = []
+    for r in rows:
+        item = {}
+        for field in fields:
+            if field in PAYLOAD_FIELDS:
+                h = getattr(r, f"{field}_hash")
+                item[field] = getattr(r, field) if h is None else payloads.get(h)
+            elif field == "date":
+                item["date"] = r.date.isoformat()
+            else:
+                item[field] = getattr(r, field)
+        items.append(item)
+
+    return {
+        "items": items,
+        "next_cursor": encode_cursor(rows[-1].date, rows[-1].id) if has_more else None,
+    }
+
+class TraceWriter:
+    """Buffers traces and writes them in batches from a background thread"""
+
+    def __init__(self, session_factory=SessionLocal, flush_interval: float = FLUSH_INTERVAL_SECONDS,
+                 batch_size: int = BATCH_SIZE, max_buffered: int = MAX_BUFFERED):
+        self.session_factory = session_factory
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_buffered = max_buffered
+        self._buffer: List[Dict] = []
+        self._in_flight: List[Dict] = []
+        # Batches that failed for a reason other than the database being unavailable, with their failure counts
+        self._retry: List[Tuple[List[Dict], int]] = []
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+        self.written = 0
+        self.dropped = 0
+        self.failed_flushes = 0
+        self.rejected = 0
+
+    def submit(self, **trace):
+        """Queue a trace; written within ``flush_interval`` seconds"""
+        trace.setdefault("date", datetime.utcnow())
+        with self._cond:
+            if not self._closed:
+                self._buffer.append(trace)
+                if len(self._buffer) > self.max_buffered:
+                    # Database unavailable for a long time: shed the oldest
+                    self._buffer.pop(0)
+                    self.dropped += 1
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="trace-writer", daemon=True)
+                    self._thread.start()
+                if len(self._buffer) >= self.batch_size:
+                    self._cond.notify()
+                return
+        # After shutdown (scripts, tests) write straight through
+        self._write([trace])
+
+    def pending(self, user_id: int) -> List[Dict]:
+        """Traces for a user that are queued but not yet committed, newest first"""
+        with self._cond:
+            retrying = [t for traces, _ in self._retry for t in traces]
+            queued = [t for t in retrying + self._in_flight + self._buffer if t["user_id"] == user_id]
+        return [
+            _view(None, t["date"], t.get("agent_name"), t, t.get("explanation"))
+            for t in reversed(queued)
+        ]
+
+    def flush(self):
+        """Write everything buffered.
+
+        While the database is unavailable traces stay buffered. A batch that
+        fails for another reason is retried on later flushes, then split in
+        halves until the traces that can't be written are found and dropped,
+        so one bad trace doesn't hold up the rest.
+        """
+        with self._flush_lock:
+            with self._cond:
+                batch, self._buffer = self._buffer, []
+                queue = self._retry + [(batch[i:i + self.batch_size], 0)
+                                       for i in range(0, len(batch), self.batch_size)]
+                self._retry = []
+                self._in_flight = [t for traces, _ in queue for t in traces]
+            retry: List[Tuple[List[Dict], int]] = []
+            try:
+                while queue:
+                    traces, failures = queue.pop(0)
+                    try:
+                        self._write(traces)
+                    except OperationalError:
+                        queue.insert(0, (traces, failures))
+                        raise
+                    except Exception as e:
+                        failures += 1
+                        if failures < MAX_ATTEMPTS:
+                            self.failed_flushes += 1
+                            print(f"Trace batch of {len(traces)} failed, will retry: {str(e)}")
+                            retry.append((traces, failures))
+                        elif len(traces) > 1:
+                            # One more try per half, so the bad traces are isolated within this flush
+                            half = len(traces) // 2
+                            queue[:0] = [(traces[:half], MAX_ATTEMPTS - 1), (traces[half:], MAX_ATTEMPTS - 1)]
+                        else:
+                            self.rejected += 1
+                            print(f"Dropped a trace that can't be written ({self.rejected} so far): {str(e)}")
+                    with self._cond:
+                        self._in_flight = [t for traces, _ in retry + queue for t in traces]
+            except OperationalError as e:
+                self.failed_flushes += 1
+                print(f"Trace flush failed, will retry: {str(e)}")
+            finally:
+                with self._cond:
+                    # Traces held back only by an outage rejoin the buffer, where shedding applies
+                    self._retry = retry + [(traces, failures) for traces, failures in queue if failures]
+                    self._buffer = [t for traces, failures in queue if not failures for t in traces] + self._buffer
+                    self._in_flight = []
+
+    def _write(self, traces: List[Dict]):
+        db = self.session_factory()
+        try:
+            self.written += write_traces(db, traces)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._closed and len(self._buffer) < self.batch_size:
+                    self._cond.wait(self.flush_interval)
+                closed = self._closed
+            self.flush()
+            if closed:
+                return
+
+    def close(self):
+        """Stop the background thread after a final flush"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+            thread = self._thread
+        if thread is not None:
+            thread.join()
+        self.flush()
+
+    def stats(self) -> Dict:
+        return {
+            "buffered": len(self._buffer),
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed_flushes": self.failed_flushes,
+            "rejected": self.rejected,
+        }
+
+trace_writer = TraceWriter()
+atexit.register(trace_writer.close)
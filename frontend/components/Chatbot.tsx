@@ -1,7 +1,7 @@
 'use client';
 
 import { useState, useRef, useEffect } from 'react';
-import { sendChatMessage } from '@/lib/api';
+import { streamChatMessage } from '@/lib/api';
 import { Send, Bot, User } from 'lucide-react';
 
 interface ChatbotProps {
@@ -17,7 +17,12 @@ export default function Chatbot({ userId }: ChatbotProps) {
   ]);
   const [input, setInput] = useState('');
   const [loading, setLoading] = useState(false);
+  const [streaming, setStreaming] = useState(false);
   const messagesEndRef = useRef<HTMLDivElement>(null);
+  const abortRef = useRef<AbortController | null>(null);
+
+  // Leaving the page cancels an in-flight reply
+  useEffect(() => () => abortRef.current?.abort(), []);
 
   const scrollToBottom = () => {
     messagesEndRef.current?.scrollIntoView({ behavior: 'smooth' });
@@ -36,13 +41,33 @@ export default function Chatbot({ userId }: ChatbotProps) {
     setInput('');
     setLoading(true);
 
-    try {
-      const response = await sendChatMessage({
-        user_id: userId,
-        messages: [...messages, userMessage],
+    const controller = new AbortController();
+    abortRef.current = controller;
+    let started = false;
+    const appendDelta = (delta: string) => {
+      if (!started) {
+        started = true;
+        setStreaming(true);
+        setMessages((prev) => [...prev, { role: 'assistant', content: delta }]);
+        return;
+      }
+      setMessages((prev) => {
+        const last = prev[prev.length - 1];
+        return [...prev.slice(0, -1), { ...last, content: last.content + delta }];
       });
-      setMessages((prev) => [...prev, { role: 'assistant', content: response.message }]);
+    };
+
+    try {
+      await streamChatMessage(
+        {
+          user_id: userId,
+          messages: [...messages, userMessage],
+        },
+        appendDelta,
+        controller.signal
+      );
     } catch (error: any) {
+      if (controller.signal.aborted) return;
       setMessages((prev) => [
         ...prev,
         {
@@ -52,6 +77,7 @@ export default function Chatbot({ userId }: ChatbotProps) {
       ]);
     } finally {
       setLoading(false);
+      setStreaming(false);
     }
   };
 
@@ -92,7 +118,7 @@ export default function Chatbot({ userId }: ChatbotProps) {
               </div>
             </div>
           ))}
-          {loading && (
+          {loading && !streaming && (
             <div className="flex items-start space-x-3">
               <div className="flex-shrink-0 w-10 h-10 rounded-full bg-blue-500 text-white flex items-center justify-center">
                 <Bot size={20} />
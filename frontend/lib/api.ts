@@ -44,6 +44,12 @@ export const getRecentCheckIns = async (userId: number, limit = 7) => {
   return response.data;
 };
 
+// Background jobs (check-ins submitted with async_mode)
+export const getJob = async (jobId: number) => {
+  const response = await api.get(`/api/jobs/${jobId}`);
+  return response.data;
+};
+
 // Nutrition
 export const lookupNutrient = async (ingredient: string) => {
   const response = await api.get(`/api/nutrition/lookup/${ingredient}`);
@@ -108,8 +114,10 @@ export const getDashboardOverview = async (userId: number) => {
   return response.data;
 };
 
-export const getTrends = async (userId: number, days = 30) => {
-  const response = await api.get(`/api/dashboard/${userId}/trends?days=${days}`);
+export const getTrends = async (userId: number, days = 30, points?: number) => {
+  const response = await api.get(`/api/dashboard/${userId}/trends`, {
+    params: { days, points },
+  });
   return response.data;
 };
 
@@ -129,12 +137,64 @@ export const getMonthlyReport = async (userId: number) => {
   return response.data;
 };
 
+export const getRangeReport = async (userId: number, start: string, end: string) => {
+  const response = await api.get(`/api/reports/range/${userId}`, {
+    params: { start, end },
+  });
+  return response.data;
+};
+
 // Chatbot
 export const sendChatMessage = async (data: any) => {
   const response = await api.post('/api/chatbot/chat', data);
   return response.data;
 };
 
+// Streams the reply as Server-Sent Events; onDelta receives each chunk as it arrives.
+// Aborting the signal closes the connection, which stops generation on the server.
+export const streamChatMessage = async (
+  data: any,
+  onDelta: (text: string) => void,
+  signal?: AbortSignal
+) => {
+  const response = await fetch(`${API_URL}/api/chatbot/chat/stream`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json', Accept: 'text/event-stream' },
+    body: JSON.stringify(data),
+    signal,
+  });
+  if (!response.ok || !response.body) {
+    throw new Error(`Chat stream failed with status ${response.status}`);
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  let message = '';
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    const events = buffer.split('\n\n');
+    buffer = events.pop() || '';
+    for (const raw of events) {
+      let event = 'message';
+      let payload = '';
+      for (const line of raw.split('\n')) {
+        if (line.startsWith('event: ')) event = line.slice(7);
+        else if (line.startsWith('data: ')) payload += line.slice(6);
+      }
+      if (!payload) continue;
+      const parsed = JSON.parse(payload);
+      if (event === 'done') return { message: parsed.message, role: parsed.role };
+      if (event === 'error') throw new Error(parsed.error);
+      message += parsed.delta;
+      onDelta(parsed.delta);
+    }
+  }
+  return { message, role: 'assistant' };
+};
+
 // Decision Trace
 export const getRecentTraces = async (userId: number, limit = 10) => {
   const response = await api.get(`/api/trace/${userId}/recent?limit=${limit}`);
@@ -146,3 +206,28 @@ export const getTodayTraces = async (userId: number) => {
   return response.data;
 };
 
+
+export const queryTraces = async (params: {
+  userId?: number;
+  agentName?: string;
+  ruleId?: string;
+  start?: string;
+  end?: string;
+  fields?: string[];
+  cursor?: string;
+  limit?: number;
+}) => {
+  const response = await api.get('/api/trace/query', {
+    params: {
+      user_id: params.userId,
+      agent_name: params.agentName,
+      rule_id: params.ruleId,
+      start: params.start,
+      end: params.end,
+      fields: params.fields?.join(','),
+      cursor: params.cursor,
+      limit: params.limit,
+    },
+  });
+  return response.data;
+};